@@ -4,19 +4,25 @@ import ImageUpload from './ImageUpload';
 
 function ScenarioForm({ onSubmit, isConnected, isAnalyzing }) {
   const [selectedImage, setSelectedImage] = useState(null);
+  const [selectedFile, setSelectedFile] = useState(null);
   const [environmentDescription, setEnvironmentDescription] = useState('');
 
   const handleSubmit = (e) => {
     e.preventDefault();
     if (selectedImage && environmentDescription.trim()) {
-      // Convert image to base64 for transmission
+      // Send the file itself as binary; base64 only when it is not at hand
+      if (selectedFile instanceof Blob) {
+        onSubmit(selectedFile, environmentDescription);
+        return;
+      }
       const base64Image = selectedImage.split(',')[1]; // Remove data:image/...;base64, prefix
       onSubmit(base64Image, environmentDescription);
     }
   };
 
-  const handleImageSelect = (imageData) => {
+  const handleImageSelect = (imageData, file) => {
     setSelectedImage(imageData);
+    setSelectedFile(file);
   };
 
   const predefinedEnvironments = [
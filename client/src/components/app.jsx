@@ -6,12 +6,13 @@ import ScenarioForm from './ScenarioForm.jsx';
 import {
     createWebSocketConnection,
     sendAnalysisRequest,
+    sendStoredImageAnalysis,
     sendHeartbeat,
     calculateReconnectDelay,
     parseWebSocketMessage,
     isWebSocketReady
 } from '../utils/websocket-utils.js';
-import { getWebSocketUrl } from '../utils/websocket-config.js';
+import { getWebSocketUrl, getResultPacingMs } from '../utils/websocket-config.js';
 import '~/styles.css';
 
 function App() {
@@ -25,6 +26,9 @@ function App() {
         CropMaster: null
     });
 
+    // Raw text streamed by each agent while its result is still generating
+    const [agentStreams, setAgentStreams] = useState({});
+
     const [isAnalyzing, setIsAnalyzing] = useState(false);
     const [ws, setWs] = useState(null);
 
@@ -42,6 +46,25 @@ function App() {
     const wsRef = useRef(null);
     const reconnectTimeoutRef = useRef(null);
     const heartbeatIntervalRef = useRef(null);
+    // Last photo sent and the image_id the server gave it, so a re-run with
+    // new conditions names the photo instead of uploading it again
+    const lastImageRef = useRef({ data: null, id: null, environment: null });
+
+    // Optional UI pacing between results (VITE_RESULT_PACING_MS)
+    const resultPacingMs = getResultPacingMs();
+    const revealAtRef = useRef(0);
+
+    // Apply an update now, or after the pacing delay since the previous one
+    const revealPaced = useCallback((reveal) => {
+        if (resultPacingMs <= 0) {
+            reveal();
+            return;
+        }
+        const now = Date.now();
+        const revealAt = Math.max(now, revealAtRef.current + resultPacingMs);
+        revealAtRef.current = revealAt;
+        setTimeout(reveal, revealAt - now);
+    }, [resultPacingMs]);
 
     // Helper function to handle reconnection attempts (moved outside to reduce nesting)
     const scheduleReconnection = useCallback((delay) => {
@@ -104,15 +127,34 @@ function App() {
                 // Handle different message types
                 switch (message.type) {
                     case 'agent_result':
-                        setAgentData(prev => ({
+                        revealPaced(() => setAgentData(prev => ({
                             ...prev,
                             [message.agent]: message.data
+                        })));
+                        break;
+
+                    case 'agent_token':
+                        // Per-token frames; the UI renders the throttled agent_partial text
+                        break;
+
+                    case 'agent_partial':
+                        setAgentStreams(prev => ({
+                            ...prev,
+                            [message.agent]: message.text
                         }));
                         break;
 
+                    case 'analysis_started':
+                        // Every frame of the analysis carries this request_id
+                        break;
+
+                    case 'image_received':
+                        lastImageRef.current.id = message.image_id;
+                        break;
+
                     case 'status':
                         if (message.message.includes('completado')) {
-                            setIsAnalyzing(false);
+                            revealPaced(() => setIsAnalyzing(false));
                         }
                         break;
 
@@ -122,6 +164,13 @@ function App() {
                         break;
 
                     case 'error':
+                        if (message.image_id && lastImageRef.current.data) {
+                            // The server no longer has the photo: send it again
+                            const last = lastImageRef.current;
+                            last.id = null;
+                            sendAnalysisRequest(wsRef.current, last.data, last.environment);
+                            break;
+                        }
                         console.error('❌ Server error:', message.message);
                         setConnectionState(prev => ({
                             ...prev,
@@ -180,7 +229,7 @@ function App() {
 
         wsRef.current = websocket;
 
-    }, [connectionState.attempts, scheduleReconnection]);
+    }, [connectionState.attempts, scheduleReconnection, revealPaced]);
 
     // Heartbeat mechanism to keep connection alive
     const startHeartbeat = (websocket) => {
@@ -231,8 +280,18 @@ function App() {
                 SoilSense: null,
                 CropMaster: null
             });
-
-            const success = sendAnalysisRequest(ws, imageBase64, environmentDescription);
+            setAgentStreams({});
+
+            const last = lastImageRef.current;
+            const sameImage = last.id && last.data === imageBase64;
+            lastImageRef.current = {
+                data: imageBase64,
+                id: sameImage ? last.id : null,
+                environment: environmentDescription
+            };
+            const success = sameImage
+                ? sendStoredImageAnalysis(ws, last.id, environmentDescription)
+                : sendAnalysisRequest(ws, imageBase64, environmentDescription);
             if (!success) {
                 console.warn('⚠️ Failed to send analysis request');
                 setConnectionState(prev => ({
@@ -287,6 +346,7 @@ function App() {
                     <AgentCard
                         title="📸 ImageVision"
                         data={agentData.ImageVision}
+                        streamText={agentStreams.ImageVision}
                         color="purple"
                     />
                 </div>
@@ -296,11 +356,13 @@ function App() {
                     <AgentCard
                         title="🔍 AgriVision"
                         data={agentData.AgriVision}
+                        streamText={agentStreams.AgriVision}
                         color="blue"
                     />
                     <AgentCard
                         title="🌍 SoilSense"
                         data={agentData.SoilSense}
+                        streamText={agentStreams.SoilSense}
                         color="brown"
                     />
                 </div>
@@ -310,6 +372,7 @@ function App() {
                     <AgentCard
                         title="🧠 CropMaster"
                         data={agentData.CropMaster}
+                        streamText={agentStreams.CropMaster}
                         color="green"
                     />
                 </div>
@@ -458,7 +521,7 @@ const colorVariants = {
     // Add any other colors you plan to use
 };
 
-function AgentCard({ title, data, color = 'blue' }) {
+function AgentCard({ title, data, streamText, color = 'blue' }) {
     return (
         <div className={`bg-white rounded-lg shadow-lg p-6 border-l-4 ${colorVariants[color] || colorVariants.blue}`}>
             <h3 className="text-xl font-semibold text-gray-800 mb-4 pb-2 border-b">{title}</h3>
@@ -483,6 +546,9 @@ function AgentCard({ title, data, color = 'blue' }) {
                     <div className="h-4 bg-gray-200 rounded w-3/4"></div>
                     <div className="h-4 bg-gray-200 rounded w-1/2"></div>
                     <div className="h-4 bg-gray-200 rounded w-5/6"></div>
+                    {streamText && (
+                        <pre className="text-xs text-gray-500 whitespace-pre-wrap break-words">{streamText}</pre>
+                    )}
                 </div>
             )}
         </div>
@@ -492,6 +558,7 @@ function AgentCard({ title, data, color = 'blue' }) {
 AgentCard.propTypes = {
     title: PropTypes.string.isRequired,
     data: PropTypes.object,
+    streamText: PropTypes.string,
     color: PropTypes.oneOf(['blue', 'green', 'red', 'yellow', 'purple'])
 };
 
@@ -510,6 +577,15 @@ function DecisionPanel({ data }) {
         critical: 'bg-red-100 text-red-800'
     };
 
+    if (data.status === 'not_applicable') {
+        return (
+            <div className="bg-white rounded-lg shadow-lg p-8">
+                <h2 className="text-2xl font-bold mb-6 text-center">📊 Decisión Final del Sistema</h2>
+                <p className="text-center text-gray-700">🚫 Análisis no aplicable: {data.reason}</p>
+            </div>
+        );
+    }
+
     return (
         <div className="bg-white rounded-lg shadow-lg p-8">
             <h2 className="text-2xl font-bold mb-6 text-center">📊 Decisión Final del Sistema</h2>
@@ -537,6 +613,8 @@ function DecisionPanel({ data }) {
 
 DecisionPanel.propTypes = {
     data: PropTypes.shape({
+        status: PropTypes.string,
+        reason: PropTypes.string,
         overall_status: PropTypes.string,
         priority_actions: PropTypes.arrayOf(PropTypes.string)
     })
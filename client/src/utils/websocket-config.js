@@ -30,3 +30,13 @@ export const getApiBaseUrl = () => {
     const protocol = window.location.protocol;
     return `${protocol}//${window.location.host}/api`;
 };
+
+/**
+ * Gets the minimum delay between agent results shown in the UI
+ * Results are sent as soon as each agent finishes; pacing is opt-in for demos
+ * @returns {number} Delay in milliseconds (0 shows results immediately)
+ */
+export const getResultPacingMs = () => {
+    const pacing = Number(import.meta.env.VITE_RESULT_PACING_MS);
+    return Number.isFinite(pacing) && pacing > 0 ? pacing : 0;
+};
@@ -16,6 +16,16 @@ export const createWebSocketConnection = (url, callbacks = {}) => {
 
 export const sendAnalysisRequest = (websocket, imageData, environmentDescription) => {
   if (websocket && websocket.readyState === WebSocket.OPEN) {
+    if (imageData instanceof Blob) {
+      // Raw file bytes follow as a binary frame, announced by their size
+      websocket.send(JSON.stringify({
+        type: 'image_analysis',
+        image_bytes: imageData.size,
+        environment_description: environmentDescription
+      }))
+      websocket.send(imageData)
+      return true
+    }
     websocket.send(JSON.stringify({
       type: 'image_analysis',
       image_data: imageData,
@@ -26,6 +36,18 @@ export const sendAnalysisRequest = (websocket, imageData, environmentDescription
   return false
 }
 
+export const sendStoredImageAnalysis = (websocket, imageId, environmentDescription) => {
+  if (websocket && websocket.readyState === WebSocket.OPEN) {
+    websocket.send(JSON.stringify({
+      type: 'image_analysis',
+      image_id: imageId,
+      environment_description: environmentDescription
+    }))
+    return true
+  }
+  return false
+}
+
 export const sendHeartbeat = (websocket) => {
   if (websocket && websocket.readyState === WebSocket.OPEN) {
     websocket.send(JSON.stringify({ type: 'ping' }))
@@ -1,10 +1,11 @@
-import { getWebSocketUrl, getApiBaseUrl } from '../../src/utils/websocket-config.js'
+import { getWebSocketUrl, getApiBaseUrl, getResultPacingMs } from '../../src/utils/websocket-config.js'
 
 describe('WebSocket Configuration', () => {
   beforeEach(() => {
     // Reset environment variables
     delete import.meta.env.VITE_WEBSOCKET_URL
     delete import.meta.env.VITE_API_URL
+    delete import.meta.env.VITE_RESULT_PACING_MS
 
     // Mock window.location
     Object.defineProperty(window, 'location', {
@@ -74,4 +75,22 @@ describe('WebSocket Configuration', () => {
       expect(result).toBe('https://myapp.com/api')
     })
   })
+
+  describe('getResultPacingMs', () => {
+    it('disables pacing by default', () => {
+      expect(getResultPacingMs()).toBe(0)
+    })
+
+    it('returns the configured delay', () => {
+      import.meta.env.VITE_RESULT_PACING_MS = '1500'
+
+      expect(getResultPacingMs()).toBe(1500)
+    })
+
+    it('ignores invalid values', () => {
+      import.meta.env.VITE_RESULT_PACING_MS = 'slow'
+
+      expect(getResultPacingMs()).toBe(0)
+    })
+  })
 })
@@ -1,6 +1,7 @@
 import {
   createWebSocketConnection,
   sendAnalysisRequest,
+  sendStoredImageAnalysis,
   sendHeartbeat,
   calculateReconnectDelay,
   parseWebSocketMessage,
@@ -87,6 +88,22 @@ describe('WebSocket Utils', () => {
       )
     })
 
+    it('sends a file as a header followed by a binary frame', () => {
+      const file = new Blob([new Uint8Array([1, 2, 3])], { type: 'image/jpeg' })
+      const result = sendAnalysisRequest(mockWebSocket, file, 'environment')
+
+      expect(result).toBe(true)
+      expect(mockWebSocket.send).toHaveBeenNthCalledWith(
+        1,
+        JSON.stringify({
+          type: 'image_analysis',
+          image_bytes: 3,
+          environment_description: 'environment'
+        })
+      )
+      expect(mockWebSocket.send).toHaveBeenNthCalledWith(2, file)
+    })
+
     it('returns false when WebSocket is not ready', () => {
       mockWebSocket.readyState = WebSocket.CONNECTING
       const result = sendAnalysisRequest(mockWebSocket, 'data', 'env')
@@ -102,6 +119,26 @@ describe('WebSocket Utils', () => {
     })
   })
 
+  describe('sendStoredImageAnalysis', () => {
+    it('names the stored photo instead of sending it', () => {
+      const result = sendStoredImageAnalysis(mockWebSocket, 'abc123', 'environment')
+
+      expect(result).toBe(true)
+      expect(mockWebSocket.send).toHaveBeenCalledWith(
+        JSON.stringify({
+          type: 'image_analysis',
+          image_id: 'abc123',
+          environment_description: 'environment'
+        })
+      )
+    })
+
+    it('returns false when WebSocket is not ready', () => {
+      mockWebSocket.readyState = WebSocket.CONNECTING
+      expect(sendStoredImageAnalysis(mockWebSocket, 'abc123', 'env')).toBe(false)
+    })
+  })
+
   describe('sendHeartbeat', () => {
     it('sends heartbeat when WebSocket is ready', () => {
       const result = sendHeartbeat(mockWebSocket)
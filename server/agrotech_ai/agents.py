@@ -2,22 +2,31 @@
 AI Agents for Agricultural Monitoring System
 """
 
-import asyncio
-import base64
-import io
 import json
 import logging
 import os
 import time
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Union
 
 from PIL import Image
 
-from .ollama_client import OllamaAgent, get_shared_session, reset_shared_session
-
-# Configuración de Ollama
-OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
-OLLAMA_GENERATE_API = f"{OLLAMA_URL}/api/generate"
+from .image_analytics import ANALYTICS_ENABLED, analytics_summary
+from .image_pool import ImagePoolFull, get_image_pool
+from .image_prefilter import PREFILTER_ENABLED, PREFILTER_STATS
+from .image_processing import (
+    as_base64,
+    optimize_image,
+    preprocess_image,
+    target_image_size,
+)
+from .image_store import content_id, get_image_store
+from .ollama_client import OllamaAgent, TokenCallback
+from .schemas import (
+    AGRI_VISION_SCHEMA,
+    CROP_MASTER_SCHEMA,
+    IMAGE_VISION_SCHEMA,
+    SOIL_SENSE_SCHEMA,
+)
 
 # Models from environment variables with fallback defaults
 MODEL_NAME = os.getenv("OLLAMA_TEXT_MODEL", "gemma3:270m")
@@ -35,80 +44,106 @@ class ImageVisionAgent(OllamaAgent):
     """Agent specialized in analyzing agricultural images and providing
     detailed descriptions"""
 
+    response_schema = IMAGE_VISION_SCHEMA
+
     def __init__(self):
         super().__init__("ImageVision", "análisis visual de imágenes agrícolas")
 
-    def _optimize_image(self, image_base64: str) -> str:
+    def _optimize_image(
+        self, image_base64: str, image: Optional[Image.Image] = None
+    ) -> str:
         """Optimize image size and quality for faster processing"""
-        start_time = time.time()
-        logger.info(f"🖼️  [{self.role}] Starting image optimization")
+        return optimize_image(image_base64, image, target_image_size(VISION_MODEL_NAME))
 
-        try:
-            # Decode base64 image
-            image_data = base64.b64decode(image_base64)
-            original_size = len(image_data)
-            image = Image.open(io.BytesIO(image_data))
+    async def _preprocess(self, upload: Union[str, bytes, bytearray]) -> Dict[str, Any]:
+        """Screen, measure and re-encode the upload in the image pool.
 
-            logger.debug(
-                f"🖼️  [{self.role}] Original image: {image.size}, "
-                f"format: {image.format}, size: {original_size/1024:.1f}KB"
+        A full queue is passed on as ImagePoolFull; a job that fails or
+        times out leaves the upload as it is, unmeasured."""
+        try:
+            processed = await get_image_pool().run(
+                preprocess_image,
+                upload,
+                PREFILTER_ENABLED,
+                ANALYTICS_ENABLED,
+                target_image_size(VISION_MODEL_NAME),
             )
-
-            # Resize if too large (max 1024px on longest side)
-            max_size = 1024
-            if max(image.size) > max_size:
-                ratio = max_size / max(image.size)
-                new_size = tuple(int(dim * ratio) for dim in image.size)
-                image = image.resize(new_size, Image.Resampling.LANCZOS)
+        except ImagePoolFull:
+            raise
+        except Exception as e:
+            logger.error(f"❌ [{self.role}] Image preprocessing failed: {e}")
+            return {
+                "image": as_base64(upload),
+                "prefilter": None,
+                "image_analytics": None,
+            }
+
+        prefilter = processed["prefilter"]
+        if prefilter is not None:
+            PREFILTER_STATS["checked"] += 1
+            if "reason" in prefilter:
+                PREFILTER_STATS["rejected"] += 1
                 logger.info(
-                    f"🖼️  [{self.role}] Image resized from {image.size} "
-                    f"to {new_size}"
+                    "🚫 [%s] Image rejected by prefilter in %.1fms: %s",
+                    self.role,
+                    prefilter["elapsed_ms"],
+                    prefilter["reason"],
                 )
-
-            # Convert to RGB if necessary
-            if image.mode != "RGB":
-                image = image.convert("RGB")
-                logger.debug(f"🖼️  [{self.role}] Image converted to RGB")
-
-            # Save optimized image
-            buffer = io.BytesIO()
-            image.save(buffer, format="JPEG", quality=85, optimize=True)
-            optimized_data = buffer.getvalue()
-            optimized_size = len(optimized_data)
-
-            elapsed_time = time.time() - start_time
-            compression_ratio = (1 - optimized_size / original_size) * 100
-
+            elif prefilter["flags"]:
+                PREFILTER_STATS["flagged"] += 1
+                logger.info(
+                    "🚩 [%s] Image flagged by prefilter: %s",
+                    self.role,
+                    prefilter["flags"],
+                )
+        analytics = processed["image_analytics"]
+        if analytics is not None:
             logger.info(
-                "✅ [%s] Image optimized in %.2fs: "
-                "%.1fKB → %.1fKB "
-                "(%.1f%% reduction)",
+                "📐 [%s] Image analytics in %.1fms: %s",
                 self.role,
-                elapsed_time,
-                original_size / 1024,
-                optimized_size / 1024,
-                compression_ratio,
+                analytics["elapsed_ms"],
+                analytics_summary(analytics),
             )
-
-            return base64.b64encode(optimized_data).decode("utf-8")
-        except Exception as e:
-            elapsed_time = time.time() - start_time
-            logger.error(
-                f"❌ [{self.role}] Image optimization failed after "
-                f"{elapsed_time:.2f}s: {e}"
+        return processed
+
+    async def _store_image(
+        self,
+        image_id: str,
+        upload: Union[str, bytes, bytearray],
+        result: Dict[str, Any],
+    ):
+        """Keep a cached analysis in the image store with the image as the
+        model would get it, re-encoded without screening or measuring"""
+        try:
+            processed = await get_image_pool().run(
+                preprocess_image,
+                upload,
+                False,
+                False,
+                target_image_size(VISION_MODEL_NAME),
             )
-            return image_base64  # Return original if optimization fails
-
-    async def analyze_image(self, image_base64: str) -> Dict[str, Any]:
+        except Exception as e:
+            logger.warning(f"⚠️ [{self.role}] Image not stored for re-analysis: {e}")
+            return
+        get_image_store().put(image_id, processed["image"], result)
+
+    async def analyze_image(
+        self,
+        image: Union[str, bytes, bytearray],
+        on_token: Optional[TokenCallback] = None,
+        use_cache: bool = True,
+        image_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
         """Analyze agricultural image and provide detailed description
-        for other agents"""
+        for other agents; the image is base64 text or the raw bytes of a
+        binary upload. image_id is the upload's content_id; with it, a
+        successful analysis is kept in the image store with the image sent
+        to the model"""
         start_time = time.time()
         logger.info(
             "🔍 [%s] Starting image analysis with %s", self.role, VISION_MODEL_NAME
         )
 
-        # Optimize image first
-        optimized_image = self._optimize_image(image_base64)
         prompt = """You are ImageVision, a specialized AI agent that provides \
 detailed visual descriptions of agricultural images for other AI systems \
 to analyze.
@@ -117,28 +152,8 @@ IMPORTANT: ALWAYS respond in SPANISH. All descriptions, recommendations, \
 and text must be in Spanish.
 TASK: Analyze this agricultural image and provide a comprehensive description.
 
-IF THE IMAGE IS NOT RELATED TO AGRICULTURE, use this specific format:
-{
-"is_agricultural_image": false,
-"reason": "Brief explanation in Spanish why the image is not relevant.",
-"confidence": 0.98,
-"image_description": null,
-"soil_visual_indicators": null,
-"environmental_context": null,
-"plant_health_indicators": null,
-"recommended_focus_areas": null
-}
-
-IF THE IMAGE IS RELATED TO AGRICULTURE, RESPOND ONLY WITH A JSON in this \
-exact format:
-{
-"image_description": "Detailed visual description of the crop/plant",
-"soil_visual_indicators": "Visual cues about soil condition visible in image",
-"environmental_context": "Environmental factors visible in the image",
-"plant_health_indicators": "Specific visual signs of plant health/disease",
-"recommended_focus_areas": ["area1", "area2", "area3"],
-"confidence": 0.95
-}
+IF THE IMAGE IS NOT RELATED TO AGRICULTURE, set is_agricultural_image to \
+false, explain why in reason, and set every description field to null.
 
 DESCRIPTION GUIDELINES:
 
@@ -161,15 +176,15 @@ confidence: Your confidence level in the description accuracy (0.0-1.0)
 
 Focus on quantifiable visual elements (percentages, sizes, distributions) \
 and use agricultural terminology.
-Also focus on spanish answer for the description.
 
 JSON:"""
 
         payload = {
             "model": VISION_MODEL_NAME,
             "prompt": prompt,
-            "images": [optimized_image],
-            "stream": False,
+            "images": [],
+            "stream": True,
+            "format": self.response_schema,
             "options": {
                 "temperature": 0.3,
                 "top_p": 0.9,
@@ -182,6 +197,30 @@ JSON:"""
         }
         request_timeout = 180
 
+        # Keyed on a digest of the uploaded bytes, the same for base64 and
+        # binary uploads, so a hit also skips the preprocessing; the cached
+        # answer already carries the measurements
+        digest = image_id or content_id(image)
+        key = self._cache_key({**payload, "images": [digest]}, use_cache)
+        cached = await self._cache_lookup(key)
+        if cached is not None:
+            if image_id is not None and image_id not in get_image_store():
+                await self._store_image(image_id, image, cached)
+            return cached
+
+        # Raw bytes go to the worker as they are; only the image sent to the
+        # model is base64-encoded, there
+        processed = await self._preprocess(image)
+        if processed["prefilter"] is not None and "reason" in processed["prefilter"]:
+            return self._get_rejected_response(processed["prefilter"])
+        measurements = {
+            name: processed[name]
+            for name in ("prefilter", "image_analytics")
+            if processed[name] is not None
+        }
+        optimized_image = processed["image"]
+        payload["images"] = [optimized_image]
+
         logger.debug(
             "🔧 [%s] Vision payload created - Model: %s, Options: %s, "
             "Image data length: %d, Stream: %s",
@@ -205,52 +244,34 @@ JSON:"""
                 len(optimized_image),
             )
 
-            # Use asyncio to run in thread pool for better async handling
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.session.post(
-                    OLLAMA_GENERATE_API, json=payload, timeout=request_timeout
-                ),
+            # Cached with the measurements, unless the deadline cut it short
+            parsed_result = await self._generate_json(
+                payload,
+                timeout=request_timeout,
+                on_token=on_token,
+                cache_key=key,
+                cache_extra=measurements,
             )
 
             elapsed_time = time.time() - start_time
             logger.info(
                 "✅ [%s] Vision analysis completed in %.2fs", self.role, elapsed_time
             )
-            logger.debug(
-                "🌐 [%s] Response status: %s, Raw Response: %s",
-                self.role,
-                response.status_code,
-                response.text,
-            )
-
-            result = response.json()
-            resp = result.get("response", "{}")
-            logger.debug(f"📊 [{self.role}] Actual Response: {resp}")
-            parsed_result = self._parse_json_response(resp)
 
             logger.info(f"📊 [{self.role}] Vision response parsed successfully")
             logger.debug(f"📊 [{self.role}] Response: {parsed_result}")
 
-            return parsed_result
+            result = {**parsed_result, **measurements}
+            if image_id is not None and self._is_cacheable(parsed_result):
+                get_image_store().put(image_id, optimized_image, result)
+            return result
         except Exception as e:
             elapsed_time = time.time() - start_time
             logger.error(
                 f"❌ [{self.role}] Vision analysis failed after "
                 f"{elapsed_time:.2f}s: {e}"
             )
-
-            # Reset shared session if connection issues persist
-            if "timeout" in str(e).lower() or "connection" in str(e).lower():
-                logger.warning(
-                    f"🔄 [{self.role}] Resetting shared session due to "
-                    f"connection issues"
-                )
-                reset_shared_session()
-                self.session = get_shared_session()
-
-            return self._get_fallback_response()
+            return {**self._get_fallback_response(), **measurements}
 
     def _get_fallback_response(self) -> Dict[str, Any]:
         return {
@@ -262,43 +283,63 @@ JSON:"""
             "confidence": 0.0,
         }
 
+    @staticmethod
+    def _get_rejected_response(prefilter: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "image_usable": False,
+            "reason": prefilter["reason"],
+            "image_description": None,
+            "soil_visual_indicators": None,
+            "environmental_context": None,
+            "plant_health_indicators": None,
+            "recommended_focus_areas": None,
+            "confidence": 1.0,
+            "prefilter": prefilter,
+        }
+
 
 class AgriVisionAgent(OllamaAgent):
     """Agent specialized in visual analysis of crop conditions"""
 
+    response_schema = AGRI_VISION_SCHEMA
+
     def __init__(self):
         super().__init__("AgriVision", "análisis visual de cultivos")
 
-    async def analyze_image(self, image_description: str) -> Dict[str, Any]:
-        """Analyze crop image description and provide health assessment"""
+    async def analyze_image(
+        self,
+        image_description: str,
+        on_token: Optional[TokenCallback] = None,
+        use_cache: bool = True,
+        image_analytics: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Analyze crop image description and provide health assessment.
+
+        image_analytics are the pixel measurements of the photo, given to
+        the model as facts so it does not have to estimate them"""
+        measured = (
+            f"\nMEDIDAS DE LA IMAGEN (exactas, úsalas en lugar de estimar): "
+            f"{analytics_summary(image_analytics)}\n"
+            if image_analytics
+            else ""
+        )
         prompt = f"""Eres AgriVision, un experto en análisis visual de \
 cultivos agrícolas.
 
 TAREA: Analiza esta descripción de imagen del cultivo: "{image_description}"
-
-RESPONDE ÚNICAMENTE CON UN JSON VÁLIDO en este formato exacto:
-{{
-    "crop_health": "healthy",
-    "pest_detected": false,
-    "leaf_condition": "good",
-    "disease_probability": 0.2,
-    "visual_symptoms": ["hojas verdes", "sin manchas"],
-    "recommendations": ["continuar monitoreo", "revisar en 2 días"],
-    "confidence": 0.85
-}}
-
-REGLAS IMPORTANTES:
-- crop_health debe ser: "healthy", "stressed", "diseased"
-- pest_detected debe ser: true o false
-- leaf_condition debe ser: "excellent", "good", "fair", "poor"
-- disease_probability debe ser un número entre 0.0 y 1.0
-- NO agregues texto antes o después del JSON
-- El JSON debe ser válido y parseable
+{measured}
+Responde con un JSON donde:
+- crop_health resume el estado sanitario del cultivo
+- visual_symptoms enumera los síntomas visibles
+- recommendations enumera acciones concretas de seguimiento
+- disease_probability y confidence van de 0.0 a 1.0
 
 JSON:"""
 
         try:
-            return await self.generate_response(prompt)
+            return await self.generate_response(
+                prompt, on_token=on_token, use_cache=use_cache
+            )
         except Exception as e:
             logger.error(f"❌ [{self.role}] Analysis failed: {e}")
             return self._get_fallback_response()
@@ -318,42 +359,34 @@ JSON:"""
 class SoilSenseAgent(OllamaAgent):
     """Agent specialized in environmental conditions and soil analysis"""
 
+    response_schema = SOIL_SENSE_SCHEMA
+
     def __init__(self):
         super().__init__("SoilSense", "condiciones ambientales y del suelo")
 
-    async def analyze_environment(self, conditions: str) -> Dict[str, Any]:
+    async def analyze_environment(
+        self,
+        conditions: str,
+        on_token: Optional[TokenCallback] = None,
+        use_cache: bool = True,
+    ) -> Dict[str, Any]:
         """Analyze environmental conditions and soil parameters"""
         prompt = f"""Eres SoilSense, especialista en condiciones ambientales \
 y del suelo para agricultura.
 
 TAREA: Analiza estas condiciones ambientales: "{conditions}"
 
-RESPONDE ÚNICAMENTE CON UN JSON VÁLIDO en este formato exacto:
-{{
-    "soil_moisture": 45,
-    "ph_level": 6.5,
-    "temperature": 24,
-    "humidity": 60,
-    "irrigation_needed": true,
-    "fertilizer_status": "adequate",
-    "environmental_stress": "low",
-    "alerts": ["humedad baja detectada"],
-    "confidence": 0.88
-}}
-
-REGLAS IMPORTANTES:
-- soil_moisture: número entre 0-100 (porcentaje)
-- ph_level: número entre 4.0-9.0
-- temperature: número entre -10 y 50 (celsius)
-- humidity: número entre 0-100 (porcentaje)
-- irrigation_needed: true o false
-- fertilizer_status: "deficient", "adequate", "excess"
-- environmental_stress: "low", "medium", "high"
-- NO agregues texto antes o después del JSON
+Responde con un JSON donde:
+- soil_moisture y humidity son porcentajes (0-100)
+- temperature está en grados celsius
+- alerts enumera los riesgos ambientales detectados
+- confidence va de 0.0 a 1.0
 
 JSON:"""
 
-        return await self.generate_response(prompt)
+        return await self.generate_response(
+            prompt, on_token=on_token, use_cache=use_cache
+        )
 
     def _get_fallback_response(self) -> Dict[str, Any]:
         return {
@@ -372,10 +405,18 @@ JSON:"""
 class CropMasterAgent(OllamaAgent):
     """Agent for integrated agricultural decision-making"""
 
+    response_schema = CROP_MASTER_SCHEMA
+
     def __init__(self):
         super().__init__("CropMaster", "toma de decisiones agrícolas integrales")
 
-    async def make_decision(self, vision_data: Dict, soil_data: Dict) -> Dict[str, Any]:
+    async def make_decision(
+        self,
+        vision_data: Dict,
+        soil_data: Dict,
+        on_token: Optional[TokenCallback] = None,
+        use_cache: bool = True,
+    ) -> Dict[str, Any]:
         """Make integrated decisions based on data from multiple agents"""
         prompt = f"""Eres CropMaster, el sistema inteligente que toma \
 decisiones agrícolas basado en datos de múltiples sensores.
@@ -387,32 +428,17 @@ DATOS DE ENTRADA:
 TAREA: Fusiona toda esta información y toma una decisión integral \
 sobre el manejo del cultivo.
 
-RESPONDE ÚNICAMENTE CON UN JSON VÁLIDO en este formato exacto:
-{{
-    "overall_status": "good",
-    "priority_actions": [
-        "regar por 10 minutos", "aplicar fungicida preventivo"
-    ],
-    "estimated_yield": "high",
-    "risk_assessment": "low",
-    "next_inspection_hours": 24,
-    "economic_impact": "positive",
-    "urgent_alerts": [],
-    "confidence": 0.92
-}}
-
-REGLAS IMPORTANTES:
-- overall_status: "excellent", "good", "warning", "critical"
-- estimated_yield: "high", "medium", "low"
-- risk_assessment: "low", "medium", "high", "critical"
-- economic_impact: "positive", "neutral", "negative"
-- next_inspection_hours: número entre 1 y 168 (1 semana máximo)
-- priority_actions: lista de máximo 4 acciones concretas
-- NO agregues texto antes o después del JSON
+Responde con un JSON donde:
+- priority_actions contiene hasta 4 acciones concretas
+- next_inspection_hours indica en cuántas horas revisar (1-168)
+- urgent_alerts enumera solo alertas que requieren acción inmediata
+- confidence va de 0.0 a 1.0
 
 JSON:"""
 
-        return await self.generate_response(prompt)
+        return await self.generate_response(
+            prompt, on_token=on_token, use_cache=use_cache
+        )
 
     def _get_fallback_response(self) -> Dict[str, Any]:
         return {
@@ -0,0 +1,253 @@
+"""
+Stage graphs of the agricultural analysis, run by the pipeline engine
+"""
+
+# Stage fallbacks are the agents' own fallback answers
+# pylint: disable=protected-access
+
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from .agents import (
+    AgriVisionAgent,
+    CropMasterAgent,
+    ImageVisionAgent,
+    SoilSenseAgent,
+)
+from .pipeline import Pipeline, SkipCheck, Stage, StageCall
+from .single_flight import TokenCallback
+
+# Safety net above the agents' own request timeouts (180s ImageVision,
+# 60s for the others); a stage running longer is replaced by its fallback
+STAGE_TIMEOUT_SECONDS = float(os.getenv("PIPELINE_STAGE_TIMEOUT", "240"))
+# ImageVision must be at least this confident that a photo is not
+# agricultural before the downstream agents are skipped; a less certain
+# verdict still runs them
+NON_AGRICULTURAL_MIN_CONFIDENCE = float(
+    os.getenv("IMAGE_NON_AGRICULTURAL_MIN_CONFIDENCE", "0.5")
+)
+
+# Status of the result an agent returns when it was skipped
+NOT_APPLICABLE = "not_applicable"
+
+
+class AnalysisAgents:  # pylint: disable=too-few-public-methods
+    """The agents a pipeline's stages call"""
+
+    def __init__(
+        self,
+        image_vision: ImageVisionAgent,
+        agri_vision: AgriVisionAgent,
+        soil_sense: SoilSenseAgent,
+        crop_master: CropMasterAgent,
+    ):
+        self.image_vision = image_vision
+        self.agri_vision = agri_vision
+        self.soil_sense = soil_sense
+        self.crop_master = crop_master
+
+
+def combined_environment(
+    environment_description: str, image_analysis: Dict[str, Any]
+) -> str:
+    """Environment text for SoilSense enriched with ImageVision's findings"""
+    soil_indicators = image_analysis.get("soil_visual_indicators", "")
+    environmental_context = image_analysis.get("environmental_context", "")
+    return (
+        f"{environment_description}. Indicadores visuales: "
+        f"{soil_indicators}. Contexto: {environmental_context}"
+    )
+
+
+def not_applicable_result(reason: str) -> Dict[str, Any]:
+    """Result of an agent skipped because its analysis does not apply"""
+    return {"status": NOT_APPLICABLE, "reason": reason}
+
+
+def is_not_applicable(result: Dict[str, Any]) -> bool:
+    """Whether a stage result is a not-applicable placeholder"""
+    return result.get("status") == NOT_APPLICABLE
+
+
+def non_agricultural_reason(image_analysis: Dict[str, Any]) -> Optional[str]:
+    """Why the downstream agents should skip the photo, or None when it was
+    neither found unusable by the prefilter nor confidently rejected by
+    ImageVision as non-agricultural"""
+    if image_analysis.get("image_usable") is False:
+        return image_analysis.get("reason") or "La imagen no se puede analizar"
+    if image_analysis.get("is_agricultural_image") is not False:
+        return None
+    confidence = image_analysis.get("confidence")
+    if not isinstance(confidence, (int, float)):
+        return None
+    if confidence < NON_AGRICULTURAL_MIN_CONFIDENCE:
+        return None
+    return image_analysis.get("reason") or "La imagen no muestra un cultivo"
+
+
+def _skip_non_agricultural(values: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    reason = non_agricultural_reason(values["ImageVision"])
+    return not_applicable_result(reason) if reason is not None else None
+
+
+def _skip_without_analyses(values: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if all(is_not_applicable(result) for result in values.values()):
+        return not_applicable_result(
+            values["AgriVision"].get("reason", "No hay análisis que fusionar")
+        )
+    return None
+
+
+def image_analysis_stages(
+    agents: AnalysisAgents, use_cache: bool = True
+) -> List[Stage]:
+    """ImageVision → (AgriVision ∥ SoilSense) → CropMaster, starting from an
+    uploaded photo (inputs: image, image_id, environment_description).
+
+    When ImageVision confidently rejects the photo as non-agricultural the
+    other three agents are skipped and return a not-applicable result."""
+
+    async def image_vision(values: Dict[str, Any], on_token: Optional[TokenCallback]):
+        return await agents.image_vision.analyze_image(
+            values["image"],
+            on_token=on_token,
+            use_cache=use_cache,
+            image_id=values["image_id"],
+        )
+
+    async def agri_vision(values: Dict[str, Any], on_token: Optional[TokenCallback]):
+        description = values["ImageVision"].get(
+            "image_description", "Error en análisis"
+        )
+        return await agents.agri_vision.analyze_image(
+            description,
+            on_token=on_token,
+            use_cache=use_cache,
+            image_analytics=values["ImageVision"].get("image_analytics"),
+        )
+
+    async def soil_sense(values: Dict[str, Any], on_token: Optional[TokenCallback]):
+        environment = combined_environment(
+            values["environment_description"], values["ImageVision"]
+        )
+        return await agents.soil_sense.analyze_environment(
+            environment, on_token=on_token, use_cache=use_cache
+        )
+
+    return [
+        Stage(
+            "ImageVision",
+            image_vision,
+            inputs=("image", "image_id"),
+            timeout=STAGE_TIMEOUT_SECONDS,
+            fallback=agents.image_vision._get_fallback_response,
+            status="📸 ImageVision procesando imagen...",
+        ),
+        _agri_vision_stage(
+            agents, agri_vision, ("ImageVision",), skip_if=_skip_non_agricultural
+        ),
+        _soil_sense_stage(
+            agents,
+            soil_sense,
+            ("ImageVision", "environment_description"),
+            skip_if=_skip_non_agricultural,
+        ),
+        _crop_master_stage(agents, use_cache),
+    ]
+
+
+def scenario_stages(agents: AnalysisAgents, use_cache: bool = True) -> List[Stage]:
+    """(AgriVision ∥ SoilSense) → CropMaster, starting from text (inputs:
+    image_description, environment_description)"""
+
+    async def agri_vision(values: Dict[str, Any], on_token: Optional[TokenCallback]):
+        return await agents.agri_vision.analyze_image(
+            values["image_description"], on_token=on_token, use_cache=use_cache
+        )
+
+    async def soil_sense(values: Dict[str, Any], on_token: Optional[TokenCallback]):
+        return await agents.soil_sense.analyze_environment(
+            values["environment_description"], on_token=on_token, use_cache=use_cache
+        )
+
+    return [
+        _agri_vision_stage(agents, agri_vision, ("image_description",)),
+        _soil_sense_stage(agents, soil_sense, ("environment_description",)),
+        _crop_master_stage(agents, use_cache),
+    ]
+
+
+def _agri_vision_stage(
+    agents: AnalysisAgents,
+    call: StageCall,
+    inputs: Tuple[str, ...],
+    skip_if: Optional[SkipCheck] = None,
+) -> Stage:
+    return Stage(
+        "AgriVision",
+        call,
+        inputs=inputs,
+        timeout=STAGE_TIMEOUT_SECONDS,
+        fallback=agents.agri_vision._get_fallback_response,
+        status="🔍 AgriVision analizando la salud del cultivo...",
+        skip_if=skip_if,
+    )
+
+
+def _soil_sense_stage(
+    agents: AnalysisAgents,
+    call: StageCall,
+    inputs: Tuple[str, ...],
+    skip_if: Optional[SkipCheck] = None,
+) -> Stage:
+    return Stage(
+        "SoilSense",
+        call,
+        inputs=inputs,
+        timeout=STAGE_TIMEOUT_SECONDS,
+        fallback=agents.soil_sense._get_fallback_response,
+        status="🌍 SoilSense analizando las condiciones ambientales...",
+        skip_if=skip_if,
+    )
+
+
+def _crop_master_stage(agents: AnalysisAgents, use_cache: bool) -> Stage:
+    async def crop_master(values: Dict[str, Any], on_token: Optional[TokenCallback]):
+        return await agents.crop_master.make_decision(
+            values["AgriVision"],
+            values["SoilSense"],
+            on_token=on_token,
+            use_cache=use_cache,
+        )
+
+    return Stage(
+        "CropMaster",
+        crop_master,
+        inputs=("AgriVision", "SoilSense"),
+        timeout=STAGE_TIMEOUT_SECONDS,
+        fallback=agents.crop_master._get_fallback_response,
+        status="🧠 CropMaster fusionando datos y decidiendo...",
+        skip_if=_skip_without_analyses,
+    )
+
+
+def image_analysis_pipeline(agents: AnalysisAgents, use_cache: bool = True) -> Pipeline:
+    """Pipeline for an uploaded photo"""
+    return Pipeline(image_analysis_stages(agents, use_cache))
+
+
+def stored_image_pipeline(agents: AnalysisAgents, use_cache: bool = True) -> Pipeline:
+    """Pipeline for a photo already described by ImageVision, whose result
+    is an input (inputs: ImageVision, environment_description)"""
+    return Pipeline(
+        [
+            stage
+            for stage in image_analysis_stages(agents, use_cache)
+            if stage.name != "ImageVision"
+        ]
+    )
+
+
+def scenario_pipeline(agents: AnalysisAgents, use_cache: bool = True) -> Pipeline:
+    """Pipeline for a scenario described in text"""
+    return Pipeline(scenario_stages(agents, use_cache))
@@ -6,12 +6,27 @@ Agricultural Monitoring System with Multi-Agent AI
 import logging
 import os
 import sys
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from .agents import MODEL_NAME
-from .ollama_client import check_ollama_connection
+from .backend_pool import close_backend_pool, get_backend_pool
+from .health import get_health_monitor
+from .hedging import HEDGE_BUDGET, HEDGE_STATS, latency_snapshot
+from .image_pool import close_image_pool, get_image_pool
+from .image_prefilter import PREFILTER_STATS
+from .image_store import get_image_store
+from .model_scheduler import affinity_snapshot
+from .ollama_client import JSON_PARSE_STATS
+from .pipeline import stage_snapshot
+from .response_cache import close_response_cache, get_response_cache
+from .retry import RETRY_BUDGET, RETRY_STATS
+from .scheduling import SCHEDULER_STATS
+from .single_flight import COALESCE_STATS
+from .upload_store import get_upload_store
 from .websocket_handler import websocket_handler
 
 
@@ -55,10 +70,25 @@ def setup_logging():
 setup_logging()
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """Run the Ollama health prober while the server is up, then release
+    pooled Ollama connections, the response cache and the image workers"""
+    monitor = get_health_monitor()
+    monitor.start()
+    yield
+    await monitor.stop()
+    await close_backend_pool()
+    close_response_cache()
+    close_image_pool()
+
+
 app = FastAPI(
     title="AgroTech AI Agents",
     description="Agricultural Monitoring System powered by AI agents",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configure CORS
@@ -99,6 +129,9 @@ async def root():
         "endpoints": {
             "websocket": "/ws",
             "health": "/health",
+            "liveness": "/health/live",
+            "readiness": "/health/ready",
+            "metrics": "/metrics",
             "docs": "/docs",
         },
     }
@@ -112,16 +145,61 @@ async def root_options():
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
+    """Health check endpoint, served from the background probe results"""
     logger.info("🔍 Health check requested")
-    ollama_status = check_ollama_connection()
+    monitor = get_health_monitor()
+    ollama_status = await monitor.ollama_available()
 
     status = "healthy" if ollama_status else "error"
     ollama_text = "running" if ollama_status else "not_running"
 
     logger.info("💊 Health check result: %s (Ollama: %s)", status, ollama_text)
 
-    return {"status": status, "ollama": ollama_text, "model": MODEL_NAME}
+    return {
+        "status": status,
+        "ollama": ollama_text,
+        "model": MODEL_NAME,
+        "checked_at": monitor.checked_at,
+        "backends": monitor.backends,
+    }
+
+
+@app.get("/health/live")
+async def liveness():
+    """Liveness probe: the process is up and serving requests"""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def readiness():
+    """Readiness probe: a recent background probe reached Ollama"""
+    if get_health_monitor().is_ready():
+        return {"status": "ready"}
+    return JSONResponse(status_code=503, content={"status": "not_ready"})
+
+
+@app.get("/metrics")
+async def metrics():
+    """Runtime counters for the Ollama client layer"""
+    return {
+        "json_parsing": dict(JSON_PARSE_STATS),
+        "backends": get_backend_pool().snapshot(),
+        "model_affinity": affinity_snapshot(),
+        "coalescing": dict(COALESCE_STATS),
+        "response_cache": get_response_cache().snapshot(),
+        "retries": {**RETRY_STATS, "budget_tokens": round(RETRY_BUDGET.tokens, 2)},
+        "scheduler": dict(SCHEDULER_STATS),
+        "pipeline": stage_snapshot(),
+        "image_prefilter": dict(PREFILTER_STATS),
+        "image_pool": get_image_pool().snapshot(),
+        "uploads": get_upload_store().snapshot(),
+        "image_store": get_image_store().snapshot(),
+        "hedging": {
+            **HEDGE_STATS,
+            "budget_tokens": round(HEDGE_BUDGET.tokens, 2),
+            "thresholds_ms": latency_snapshot(),
+        },
+    }
 
 
 def main():
@@ -0,0 +1,373 @@
+"""
+Pool of Ollama backends with least-outstanding-requests and model-affinity
+routing behind per-backend circuit breakers
+"""
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Collection, Dict, List, Optional, Set
+
+import httpx
+
+from .circuit_breaker import CLOSED, CircuitBreaker
+from .concurrency_limit import AdaptiveLimiter
+from .model_scheduler import MODEL_AFFINITY_STATS, ModelGate, normalize_model_name
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+
+# Comma separated list of Ollama endpoints; defaults to the single OLLAMA_URL
+OLLAMA_URLS = [
+    url.strip()
+    for url in os.getenv("OLLAMA_URLS", OLLAMA_URL).split(",")
+    if url.strip()
+]
+
+# Connection pool limits, applied to each backend separately
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "50"))
+OLLAMA_MAX_KEEPALIVE = int(os.getenv("OLLAMA_MAX_KEEPALIVE", "20"))
+OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "30"))
+
+# Circuit breaker: consecutive failures before a backend's circuit opens, and
+# how long it stays open (doubling after failed trials, up to the maximum)
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("OLLAMA_CIRCUIT_FAILURE_THRESHOLD", "3"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("OLLAMA_CIRCUIT_OPEN_SECONDS", "30"))
+CIRCUIT_MAX_OPEN_SECONDS = float(os.getenv("OLLAMA_CIRCUIT_MAX_OPEN_SECONDS", "240"))
+
+# Model affinity: how often /api/ps is polled for the models each backend has
+# loaded, and how many more requests in flight a backend with the model
+# loaded may have before a cold backend is preferred anyway
+MODEL_REFRESH_SECONDS = float(os.getenv("OLLAMA_PS_REFRESH_SECONDS", "10"))
+AFFINITY_MAX_SKEW = int(os.getenv("OLLAMA_AFFINITY_MAX_SKEW", "4"))
+
+logger = logging.getLogger(__name__)
+
+
+class OllamaRequestError(Exception):
+    """Raised when Ollama answers a generate request with an error"""
+
+
+class RetryableOllamaError(OllamaRequestError):
+    """Raised for answers worth retrying on another backend (502/503/504)"""
+
+
+class NoBackendAvailable(OllamaRequestError):
+    """Raised when the circuit of every configured Ollama backend is open"""
+
+
+# Failures to reach a backend at all; a health probe can see them recover
+UNREACHABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+# Failures after which the request may be retried on another backend; read
+# timeouts are left out on purpose, retrying them piles load on a slow Ollama
+RETRYABLE_ERRORS = (
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.RemoteProtocolError,
+    RetryableOllamaError,
+)
+
+
+def create_backend_session() -> httpx.AsyncClient:
+    """Create an async client with its own keep-alive connection pool"""
+    limits = httpx.Limits(
+        max_connections=OLLAMA_MAX_CONNECTIONS,
+        max_keepalive_connections=OLLAMA_MAX_KEEPALIVE,
+        keepalive_expiry=OLLAMA_KEEPALIVE_EXPIRY,
+    )
+
+    # No transport-level retries: retries go through the global retry budget
+    transport = httpx.AsyncHTTPTransport(limits=limits)
+    return httpx.AsyncClient(
+        transport=transport, timeout=httpx.Timeout(60.0, connect=5.0)
+    )
+
+
+class OllamaBackend:  # pylint: disable=too-many-instance-attributes
+    """One Ollama endpoint with its own connection pool and load counters"""
+
+    def __init__(
+        self,
+        url: str,
+        session: Optional[httpx.AsyncClient] = None,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        open_seconds: float = CIRCUIT_OPEN_SECONDS,
+        max_open_seconds: float = CIRCUIT_MAX_OPEN_SECONDS,
+    ):
+        self.url = url.rstrip("/")
+        self.session = session or create_backend_session()
+        self.in_flight = 0
+        self.total_requests = 0
+        self.total_failures = 0
+        self.breaker = CircuitBreaker(
+            self.url, failure_threshold, open_seconds, max_open_seconds
+        )
+        self.loaded_models: Set[str] = set()
+        self.models_refreshed_at: Optional[float] = None
+        self.gate = ModelGate()
+        self.limiters: Dict[str, AdaptiveLimiter] = {}
+
+    @property
+    def generate_url(self) -> str:
+        """URL of the generate endpoint on this backend"""
+        return f"{self.url}/api/generate"
+
+    @property
+    def available(self) -> bool:
+        """Whether its circuit lets a request through right now"""
+        return self.breaker.allow_request()
+
+    def limiter(self, model: Optional[str]) -> AdaptiveLimiter:
+        """Concurrency limiter for one model on this backend"""
+        key = normalize_model_name(model) if model else "*"
+        if key not in self.limiters:
+            self.limiters[key] = AdaptiveLimiter(f"{self.url} {key}")
+        return self.limiters[key]
+
+    def has_model(self, model: str) -> bool:
+        """Whether the model is known to be loaded in this backend's memory"""
+        return normalize_model_name(model) in self.loaded_models
+
+    def record_success(self):
+        """Close the circuit after a successful request"""
+        self.breaker.record_success()
+
+    def record_failure(self, error: Optional[BaseException] = None):
+        """Count a failed request against the circuit"""
+        self.total_failures += 1
+        self.breaker.record_failure(unreachable=isinstance(error, UNREACHABLE_ERRORS))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current counters for metrics"""
+        return {
+            "url": self.url,
+            "in_flight": self.in_flight,
+            "total_requests": self.total_requests,
+            "total_failures": self.total_failures,
+            "circuit": self.breaker.state,
+            "loaded_models": sorted(self.loaded_models),
+            "active_model": self.gate.active_model,
+            "queued": self.gate.queued
+            + sum(limiter.queued for limiter in self.limiters.values()),
+            "model_swaps": self.gate.swaps,
+            "concurrency": {
+                key: limiter.snapshot() for key, limiter in self.limiters.items()
+            },
+        }
+
+
+class BackendPool:
+    """Routes requests to the Ollama backend with the fewest requests in
+    flight, preferring backends that already have the requested model
+    loaded and skipping backends whose circuit is open"""
+
+    def __init__(
+        self,
+        backends: List[OllamaBackend],
+        refresh_seconds: float = MODEL_REFRESH_SECONDS,
+        affinity_max_skew: int = AFFINITY_MAX_SKEW,
+    ):
+        if not backends:
+            raise ValueError("BackendPool needs at least one backend")
+        self.backends = backends
+        self.refresh_seconds = refresh_seconds
+        self.affinity_max_skew = affinity_max_skew
+        self._tasks: Set[asyncio.Task] = set()
+        self._running: Set[str] = set()
+
+    @classmethod
+    def from_urls(cls, urls: List[str], **kwargs) -> "BackendPool":
+        """Build a pool with one backend per URL"""
+        return cls([OllamaBackend(url) for url in urls], **kwargs)
+
+    @property
+    def closed_backends(self) -> List[OllamaBackend]:
+        """Backends whose circuit is closed"""
+        return [b for b in self.backends if b.breaker.state == CLOSED]
+
+    def has_available(self, exclude: Collection[str] = ()) -> bool:
+        """Whether a request could be routed outside the excluded URLs"""
+        return any(
+            backend.available and backend.url not in exclude
+            for backend in self.backends
+        )
+
+    def select(
+        self, model: Optional[str] = None, exclude: Collection[str] = ()
+    ) -> OllamaBackend:
+        """Pick the available backend with the fewest outstanding requests,
+        staying on a backend that has the model loaded unless it is
+        noticeably busier than the least loaded one. Backends whose URL is
+        in exclude are skipped."""
+        self._schedule_background_tasks()
+        candidates = [
+            backend
+            for backend in self.backends
+            if backend.available and backend.url not in exclude
+        ]
+        if not candidates:
+            raise NoBackendAvailable("Circuit open for every Ollama backend")
+
+        def load(backend: OllamaBackend):
+            return (backend.in_flight, backend.total_requests)
+
+        least_loaded = min(candidates, key=load)
+        if model is None or least_loaded.has_model(model):
+            return least_loaded
+
+        warm = [backend for backend in candidates if backend.has_model(model)]
+        if warm:
+            best_warm = min(warm, key=load)
+            if best_warm.in_flight - least_loaded.in_flight <= self.affinity_max_skew:
+                # Least-outstanding routing alone would have loaded the model
+                MODEL_AFFINITY_STATS["affinity_routes"] += 1
+                return best_warm
+        return least_loaded
+
+    @asynccontextmanager
+    async def acquire(
+        self,
+        model: Optional[str] = None,
+        exclude: Collection[str] = (),
+        routed: Optional[Set[str]] = None,
+    ) -> AsyncIterator[OllamaBackend]:
+        """Reserve a backend for one request, recording its outcome.
+
+        With a model name the request also waits on the backend's model
+        gate, so calls for a model that is neither active nor loaded queue
+        up and run as a group once the backend drains. It then waits for a
+        slot from the backend's adaptive concurrency limit for the model.
+
+        Backends whose URL is in exclude are skipped; the chosen backend's
+        URL is added to routed before waiting.
+        """
+        backend = self.select(model, exclude)
+        if routed is not None:
+            routed.add(backend.url)
+        backend.breaker.on_request()
+        backend.in_flight += 1
+        backend.total_requests += 1
+        limiter = backend.limiter(model)
+        admitted = limited = recorded = False
+        try:
+            if model is not None:
+                await backend.gate.enter(model, loaded=backend.has_model(model))
+                admitted = True
+            await limiter.acquire()
+            limited = True
+            yield backend
+        except (httpx.HTTPError, OllamaRequestError) as e:
+            recorded = True
+            backend.record_failure(e)
+            limiter.record_drop()
+            raise
+        else:
+            recorded = True
+            backend.record_success()
+            if model is not None:
+                backend.loaded_models.add(normalize_model_name(model))
+        finally:
+            if not recorded:
+                # Cancelled, past its deadline or failed outside the
+                # request: a half-open trial it held is freed for the next
+                backend.breaker.on_abandoned()
+            backend.in_flight -= 1
+            if limited:
+                limiter.release()
+            if admitted:
+                backend.gate.exit()
+
+    def _schedule_background_tasks(self):
+        """Start /api/ps refreshes for backends whose loaded-model list is
+        stale"""
+        now = time.monotonic()
+        for backend in self.closed_backends:
+            if (
+                backend.models_refreshed_at is None
+                or now - backend.models_refreshed_at >= self.refresh_seconds
+            ):
+                self._spawn(f"ps:{backend.url}", self.refresh_models(backend))
+
+    def _spawn(self, key: str, coro):
+        """Run a background task unless one with the same key is running"""
+        if key in self._running:
+            coro.close()
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(coro)
+        except RuntimeError:
+            coro.close()
+            return
+        self._running.add(key)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda _task: self._running.discard(key))
+
+    async def refresh_loaded_models(self):
+        """Poll /api/ps on every backend that is in rotation"""
+        await asyncio.gather(
+            *(self.refresh_models(backend) for backend in self.closed_backends)
+        )
+
+    async def refresh_models(self, backend: OllamaBackend) -> bool:
+        """Replace the backend's loaded-model list with what /api/ps reports;
+        returns whether the backend answered"""
+        backend.models_refreshed_at = time.monotonic()
+        try:
+            response = await backend.session.get(f"{backend.url}/api/ps", timeout=5)
+            if response.status_code != 200:
+                return False
+            models = response.json().get("models", [])
+        except (httpx.HTTPError, ValueError, AttributeError):
+            return False
+
+        backend.loaded_models = {
+            normalize_model_name(entry.get("name") or entry.get("model", ""))
+            for entry in models
+            if entry.get("name") or entry.get("model")
+        }
+        logger.debug(
+            "🧠 Ollama backend %s has loaded: %s",
+            backend.url,
+            ", ".join(sorted(backend.loaded_models)) or "nothing",
+        )
+        return True
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Counters of every backend for metrics"""
+        return [backend.snapshot() for backend in self.backends]
+
+    async def aclose(self):
+        """Close every backend's connection pool"""
+        for task in list(self._tasks):
+            task.cancel()
+        for backend in self.backends:
+            await backend.session.aclose()
+
+
+_BACKEND_POOL: Optional[BackendPool] = None
+
+
+def get_backend_pool() -> BackendPool:
+    """Get or create the process-wide Ollama backend pool"""
+    global _BACKEND_POOL  # pylint: disable=global-statement
+    if _BACKEND_POOL is None:
+        _BACKEND_POOL = BackendPool.from_urls(OLLAMA_URLS)
+        logger.info("🌐 Ollama backend pool: %s", ", ".join(OLLAMA_URLS))
+    return _BACKEND_POOL
+
+
+def reset_backend_pool():
+    """Drop the process-wide pool so the next access rebuilds it"""
+    global _BACKEND_POOL  # pylint: disable=global-statement
+    _BACKEND_POOL = None
+
+
+async def close_backend_pool():
+    """Close the process-wide pool, releasing pooled connections"""
+    global _BACKEND_POOL  # pylint: disable=global-statement
+    if _BACKEND_POOL is not None:
+        pool, _BACKEND_POOL = _BACKEND_POOL, None
+        await pool.aclose()
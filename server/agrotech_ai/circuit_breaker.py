@@ -0,0 +1,123 @@
+"""
+Per-backend circuit breaker
+"""
+
+import logging
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker for one Ollama backend.
+
+    Closed: requests flow and consecutive failures are counted. Once they
+    reach the threshold the breaker opens. Open: no requests are routed to
+    the backend until the open period runs out, or until a health probe
+    reaches a backend whose last failure was a connection failure. Half-open:
+    a limited number of trial requests go through; a success closes the
+    breaker and a failure opens it again for twice as long, up to
+    max_open_seconds.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        open_seconds: float,
+        max_open_seconds: Optional[float] = None,
+        half_open_max_calls: int = 1,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds or open_seconds * 8
+        self.half_open_max_calls = half_open_max_calls
+        self.consecutive_failures = 0
+        self.opened_until: Optional[float] = None
+        self._state = CLOSED
+        self._current_open_seconds = open_seconds
+        self._trials = 0
+        self._unreachable = False
+
+    @property
+    def state(self) -> str:
+        """Current state; an expired open period counts as half-open"""
+        if self._state == OPEN and time.monotonic() >= self.opened_until:
+            self._to_half_open()
+        return self._state
+
+    def allow_request(self) -> bool:
+        """Whether a request may be routed to the backend now"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN:
+            return self._trials < self.half_open_max_calls
+        return False
+
+    def on_request(self):
+        """Note that a request was routed to the backend"""
+        if self._state == HALF_OPEN:
+            self._trials += 1
+
+    def on_abandoned(self):
+        """Give back the trial of a request that ended without an outcome,
+        e.g. cancelled or out of time, so the next one can try"""
+        if self._state == HALF_OPEN and self._trials > 0:
+            self._trials -= 1
+
+    def record_success(self):
+        """Close the breaker after a successful request"""
+        if self._state != CLOSED:
+            logger.info("✅ Circuit for %s closed", self.name)
+        self._state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_until = None
+        self._current_open_seconds = self.open_seconds
+        self._trials = 0
+
+    def record_failure(self, unreachable: bool = False):
+        """Count a failure, opening the breaker when needed; unreachable
+        marks a failure to connect, which a health probe can see recover"""
+        self.consecutive_failures += 1
+        self._unreachable = unreachable
+        if self._state == HALF_OPEN:
+            self._current_open_seconds = min(
+                self._current_open_seconds * 2, self.max_open_seconds
+            )
+            self.trip()
+        elif self._state == CLOSED and (
+            self.consecutive_failures >= self.failure_threshold
+        ):
+            self.trip()
+
+    def trip(self):
+        """Open the breaker for the current open period"""
+        self._state = OPEN
+        self._trials = 0
+        self.opened_until = time.monotonic() + self._current_open_seconds
+        logger.warning(
+            "⛔ Circuit for %s opened for %.0fs after %d consecutive failures",
+            self.name,
+            self._current_open_seconds,
+            self.consecutive_failures,
+        )
+
+    def half_open(self):
+        """Let a trial request through before the open period ends, after a
+        health probe reached the backend. Only a breaker opened because the
+        backend was unreachable is affected: a probe cannot tell whether
+        error answers or read timeouts have stopped."""
+        if self._state == OPEN and self._unreachable:
+            self._to_half_open()
+
+    def _to_half_open(self):
+        self._state = HALF_OPEN
+        self._trials = 0
+        logger.info("🟡 Circuit for %s half-open, allowing a trial request", self.name)
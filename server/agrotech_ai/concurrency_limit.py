@@ -0,0 +1,163 @@
+"""
+AIMD concurrency limiter for requests to one Ollama backend and model
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from .scheduling import (
+    SCHEDULER_STATS,
+    DeadlineExceeded,
+    FairQueue,
+    RequestContext,
+    current_request,
+)
+
+INITIAL_CONCURRENCY = float(os.getenv("OLLAMA_INITIAL_CONCURRENCY", "2"))
+MIN_CONCURRENCY = float(os.getenv("OLLAMA_MIN_CONCURRENCY", "1"))
+MAX_CONCURRENCY = float(os.getenv("OLLAMA_MAX_CONCURRENCY", "16"))
+# Time to first token above this multiple of the no-load baseline means
+# Ollama is queueing internally
+LATENCY_TOLERANCE = float(os.getenv("OLLAMA_LATENCY_TOLERANCE", "2.0"))
+BACKOFF_RATIO = float(os.getenv("OLLAMA_LIMIT_BACKOFF_RATIO", "0.75"))
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveLimiter:
+    """Additive-increase/multiplicative-decrease limit on concurrent
+    requests, driven by time to first token.
+
+    A CPU-only Ollama serves only a few generations efficiently; beyond
+    that, requests wait inside Ollama and every one of them gets slower.
+    The limiter tracks the no-load time to first token as a baseline. While
+    samples stay within the tolerance and the limit is in use it grows by
+    1/limit per sample (about one slot per round of requests); a slow
+    sample or a failed request shrinks it by the backoff ratio. Requests
+    over the limit wait here instead of inside Ollama, in a FairQueue
+    ordered by priority class, client fairness and deadline.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: float = INITIAL_CONCURRENCY,
+        minimum: float = MIN_CONCURRENCY,
+        maximum: float = MAX_CONCURRENCY,
+        tolerance: float = LATENCY_TOLERANCE,
+        backoff: float = BACKOFF_RATIO,
+    ):
+        self.name = name
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.in_flight = 0
+        self.baseline: Optional[float] = None
+        self._waiters = FairQueue()
+
+    @property
+    def slots(self) -> int:
+        """Whole number of requests allowed at once"""
+        return max(1, int(self.limit))
+
+    @property
+    def queued(self) -> int:
+        """Requests waiting for a slot"""
+        return len(self._waiters)
+
+    @property
+    def queued_by_priority(self) -> Dict[str, int]:
+        """Requests waiting for a slot, per priority class"""
+        return self._waiters.depth()
+
+    async def acquire(self, context: Optional[RequestContext] = None):
+        """Wait for a free slot under the caller's scheduling context,
+        raising DeadlineExceeded if its deadline passes first"""
+        context = context or current_request()
+        if self.in_flight < self.slots and not self._waiters:
+            self.in_flight += 1
+            return
+
+        remaining = context.remaining()
+        if remaining is not None and remaining <= 0:
+            SCHEDULER_STATS["deadline_expired"] += 1
+            raise DeadlineExceeded("Deadline passed before reaching Ollama")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.push(future, context)
+        try:
+            await asyncio.wait_for(future, timeout=remaining)
+        except asyncio.TimeoutError as e:
+            if future.done() and not future.cancelled():
+                # Granted as the deadline fired: hand the slot on
+                self.release()
+            else:
+                self._waiters.remove(future)
+            SCHEDULER_STATS["deadline_expired"] += 1
+            raise DeadlineExceeded("Deadline passed while waiting for Ollama") from e
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just before being cancelled: hand the slot on
+                self.release()
+            else:
+                self._waiters.remove(future)
+            raise
+
+    def release(self):
+        """Free a slot and hand it to the next waiter"""
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        while self.in_flight < self.slots:
+            future = self._waiters.pop()
+            if future is None:
+                return
+            self.in_flight += 1
+            future.set_result(None)
+
+    def record_latency(self, seconds: float):
+        """Adjust the limit with one time-to-first-token sample"""
+        if self.baseline is None or seconds < self.baseline:
+            self.baseline = seconds
+        else:
+            # Let the baseline drift up slowly so a permanently slower model
+            # (e.g. after a swap) does not pin the limit at the minimum
+            self.baseline += (seconds - self.baseline) * 0.01
+
+        if seconds > self.baseline * self.tolerance:
+            self._decrease("slow first token")
+        elif self.in_flight + self.queued >= self.slots:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._wake()
+
+    def record_drop(self):
+        """Shrink the limit after a failed or timed out request"""
+        self._decrease("failed request")
+
+    def _decrease(self, reason: str):
+        previous = self.slots
+        self.limit = max(self.minimum, self.limit * self.backoff)
+        if self.slots < previous:
+            logger.info(
+                "📉 Concurrency limit for %s lowered to %d (%s)",
+                self.name,
+                self.slots,
+                reason,
+            )
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current limit, usage and queue depth for metrics"""
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "queued_by_priority": self.queued_by_priority,
+            "baseline_ms": (
+                round(self.baseline * 1000, 1) if self.baseline is not None else None
+            ),
+        }
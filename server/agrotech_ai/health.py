@@ -0,0 +1,150 @@
+"""
+Background health probing of the Ollama backends
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from .backend_pool import BackendPool, OllamaBackend, get_backend_pool
+
+HEALTH_PROBE_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10"))
+HEALTH_PROBE_TIMEOUT = float(os.getenv("OLLAMA_HEALTH_TIMEOUT", "5"))
+# A cached status older than this is not trusted for readiness
+HEALTH_STALE_SECONDS = float(
+    os.getenv("OLLAMA_HEALTH_STALE_SECONDS", str(3 * HEALTH_PROBE_INTERVAL))
+)
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """Probes every backend's /api/tags and /api/ps on an interval and keeps
+    the latest result, so health checks and connection admission read a
+    cached status instead of calling Ollama themselves"""
+
+    def __init__(
+        self,
+        interval: float = HEALTH_PROBE_INTERVAL,
+        timeout: float = HEALTH_PROBE_TIMEOUT,
+        stale_seconds: float = HEALTH_STALE_SECONDS,
+    ):
+        self.interval = interval
+        self.timeout = timeout
+        self.stale_seconds = stale_seconds
+        self.checked_at: Optional[float] = None
+        self._backends: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._probe_lock = asyncio.Lock()
+
+    def start(self):
+        """Start the probe loop on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the probe loop"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.probe_all()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error("❌ Ollama health probe failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    async def probe_all(self):
+        """Probe every backend once and update the cached status"""
+        async with self._probe_lock:
+            pool = get_backend_pool()
+            await asyncio.gather(
+                *(self._probe_backend(pool, backend) for backend in pool.backends)
+            )
+            self.checked_at = time.time()
+
+    async def _probe_backend(self, pool: BackendPool, backend: OllamaBackend):
+        previous = self._backends.get(backend.url, {})
+        started = time.monotonic()
+        error = None
+        try:
+            response = await backend.session.get(
+                f"{backend.url}/api/tags", timeout=self.timeout
+            )
+            healthy = response.status_code == 200
+            if not healthy:
+                error = f"HTTP {response.status_code}"
+        except httpx.HTTPError as e:
+            healthy = False
+            error = str(e) or type(e).__name__
+        latency_ms = (time.monotonic() - started) * 1000
+
+        if healthy:
+            # A backend that could not be reached gets its trial request
+            # as soon as it answers again
+            backend.breaker.half_open()
+            await pool.refresh_models(backend)
+        elif previous.get("healthy", True):
+            logger.warning("💔 Ollama backend %s is down: %s", backend.url, error)
+
+        self._backends[backend.url] = {
+            "url": backend.url,
+            "healthy": healthy,
+            "latency_ms": round(latency_ms, 1) if healthy else None,
+            "last_seen": time.time() if healthy else previous.get("last_seen"),
+            "error": error,
+            "loaded_models": sorted(backend.loaded_models),
+            "circuit": backend.breaker.state,
+        }
+
+    @property
+    def backends(self) -> List[Dict[str, Any]]:
+        """Last known status of every probed backend"""
+        return list(self._backends.values())
+
+    def is_fresh(self) -> bool:
+        """Whether the cached status is recent enough to act on"""
+        return (
+            self.checked_at is not None
+            and time.time() - self.checked_at <= self.stale_seconds
+        )
+
+    def is_ready(self) -> bool:
+        """Whether a fresh probe found at least one healthy backend"""
+        return self.is_fresh() and any(
+            status["healthy"] for status in self._backends.values()
+        )
+
+    async def ollama_available(self) -> bool:
+        """Cached availability; probes once if nothing fresh is cached, e.g.
+        when the probe loop has not been started"""
+        if not self.is_fresh():
+            await self.probe_all()
+        return self.is_ready()
+
+
+_HEALTH_MONITOR: Optional[HealthMonitor] = None
+
+
+def get_health_monitor() -> HealthMonitor:
+    """Get or create the process-wide health monitor"""
+    global _HEALTH_MONITOR  # pylint: disable=global-statement
+    if _HEALTH_MONITOR is None:
+        _HEALTH_MONITOR = HealthMonitor()
+    return _HEALTH_MONITOR
+
+
+def reset_health_monitor():
+    """Drop the process-wide monitor so the next access rebuilds it"""
+    global _HEALTH_MONITOR  # pylint: disable=global-statement
+    _HEALTH_MONITOR = None
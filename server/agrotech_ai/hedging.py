@@ -0,0 +1,71 @@
+"""
+Latency tracking and load budget for hedged Ollama requests
+"""
+
+import math
+import os
+from collections import Counter, deque
+from typing import Deque, Dict, Optional
+
+from .retry import RetryBudget
+
+HEDGE_REQUESTS = os.getenv("OLLAMA_HEDGE", "false").lower() == "true"
+# A duplicate is sent once the first request runs longer than this
+# percentile of the agent's recent latencies
+HEDGE_PERCENTILE = float(os.getenv("OLLAMA_HEDGE_PERCENTILE", "95"))
+# No hedging until the percentile rests on this many samples
+HEDGE_MIN_SAMPLES = int(os.getenv("OLLAMA_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_WINDOW = int(os.getenv("OLLAMA_HEDGE_WINDOW", "200"))
+# Hedges may add at most this fraction of extra requests
+HEDGE_BUDGET_RATIO = float(os.getenv("OLLAMA_HEDGE_BUDGET_RATIO", "0.05"))
+
+# "hedges" sent, "hedge_wins" when the duplicate finished first and
+# "budget_exhausted" when the budget denied one
+HEDGE_STATS: Counter = Counter()
+
+
+class LatencyTracker:
+    """Sliding window of recent request latencies for one agent"""
+
+    def __init__(
+        self, window: int = HEDGE_WINDOW, min_samples: int = HEDGE_MIN_SAMPLES
+    ):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        """Add one latency sample"""
+        self._samples.append(seconds)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """Nearest-rank percentile of the window, or None with too few
+        samples to trust"""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        rank = max(1, math.ceil(percent / 100 * len(ordered)))
+        return ordered[rank - 1]
+
+
+_LATENCY_TRACKERS: Dict[str, LatencyTracker] = {}
+
+
+def latency_tracker(name: str) -> LatencyTracker:
+    """Get or create the latency tracker for an agent"""
+    if name not in _LATENCY_TRACKERS:
+        _LATENCY_TRACKERS[name] = LatencyTracker()
+    return _LATENCY_TRACKERS[name]
+
+
+def latency_snapshot() -> Dict[str, Optional[float]]:
+    """Current hedging threshold per agent, in milliseconds"""
+    snapshot = {}
+    for name, tracker in _LATENCY_TRACKERS.items():
+        threshold = tracker.percentile(HEDGE_PERCENTILE)
+        snapshot[name] = round(threshold * 1000, 1) if threshold is not None else None
+    return snapshot
+
+
+# Every hedge-eligible request deposits the ratio; time alone earns nothing,
+# so hedging never adds more than the ratio of extra load
+HEDGE_BUDGET = RetryBudget(ratio=HEDGE_BUDGET_RATIO, min_per_second=0.0, max_tokens=5.0)
@@ -0,0 +1,160 @@
+"""
+Deterministic vegetation and lesion measurements of a crop photo
+"""
+
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+ANALYTICS_ENABLED = os.getenv("IMAGE_ANALYTICS", "true").lower() == "true"
+# Measurements are made on a copy at most this large on its longest side
+ANALYTICS_SIZE = int(os.getenv("IMAGE_ANALYTICS_SIZE", "256"))
+# The photo is also measured per tile of a GRID x GRID split
+ANALYTICS_GRID = int(os.getenv("IMAGE_ANALYTICS_GRID", "3"))
+
+# Excess green (2g - r - b on chromatic coordinates) above which a pixel
+# counts as vegetation
+EXG_THRESHOLD = 0.1
+
+
+def thumbnail_pixels(image: Image.Image, size: int) -> np.ndarray:
+    """Float RGB array of a copy at most size pixels on its longest side"""
+    thumbnail = image.copy()
+    thumbnail.thumbnail((size, size), Image.Resampling.BILINEAR)
+    return np.asarray(thumbnail.convert("RGB"), dtype=np.float32)
+
+
+def excess_green(pixels: np.ndarray) -> np.ndarray:
+    """Excess green index of every pixel on chromatic coordinates"""
+    red, green, blue = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+    total = red + green + blue
+    total[total == 0] = 1.0
+    return (2 * green - red - blue) / total
+
+
+def mean_vari(pixels: np.ndarray) -> float:
+    """Mean Visible Atmospherically Resistant Index where it is defined"""
+    red, green, blue = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+    denominator = green + red - blue
+    defined = np.abs(denominator) > 1.0
+    if not defined.any():
+        return 0.0
+    return float(np.mean(np.clip((green - red)[defined] / denominator[defined], -1, 1)))
+
+
+def mean_gli(pixels: np.ndarray) -> float:
+    """Mean Green Leaf Index"""
+    red, green, blue = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+    denominator = 2 * green + red + blue
+    denominator[denominator == 0] = 1.0
+    return float(np.mean((2 * green - red - blue) / denominator))
+
+
+def _enclosed(mask: np.ndarray) -> np.ndarray:
+    """Pixels with mask pixels on their left, right, above and below, a
+    cheap stand-in for filling the holes of the mask"""
+    left = np.logical_or.accumulate(mask, axis=1)
+    right = np.logical_or.accumulate(mask[:, ::-1], axis=1)[:, ::-1]
+    above = np.logical_or.accumulate(mask, axis=0)
+    below = np.logical_or.accumulate(mask[::-1], axis=0)[::-1]
+    return left & right & above & below
+
+
+def _classify(pixels: np.ndarray):
+    """Canopy, discoloured (chlorotic) and lesion (necrotic) pixel masks"""
+    hsv = np.asarray(
+        Image.fromarray(pixels.astype(np.uint8), "RGB").convert("HSV"),
+        dtype=np.float32,
+    )
+    hue = hsv[..., 0] * 360 / 255
+    saturation = hsv[..., 1] / 255
+    value = hsv[..., 2] / 255
+
+    red, green = pixels[..., 0], pixels[..., 1]
+    canopy = (excess_green(pixels) > EXG_THRESHOLD) & (green >= red)
+    # Only spots inside the foliage count, so the soil around the plants is
+    # not mistaken for lesions
+    on_leaf = _enclosed(canopy) & ~canopy
+    discoloured = (
+        on_leaf & (hue >= 40) & (hue < 75) & (saturation >= 0.35) & (value >= 0.45)
+    )
+    lesion = (
+        on_leaf
+        & ~discoloured
+        & ((hue < 40) | (hue >= 340))
+        & (saturation >= 0.25)
+        & (value < 0.6)
+    )
+    return canopy, discoloured, lesion
+
+
+def _fractions(canopy, discoloured, lesion) -> Dict[str, float]:
+    plant = canopy.sum() + discoloured.sum() + lesion.sum()
+    return {
+        "canopy_coverage": float(canopy.mean()) if canopy.size else 0.0,
+        "discoloured_fraction": float(discoloured.sum() / plant) if plant else 0.0,
+        "lesion_fraction": float(lesion.sum() / plant) if plant else 0.0,
+    }
+
+
+def compute_analytics(image: Image.Image, grid: int = ANALYTICS_GRID) -> Dict[str, Any]:
+    """Canopy coverage, vegetation indices and discoloured and lesion
+    fractions of the photo and of each tile of a grid x grid split.
+
+    Discoloured and lesion fractions are relative to the plant area
+    (canopy plus discoloured plus lesion pixels)."""
+    start_time = time.perf_counter()
+    pixels = thumbnail_pixels(image, ANALYTICS_SIZE)
+    canopy, discoloured, lesion = _classify(pixels)
+
+    analytics: Dict[str, Any] = {
+        **_fractions(canopy, discoloured, lesion),
+        "exg": float(np.mean(excess_green(pixels))),
+        "vari": mean_vari(pixels),
+        "gli": mean_gli(pixels),
+    }
+
+    tiles: List[List[Dict[str, float]]] = []
+    rows = np.array_split(np.arange(canopy.shape[0]), grid)
+    columns = np.array_split(np.arange(canopy.shape[1]), grid)
+    for row in rows:
+        tiles.append([])
+        for column in columns:
+            area = np.ix_(row, column)
+            tile = _fractions(canopy[area], discoloured[area], lesion[area])
+            tiles[-1].append({key: round(val, 3) for key, val in tile.items()})
+
+    analytics = {key: round(val, 3) for key, val in analytics.items()}
+    analytics["tiles"] = tiles
+    analytics["elapsed_ms"] = round((time.perf_counter() - start_time) * 1000, 1)
+    return analytics
+
+
+def _worst_tile(analytics: Dict[str, Any]) -> Optional[str]:
+    worst = None
+    for row, tiles in enumerate(analytics.get("tiles", ()), start=1):
+        for column, tile in enumerate(tiles, start=1):
+            damaged = tile["discoloured_fraction"] + tile["lesion_fraction"]
+            if damaged > 0 and (worst is None or damaged > worst[0]):
+                worst = (damaged, row, column)
+    if worst is None:
+        return None
+    return f"fila {worst[1]}, columna {worst[2]} ({worst[0]:.1%} del área foliar)"
+
+
+def analytics_summary(analytics: Dict[str, Any]) -> str:
+    """One line of measured figures for an agent prompt"""
+    summary = (
+        f"cobertura vegetal {analytics['canopy_coverage']:.0%}, "
+        f"VARI {analytics['vari']:.2f}, ExG {analytics['exg']:.2f}, "
+        f"GLI {analytics['gli']:.2f}, "
+        f"píxeles decolorados {analytics['discoloured_fraction']:.1%} y "
+        f"lesiones {analytics['lesion_fraction']:.1%} del área foliar"
+    )
+    worst = _worst_tile(analytics)
+    if worst is not None:
+        summary += f"; zona más afectada: {worst}"
+    return summary
@@ -0,0 +1,170 @@
+"""
+Bounded process pool that keeps image preprocessing off the event loop
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Worker processes; 0 runs jobs on threads of the server process instead
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Jobs running or waiting for a worker, including abandoned jobs a worker
+# is still busy with; uploads beyond this are refused
+IMAGE_QUEUE_LIMIT = int(os.getenv("IMAGE_QUEUE_LIMIT", str(max(1, IMAGE_WORKERS) * 4)))
+# A job still unfinished after this many seconds is abandoned
+IMAGE_JOB_TIMEOUT = float(os.getenv("IMAGE_JOB_TIMEOUT", "30"))
+
+# "jobs" finished, "rejected" by the queue limit, "timeouts", "failures",
+# and the total "wait_ms" and "run_ms" of finished jobs
+IMAGE_POOL_STATS: Counter = Counter()
+
+
+class ImagePoolFull(RuntimeError):
+    """Raised when the image queue is at its limit"""
+
+
+def _timed(func: Callable[..., Any], args: Tuple[Any, ...]):
+    """Run a job in the worker, noting when it started and how long it ran"""
+    started = time.time()
+    result = func(*args)
+    return result, started, time.time() - started
+
+
+class ImagePool:
+    """Process pool for image jobs with a bound on queued work.
+
+    A job is refused with ImagePoolFull once limit jobs are running or
+    waiting, so a burst of uploads is pushed back to the clients instead of
+    piling up in memory."""
+
+    def __init__(
+        self,
+        workers: int = IMAGE_WORKERS,
+        limit: int = IMAGE_QUEUE_LIMIT,
+        timeout: float = IMAGE_JOB_TIMEOUT,
+    ):
+        self.workers = workers
+        self.limit = limit
+        self.timeout = timeout
+        self.pending = 0
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        # Spawned rather than forked: the server process has threads and an
+        # event loop that a fork would copy mid-flight
+        if self._executor is None:
+            if self.workers > 0:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(thread_name_prefix="image")
+        return self._executor
+
+    def _release(self):
+        self.pending -= 1
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run func(*args) in a worker and return its result"""
+        if self.pending >= self.limit:
+            IMAGE_POOL_STATS["rejected"] += 1
+            logger.warning(
+                "🚦 Image queue full (%d jobs), refusing upload", self.pending
+            )
+            raise ImagePoolFull(
+                "Hay demasiadas imágenes en proceso, inténtalo de nuevo en unos segundos"
+            )
+
+        submitted = time.time()
+        loop = asyncio.get_running_loop()
+        job = self._get_executor().submit(_timed, func, args)
+        self.pending += 1
+
+        def release(_job):
+            # The slot is held until the worker is done with the job, even
+            # when the caller stopped waiting, so the limit tracks real load
+            try:
+                loop.call_soon_threadsafe(self._release)
+            except RuntimeError:
+                pass  # Event loop closed at shutdown
+
+        job.add_done_callback(release)
+        try:
+            async with asyncio.timeout(self.timeout):
+                # Cancelling the wrapper drops the job if it has not started
+                result, started, run_seconds = await asyncio.wrap_future(job)
+        except TimeoutError:
+            IMAGE_POOL_STATS["timeouts"] += 1
+            logger.error("⏱️ Image job abandoned after %.0fs", self.timeout)
+            raise
+        except Exception:
+            IMAGE_POOL_STATS["failures"] += 1
+            raise
+
+        wait_ms = max(0.0, started - submitted) * 1000
+        run_ms = run_seconds * 1000
+        IMAGE_POOL_STATS["jobs"] += 1
+        IMAGE_POOL_STATS["wait_ms"] += wait_ms
+        IMAGE_POOL_STATS["run_ms"] += run_ms
+        logger.info(
+            "🧵 Image job %s ran %.1fms after waiting %.1fms",
+            getattr(func, "__name__", func),
+            run_ms,
+            wait_ms,
+        )
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Pool size, queue and job timings for metrics"""
+        jobs = IMAGE_POOL_STATS["jobs"]
+        return {
+            "workers": self.workers,
+            "limit": self.limit,
+            "pending": self.pending,
+            "jobs": jobs,
+            "rejected": IMAGE_POOL_STATS["rejected"],
+            "timeouts": IMAGE_POOL_STATS["timeouts"],
+            "failures": IMAGE_POOL_STATS["failures"],
+            "avg_wait_ms": (
+                round(IMAGE_POOL_STATS["wait_ms"] / jobs, 1) if jobs else None
+            ),
+            "avg_run_ms": round(IMAGE_POOL_STATS["run_ms"] / jobs, 1) if jobs else None,
+        }
+
+    def close(self):
+        """Stop the worker processes, dropping jobs not yet started"""
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_IMAGE_POOL: Optional[ImagePool] = None
+
+
+def get_image_pool() -> ImagePool:
+    """Get or create the process-wide image pool"""
+    global _IMAGE_POOL  # pylint: disable=global-statement
+    if _IMAGE_POOL is None:
+        _IMAGE_POOL = ImagePool()
+        logger.info(
+            "🧵 Image pool: %d workers, %d queued jobs at most",
+            _IMAGE_POOL.workers,
+            _IMAGE_POOL.limit,
+        )
+    return _IMAGE_POOL
+
+
+def close_image_pool():
+    """Shut the process-wide pool down; the next access starts a new one"""
+    global _IMAGE_POOL  # pylint: disable=global-statement
+    if _IMAGE_POOL is not None:
+        pool, _IMAGE_POOL = _IMAGE_POOL, None
+        pool.close()
@@ -0,0 +1,130 @@
+"""
+Cheap pixel statistics that screen uploads before the vision model
+"""
+
+import os
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from .image_analytics import EXG_THRESHOLD, excess_green, mean_vari, thumbnail_pixels
+
+PREFILTER_ENABLED = os.getenv("IMAGE_PREFILTER", "true").lower() == "true"
+# Signals are computed on a copy at most this large on its longest side
+PREFILTER_SIZE = int(os.getenv("IMAGE_PREFILTER_SIZE", "256"))
+# Below this fraction of vegetation pixels the photo is flagged, and
+# rejected when IMAGE_PREFILTER_REJECT_NON_VEGETATION is set; off by
+# default because bare-soil photos are valid SoilSense input
+MIN_VEGETATION = float(os.getenv("IMAGE_PREFILTER_MIN_VEGETATION", "0.01"))
+REJECT_NON_VEGETATION = (
+    os.getenv("IMAGE_PREFILTER_REJECT_NON_VEGETATION", "false").lower() == "true"
+)
+# Variance of the Laplacian (0-255 grey levels) under which a photo is too
+# blurry to describe
+MIN_SHARPNESS = float(os.getenv("IMAGE_PREFILTER_MIN_SHARPNESS", "15"))
+# Fraction of crushed-black or blown-white pixels that makes a photo unusable
+MAX_CLIPPED = float(os.getenv("IMAGE_PREFILTER_MAX_CLIPPED", "0.7"))
+
+# Grey levels at or beyond which a pixel is clipped
+DARK_LEVEL = 10
+BRIGHT_LEVEL = 245
+# Thumbnails smaller than this on either side are too small to judge
+# sharpness
+MIN_SHARPNESS_SIDE = 32
+
+# "checked" images, "rejected" before the model and "flagged" but sent on
+PREFILTER_STATS: Counter = Counter()
+
+
+class ImageSignals:  # pylint: disable=too-few-public-methods
+    """Vegetation, sharpness and exposure measurements of one photo"""
+
+    def __init__(
+        self,
+        vegetation_fraction: float,
+        vari: float,
+        sharpness: Optional[float],
+        underexposed: float,
+        overexposed: float,
+        elapsed_ms: float,
+    ):
+        self.vegetation_fraction = vegetation_fraction
+        self.vari = vari
+        self.sharpness = sharpness
+        self.underexposed = underexposed
+        self.overexposed = overexposed
+        self.elapsed_ms = elapsed_ms
+
+    @property
+    def flags(self) -> List[str]:
+        """Problems found in the photo"""
+        flags = []
+        if self.vegetation_fraction < MIN_VEGETATION:
+            flags.append("no_vegetation")
+        if self.sharpness is not None and self.sharpness < MIN_SHARPNESS:
+            flags.append("blurry")
+        if self.underexposed > MAX_CLIPPED:
+            flags.append("underexposed")
+        if self.overexposed > MAX_CLIPPED:
+            flags.append("overexposed")
+        return flags
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Rounded signals for results and logs"""
+        return {
+            "vegetation_fraction": round(self.vegetation_fraction, 3),
+            "vari": round(self.vari, 3),
+            "sharpness": (
+                round(self.sharpness, 1) if self.sharpness is not None else None
+            ),
+            "underexposed": round(self.underexposed, 3),
+            "overexposed": round(self.overexposed, 3),
+            "flags": self.flags,
+            "elapsed_ms": round(self.elapsed_ms, 1),
+        }
+
+
+def compute_signals(image: Image.Image) -> ImageSignals:
+    """Measure a photo on a small RGB copy; the image itself is untouched"""
+    start_time = time.perf_counter()
+    pixels = thumbnail_pixels(image, PREFILTER_SIZE)
+    red, green, blue = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+
+    grey = 0.299 * red + 0.587 * green + 0.114 * blue
+    if min(grey.shape) >= MIN_SHARPNESS_SIDE:
+        laplacian = (
+            grey[:-2, 1:-1]
+            + grey[2:, 1:-1]
+            + grey[1:-1, :-2]
+            + grey[1:-1, 2:]
+            - 4 * grey[1:-1, 1:-1]
+        )
+        sharpness: Optional[float] = float(laplacian.var())
+    else:
+        sharpness = None
+
+    return ImageSignals(
+        vegetation_fraction=float(np.mean(excess_green(pixels) > EXG_THRESHOLD)),
+        vari=mean_vari(pixels),
+        sharpness=sharpness,
+        underexposed=float(np.mean(grey <= DARK_LEVEL)),
+        overexposed=float(np.mean(grey >= BRIGHT_LEVEL)),
+        elapsed_ms=(time.perf_counter() - start_time) * 1000,
+    )
+
+
+def rejection_reason(signals: ImageSignals) -> Optional[str]:
+    """Why the photo should not reach the vision model, or None"""
+    flags = signals.flags
+    if "blurry" in flags:
+        return "La imagen está demasiado borrosa para analizarla"
+    if "underexposed" in flags:
+        return "La imagen está demasiado oscura para analizarla"
+    if "overexposed" in flags:
+        return "La imagen está sobreexpuesta para analizarla"
+    if REJECT_NON_VEGETATION and "no_vegetation" in flags:
+        return "La imagen no muestra vegetación"
+    return None
@@ -0,0 +1,188 @@
+"""
+CPU-bound preprocessing of uploaded images, run in the image worker pool
+"""
+
+import base64
+import io
+import logging
+import math
+import os
+import time
+from typing import Any, Dict, Optional, Union
+
+from PIL import Image
+
+from .image_analytics import compute_analytics
+from .image_prefilter import compute_signals, rejection_reason
+
+logger = logging.getLogger(__name__)
+
+# Longest side of the image sent to a vision model without an entry below
+MAX_IMAGE_SIZE = int(os.getenv("VISION_IMAGE_SIZE", "1024"))
+# Input resolution of known vision encoders; anything larger is downscaled
+# by the model anyway. VISION_IMAGE_SIZES ("llava=336,gemma3=896")
+# overrides or extends the table
+MODEL_IMAGE_SIZES = {
+    "gemma3": 896,
+    "llava": 672,
+    "llama3.2-vision": 1120,
+    "moondream": 378,
+}
+for _entry in filter(None, os.getenv("VISION_IMAGE_SIZES", "").split(",")):
+    _model, _, _size = _entry.partition("=")
+    MODEL_IMAGE_SIZES[_model.strip()] = int(_size)
+
+# Formats the JPEG decoder can downscale while decoding
+DRAFT_FORMATS = ("JPEG", "MPO")
+
+
+def target_image_size(model: str) -> int:
+    """Longest image side worth sending to a vision model"""
+    family = model.split("/")[-1].split(":")[0]
+    return MODEL_IMAGE_SIZES.get(family, MAX_IMAGE_SIZE)
+
+
+def needs_reencode(image: Image.Image, max_size: int) -> bool:
+    """False for an RGB JPEG already within max_size, which is sent as is"""
+    return not (
+        image.format == "JPEG" and image.mode == "RGB" and max(image.size) <= max_size
+    )
+
+
+def draft_for_size(image: Image.Image, max_size: int):
+    """Have the JPEG decoder scale by 1/2, 1/4 or 1/8 in the DCT domain,
+    keeping the longest side at least max_size; must run before the image
+    is loaded, and does nothing for other formats"""
+    if image.format not in DRAFT_FORMATS or max(image.size) <= max_size:
+        return
+    ratio = max_size / max(image.size)
+    image.draft("RGB", tuple(math.ceil(dim * ratio) for dim in image.size))
+
+
+def as_base64(upload: Union[str, bytes, bytearray]) -> str:
+    """Base64 text of an upload, as Ollama takes images"""
+    if isinstance(upload, str):
+        return upload
+    return base64.b64encode(upload).decode("ascii")
+
+
+def optimize_image(
+    upload: Union[str, bytes, bytearray],
+    image: Optional[Image.Image] = None,
+    max_size: int = MAX_IMAGE_SIZE,
+) -> str:
+    """Optimize image size and quality for faster processing; the upload is
+    base64 text or raw bytes, and the result base64 for the model. The
+    upload is returned unchanged when it is already a small RGB JPEG or
+    cannot be re-encoded"""
+    start_time = time.time()
+    logger.info("🖼️  Starting image optimization")
+
+    try:
+        image_data = base64.b64decode(upload) if isinstance(upload, str) else upload
+        original_size = len(image_data)
+        if image is None:
+            image = Image.open(io.BytesIO(image_data))
+            if not needs_reencode(image, max_size):
+                logger.info("✅ Image already a %s JPEG, sent as is", image.size)
+                return as_base64(upload)
+            draft_for_size(image, max_size)
+
+        logger.debug(
+            f"🖼️  Original image: {image.size}, "
+            f"format: {image.format}, size: {original_size/1024:.1f}KB"
+        )
+
+        # Resize if too large; reducing_gap box-reduces most of the way
+        # before the LANCZOS pass
+        if max(image.size) > max_size:
+            ratio = max_size / max(image.size)
+            new_size = tuple(int(dim * ratio) for dim in image.size)
+            image = image.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+            logger.info(f"🖼️  Image resized from {image.size} to {new_size}")
+
+        # Convert to RGB if necessary
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+            logger.debug("🖼️  Image converted to RGB")
+
+        # Save optimized image
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=85, optimize=True)
+        optimized_data = buffer.getvalue()
+        optimized_size = len(optimized_data)
+
+        elapsed_time = time.time() - start_time
+        compression_ratio = (1 - optimized_size / original_size) * 100
+
+        logger.info(
+            "✅ Image optimized in %.2fs: %.1fKB → %.1fKB (%.1f%% reduction)",
+            elapsed_time,
+            original_size / 1024,
+            optimized_size / 1024,
+            compression_ratio,
+        )
+
+        return base64.b64encode(optimized_data).decode("utf-8")
+    except Exception as e:
+        elapsed_time = time.time() - start_time
+        logger.error(f"❌ Image optimization failed after {elapsed_time:.2f}s: {e}")
+        return as_base64(upload)  # Return original if optimization fails
+
+
+def preprocess_image(
+    upload: Union[str, bytes, bytearray],
+    prefilter: bool = True,
+    analytics: bool = True,
+    max_size: int = MAX_IMAGE_SIZE,
+) -> Dict[str, Any]:
+    """Decode, screen, measure and re-encode an upload in one pass.
+
+    Runs in a worker process, so it takes and returns only plain values:
+    the upload as base64 text or raw bytes, and the image to send to the
+    model (always base64), the prefilter signals (with a reason when the
+    photo is rejected, in which case nothing else is done), the image
+    analytics and the time spent. A JPEG is decoded at a reduced scale
+    close to max_size, and measured at that scale."""
+    start_time = time.perf_counter()
+    result: Dict[str, Any] = {
+        "image": None,
+        "prefilter": None,
+        "image_analytics": None,
+    }
+    try:
+        image_data = base64.b64decode(upload) if isinstance(upload, str) else upload
+        image = Image.open(io.BytesIO(image_data))
+        reencode = needs_reencode(image, max_size)
+        draft_for_size(image, max_size)
+        image.load()
+    except Exception as e:
+        logger.warning(f"⚠️ Could not decode image: {e}")
+        result["image"] = as_base64(upload)
+        result["elapsed_ms"] = (time.perf_counter() - start_time) * 1000
+        return result
+
+    if prefilter:
+        try:
+            signals = compute_signals(image)
+            result["prefilter"] = signals.as_dict()
+            reason = rejection_reason(signals)
+            if reason is not None:
+                result["prefilter"]["reason"] = reason
+                result["elapsed_ms"] = (time.perf_counter() - start_time) * 1000
+                return result
+        except Exception as e:
+            logger.warning(f"⚠️ Image prefilter failed: {e}")
+
+    if analytics:
+        try:
+            result["image_analytics"] = compute_analytics(image)
+        except Exception as e:
+            logger.warning(f"⚠️ Image analytics failed: {e}")
+
+    # Base64 is only produced here, for the image actually sent
+    result["image"] = (
+        optimize_image(image_data, image, max_size) if reencode else as_base64(upload)
+    )
+    result["elapsed_ms"] = (time.perf_counter() - start_time) * 1000
+    return result
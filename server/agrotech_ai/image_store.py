@@ -0,0 +1,115 @@
+"""
+Bounded store of analysed photos, so a photo can be re-analysed under new
+conditions without uploading it or running ImageVision again
+"""
+
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Photos kept, least recently used evicted first
+IMAGE_STORE_MAX_ENTRIES = int(os.getenv("IMAGE_STORE_MAX_ENTRIES", "64"))
+# Total size of the stored images (base64 characters)
+IMAGE_STORE_MAX_BYTES = int(os.getenv("IMAGE_STORE_MAX_BYTES", str(128 * 1024 * 1024)))
+IMAGE_STORE_TTL_SECONDS = float(os.getenv("IMAGE_STORE_TTL_SECONDS", "3600"))
+
+# "stores", "hits", "misses" and "evictions"
+IMAGE_STORE_STATS: Counter = Counter()
+
+
+def content_id(image: Union[str, bytes, bytearray]) -> str:
+    """Content hash naming a photo: the sha256 of its bytes, whether they
+    were sent as base64 or binary"""
+    if isinstance(image, str):
+        try:
+            image = base64.b64decode(image)
+        except (binascii.Error, ValueError):
+            image = image.encode("utf-8")
+    return hashlib.sha256(image).hexdigest()
+
+
+class StoredImage:  # pylint: disable=too-few-public-methods
+    """A photo as sent to the vision model and ImageVision's result for it"""
+
+    def __init__(self, image: str, result: Dict[str, Any]):
+        self.image = image
+        self.result = result
+        self.stored_at = time.time()
+
+
+class ImageStore:
+    """LRU of analysed photos bounded by count, total size and age"""
+
+    def __init__(
+        self,
+        max_entries: int = IMAGE_STORE_MAX_ENTRIES,
+        max_bytes: int = IMAGE_STORE_MAX_BYTES,
+        ttl_seconds: float = IMAGE_STORE_TTL_SECONDS,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.size = 0
+        self._entries: "OrderedDict[str, StoredImage]" = OrderedDict()
+
+    def put(self, key: str, image: str, result: Dict[str, Any]):
+        """Keep the photo and its ImageVision result under its image id"""
+        if len(image) > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = StoredImage(image, result)
+        self.size += len(image)
+        IMAGE_STORE_STATS["stores"] += 1
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            evicted_key, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted.image)
+            IMAGE_STORE_STATS["evictions"] += 1
+            logger.debug("🗑️ Image %s evicted from the image store", evicted_key[:12])
+
+    def __contains__(self, key: str) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and time.time() - entry.stored_at <= self.ttl_seconds
+
+    def get(self, key: str) -> Optional[StoredImage]:
+        """The stored photo, or None when unknown or expired"""
+        entry = self._entries.get(key)
+        if entry is not None and time.time() - entry.stored_at > self.ttl_seconds:
+            self._remove(key)
+            entry = None
+        if entry is None:
+            IMAGE_STORE_STATS["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        IMAGE_STORE_STATS["hits"] += 1
+        return entry
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry.image)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Store occupancy and counters for metrics"""
+        return {
+            **IMAGE_STORE_STATS,
+            "entries": len(self._entries),
+            "bytes": self.size,
+        }
+
+
+_IMAGE_STORE: Optional[ImageStore] = None
+
+
+def get_image_store() -> ImageStore:
+    """Get or create the process-wide image store"""
+    global _IMAGE_STORE  # pylint: disable=global-statement
+    if _IMAGE_STORE is None:
+        _IMAGE_STORE = ImageStore()
+    return _IMAGE_STORE
@@ -0,0 +1,69 @@
+"""
+Incremental JSON detection for streamed model output
+"""
+
+import json
+from typing import Any, List
+
+
+class IncrementalJSONParser:
+    """Scans streamed text token by token and recognises when the first
+    top-level JSON object has been closed, so generation can stop early"""
+
+    def __init__(self):
+        self._parts: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._started = False
+        self.complete = False
+
+    @property
+    def started(self) -> bool:
+        """Whether the opening brace of the object has been seen"""
+        return self._started
+
+    @property
+    def text(self) -> str:
+        """Text of the object from its opening brace up to what was fed"""
+        return "".join(self._parts)
+
+    def feed(self, chunk: str) -> bool:
+        """Feed a streamed chunk; returns True once the object is closed"""
+        if self.complete:
+            return True
+
+        start = 0
+        if not self._started:
+            start = chunk.find("{")
+            if start == -1:
+                return False
+            self._started = True
+
+        for index in range(start, len(chunk)):
+            char = chunk[index]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._parts.append(chunk[start : index + 1])
+                    self.complete = True
+                    return True
+
+        self._parts.append(chunk[start:])
+        return False
+
+    def parse(self) -> Any:
+        """Decode the completed object, raising json.JSONDecodeError if the
+        model produced a balanced but invalid structure"""
+        return json.loads(self.text)
@@ -0,0 +1,163 @@
+"""
+Per-backend admission gate that groups queued Ollama calls by model
+"""
+
+import asyncio
+import os
+from collections import Counter, OrderedDict, deque
+from typing import Deque, Dict, Optional
+
+# How many same-model calls may jump ahead of a waiting model before the
+# gate drains and switches, so a busy model cannot starve the other one
+MODEL_BATCH_LIMIT = int(os.getenv("OLLAMA_MODEL_BATCH_LIMIT", "8"))
+# Let calls for a model the backend already has loaded run beside another
+# model; turn off on hosts that fit one model (OLLAMA_MAX_LOADED_MODELS=1)
+MODEL_GATE_SHARE_LOADED = (
+    os.getenv("OLLAMA_MODEL_GATE_SHARE_LOADED", "true").lower() == "true"
+)
+
+# Process-wide affinity counters exposed on /metrics
+MODEL_AFFINITY_STATS: Counter = Counter()
+
+
+def normalize_model_name(name: str) -> str:
+    """Ollama reports untagged models with an implicit ':latest' tag"""
+    return name if ":" in name else f"{name}:latest"
+
+
+def affinity_snapshot() -> Dict[str, int]:
+    """Affinity counters, with swaps avoided by routing and by grouping"""
+    stats = {
+        key: MODEL_AFFINITY_STATS[key]
+        for key in ("affinity_routes", "grouped", "model_swaps")
+    }
+    stats["swaps_avoided"] = stats["affinity_routes"] + stats["grouped"]
+    return stats
+
+
+class ModelGate:
+    """Admits calls for one model at a time on a single backend.
+
+    While calls for the active model are running, calls for another model
+    wait and are queued by model. When the backend drains, the model with
+    the most waiters is admitted as one group, so Ollama loads it once for
+    the whole group instead of swapping back and forth per request.
+
+    A call for a model the backend already has loaded needs no swap, so
+    with share_loaded it runs beside the active model unless calls are
+    waiting for their turn.
+    """
+
+    def __init__(
+        self,
+        batch_limit: int = MODEL_BATCH_LIMIT,
+        share_loaded: bool = MODEL_GATE_SHARE_LOADED,
+    ):
+        self.batch_limit = batch_limit
+        self.share_loaded = share_loaded
+        self.active_model: Optional[str] = None
+        self.last_model: Optional[str] = None
+        self.running = 0
+        self.swaps = 0
+        self._streak = 0
+        self._waiters: Dict[str, Deque[asyncio.Future]] = OrderedDict()
+
+    @property
+    def queued(self) -> int:
+        """Number of calls waiting for their model to become active"""
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def _others_waiting(self, model: str) -> bool:
+        return any(name != model and queue for name, queue in self._waiters.items())
+
+    def _shares(self, model: str, loaded: bool) -> bool:
+        return (
+            self.share_loaded
+            and loaded
+            and self.running > 0
+            and self.active_model != model
+            and not self._waiters
+        )
+
+    def _can_admit(self, model: str) -> bool:
+        if self.running == 0 and not self._waiters:
+            return True
+        if self.active_model != model:
+            return False
+        return not self._others_waiting(model) or self._streak < self.batch_limit
+
+    def _admit(self, model: str, loaded: bool = False):
+        if self._others_waiting(model):
+            # Served ahead of a different model: one swap deferred
+            MODEL_AFFINITY_STATS["grouped"] += 1
+        if not loaded and self.last_model is not None and self.last_model != model:
+            self.swaps += 1
+            MODEL_AFFINITY_STATS["model_swaps"] += 1
+        self._streak = self._streak + 1 if self.active_model == model else 1
+        self.active_model = model
+        self.last_model = model
+        self.running += 1
+
+    async def enter(self, model: str, loaded: bool = False):
+        """Wait until calls for this model may run on the backend; loaded
+        tells whether the backend already has the model in memory"""
+        if self._shares(model, loaded):
+            # No swap needed: leave the active model and its group alone
+            self.running += 1
+            return
+        if self._can_admit(model):
+            self._admit(model, loaded)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(model, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just before being cancelled: give the slot back
+                self.exit()
+            else:
+                self._discard(model, future)
+            raise
+
+    def exit(self):
+        """Release a slot and admit the next group once the backend drains"""
+        self.running -= 1
+        if self.running == 0:
+            if not self._waiters:
+                self.active_model = None
+            self._wake_next()
+
+    def _discard(self, model: str, future: asyncio.Future):
+        queue = self._waiters.get(model)
+        if queue is not None and future in queue:
+            queue.remove(future)
+            if not queue:
+                del self._waiters[model]
+        if self.running == 0:
+            self._wake_next()
+
+    def _wake_next(self):
+        """Admit the largest group of waiting calls for a single model"""
+        if self.running or not self._waiters:
+            return
+
+        current = self.active_model
+        if current in self._waiters and self._streak < self.batch_limit:
+            model = current
+        else:
+            others = [name for name in self._waiters if name != current]
+            model = max(
+                others or self._waiters, key=lambda name: len(self._waiters[name])
+            )
+            self._streak = 0
+
+        queue = self._waiters.pop(model)
+        while queue:
+            future = queue.popleft()
+            if not future.done():
+                self._admit(model)
+                future.set_result(None)
+        if self.running == 0:
+            self._wake_next()
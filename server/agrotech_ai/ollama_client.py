@@ -2,6 +2,7 @@
 AI Agents for Agricultural Monitoring System
 """
 
+import asyncio
 import json
 import logging
 
@@ -9,14 +10,31 @@ import logging
 import os
 import re
 import time
-from typing import Any, Dict, List
-
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-
-OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
-OLLAMA_GENERATE_API = f"{OLLAMA_URL}/api/generate"
+from collections import Counter
+from typing import Any, Collection, Dict, List, Optional, Set, Tuple
+
+from .backend_pool import (
+    RETRYABLE_ERRORS,
+    BackendPool,
+    NoBackendAvailable,
+    OllamaRequestError,
+    RetryableOllamaError,
+    get_backend_pool,
+)
+from .hedging import (
+    HEDGE_BUDGET,
+    HEDGE_PERCENTILE,
+    HEDGE_REQUESTS,
+    HEDGE_STATS,
+    latency_tracker,
+)
+from .json_stream import IncrementalJSONParser
+from .response_cache import CACHE_ENABLED
+from .response_cache import cache_key as response_cache_key
+from .response_cache import get_response_cache
+from .retry import MAX_RETRIES, RETRY_BUDGET, RETRY_STATS, backoff_delay
+from .scheduling import SCHEDULER_STATS, DeadlineExceeded, current_request
+from .single_flight import SingleFlight, TokenCallback, request_key
 
 # Models from environment variables with fallback defaults
 MODEL_NAME = os.getenv("OLLAMA_TEXT_MODEL", "gemma3:270m")
@@ -25,61 +43,40 @@ VISION_MODEL_NAME = os.getenv("OLLAMA_VISION_MODEL", "gemma3:270m")
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Shared session pool for all agents
-_SHARED_SESSION = None
-
-
-def get_shared_session():
-    """Get or create shared session with connection pooling"""
-    global _SHARED_SESSION  # pylint: disable=global-statement
-    if _SHARED_SESSION is None:
-        _SHARED_SESSION = requests.Session()
-
-        # Retry strategy
-        retry_strategy = Retry(
-            total=3,
-            backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504],
-        )
-
-        # Mount adapter with retry strategy
-        adapter = HTTPAdapter(
-            max_retries=retry_strategy, pool_connections=20, pool_maxsize=50
-        )
-        _SHARED_SESSION.mount("http://", adapter)
-        _SHARED_SESSION.mount("https://", adapter)
-
-    return _SHARED_SESSION
-
-
-def reset_shared_session():
-    """Reset shared session in case of persistent connection issues"""
-    global _SHARED_SESSION  # pylint: disable=global-statement
-    if _SHARED_SESSION:
-        _SHARED_SESSION.close()
-        _SHARED_SESSION = None
+# Fewest tokens a call squeezed by the analysis deadline is asked for
+MIN_NUM_PREDICT = int(os.getenv("OLLAMA_MIN_NUM_PREDICT", "64"))
 
+# Share one Ollama call between identical requests that are in flight
+COALESCE_REQUESTS = os.getenv("OLLAMA_COALESCE", "true").lower() == "true"
+_SINGLE_FLIGHT = SingleFlight()
 
-def check_ollama_connection() -> bool:
-    """Check if Ollama is running and accessible"""
-    try:
-        logger.info("✅ checking OLLAMA_HEALTH %s/api/tags", OLLAMA_URL)
-        response = requests.get(f"{OLLAMA_URL}/api/tags", timeout=5)
-        return response.status_code == 200
-    except requests.exceptions.RequestException:
-        return False
+# How agent outputs were decoded: "strict" means valid JSON straight from the
+# schema-constrained stream; the other outcomes went through the repair path
+JSON_PARSE_STATS: Counter = Counter()
 
 
 class OllamaAgent:  # pylint: disable=too-few-public-methods
     """Base class for all Ollama-powered AI agents"""
 
+    # JSON schema sent as Ollama's `format` constraint, if any
+    response_schema: Optional[Dict[str, Any]] = None
+
     def __init__(self, role: str, expertise: str):
         self.role = role
         self.expertise = expertise
-        self.session = get_shared_session()
-
-    async def generate_response(self, prompt: str) -> Dict[str, Any]:
-        """Generate response from Ollama model"""
+        self.pool: BackendPool = get_backend_pool()
+
+    async def generate_response(
+        self,
+        prompt: str,
+        on_token: Optional[TokenCallback] = None,
+        use_cache: bool = True,
+    ) -> Dict[str, Any]:
+        """Generate response from Ollama model, streaming tokens to on_token.
+
+        Results are served from the response cache unless use_cache is
+        False, in which case the model is called and the cache is left as is.
+        """
         start_time = time.time()
         logger.info("🤖 [%s] Starting LLM call to %s", self.role, MODEL_NAME)
         logger.debug("🤖 [%s] Prompt length: %s characters", self.role, len(prompt))
@@ -87,26 +84,29 @@ class OllamaAgent:  # pylint: disable=too-few-public-methods
         payload = {
             "model": MODEL_NAME,
             "prompt": prompt,
-            "stream": False,
+            "stream": True,
             "options": {
                 "temperature": 0.7,
                 "top_p": 0.9,
                 "num_predict": 300,
             },
         }
+        if self.response_schema is not None:
+            payload["format"] = self.response_schema
 
         try:
-            logger.info(f"🌐 [{self.role}] Sending request to Ollama: {OLLAMA_URL}")
-            response = self.session.post(OLLAMA_GENERATE_API, json=payload, timeout=60)
+            key = self._cache_key(payload, use_cache)
+            cached = await self._cache_lookup(key)
+            if cached is not None:
+                return cached
+
+            logger.info(f"🌐 [{self.role}] Sending request to Ollama")
+            parsed_result = await self._generate_json(
+                payload, timeout=60, on_token=on_token, cache_key=key, hedge=True
+            )
 
             elapsed_time = time.time() - start_time
             logger.info(f"✅ [{self.role}] LLM call completed in {elapsed_time:.2f}s")
-            logger.debug(f"🌐 [{self.role}] Response status: {response.status_code}")
-            if response.status_code != 200:
-                return self._get_fallback_response()
-
-            result = response.json()
-            parsed_result = self._parse_json_response(result.get("response", "{}"))
 
             logger.info(f"📊 [{self.role}] Response parsed successfully")
             logger.debug(
@@ -120,16 +120,334 @@ class OllamaAgent:  # pylint: disable=too-few-public-methods
                 f"❌ [{self.role}] LLM call failed after " f"{elapsed_time:.2f}s: {e}"
             )
 
-            # Reset shared session if connection issues persist
-            if "timeout" in str(e).lower() or "connection" in str(e).lower():
-                logger.warning(
-                    f"🔄 [{self.role}] Resetting shared session due to "
-                    f"connection issues"
+            return self._get_fallback_response()
+
+    @staticmethod
+    def _cache_key(payload: Dict[str, Any], use_cache: bool) -> Optional[str]:
+        """Response cache key for the payload, or None to bypass the cache"""
+        if not (use_cache and CACHE_ENABLED):
+            return None
+        return response_cache_key(payload)
+
+    async def _cache_lookup(self, key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Return the cached result for the key, if any"""
+        if key is None:
+            return None
+        cached = await get_response_cache().get(key)
+        if cached is not None:
+            logger.info("💾 [%s] Serving cached response", self.role)
+        return cached
+
+    async def _generate_json(
+        self,
+        payload: Dict[str, Any],
+        timeout: float,
+        on_token: Optional[TokenCallback] = None,
+        cache_key: Optional[str] = None,
+        hedge: bool = False,
+        cache_extra: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Run a generate request, joining an identical one already in flight.
+
+        Requests are keyed on model, prompt, options, format, image digests
+        and the analysis deadline; duplicates share a single Ollama call,
+        receive its streamed tokens and get their own copy of the parsed
+        result. With a cache key,
+        a fully parsed result is stored in the response cache, together with
+        cache_extra; a call squeezed by the analysis deadline is not. With
+        hedge (and OLLAMA_HEDGE enabled) a slow call is duplicated on another
+        backend.
+        """
+        fitted, timeout = self._fit_to_deadline(payload, timeout)
+        if fitted is not payload:
+            # A shortened answer must not be replayed for the full request
+            cache_key = None
+        payload = fitted
+        stream = self._stream_hedged if hedge and HEDGE_REQUESTS else self._stream_json
+
+        async def fetch(publish: Optional[TokenCallback]) -> Dict[str, Any]:
+            result = await stream(payload, timeout, publish)
+            if cache_key is not None and self._is_cacheable(result):
+                await get_response_cache().set(
+                    cache_key, {**result, **(cache_extra or {})}
                 )
-                reset_shared_session()
-                self.session = get_shared_session()
+            return result
+
+        if not COALESCE_REQUESTS:
+            return await fetch(on_token)
+
+        key = request_key(payload)
+        deadline = current_request().deadline
+        if deadline is not None:
+            # The shared call is cut short at its leader's deadline, so only
+            # callers with that same deadline may join it
+            key = f"{key}:{deadline}"
+        return await _SINGLE_FLIGHT.do(key, fetch, on_token)
+
+    def _fit_to_deadline(
+        self, payload: Dict[str, Any], timeout: float
+    ) -> Tuple[Dict[str, Any], float]:
+        """Shrink the timeout and num_predict of a call to what is left of the
+        analysis deadline; both are untouched while the deadline is further
+        away than the timeout"""
+        remaining = current_request().remaining()
+        if remaining is None or remaining >= timeout:
+            return payload, timeout
+        if remaining <= 0:
+            SCHEDULER_STATS["deadline_expired"] += 1
+            raise DeadlineExceeded("Analysis deadline passed before calling Ollama")
+
+        options = dict(payload.get("options", {}))
+        if "num_predict" in options:
+            options["num_predict"] = max(
+                MIN_NUM_PREDICT, int(options["num_predict"] * remaining / timeout)
+            )
+        logger.info(
+            "⏱️ [%s] %.1fs left of the analysis budget, num_predict %s",
+            self.role,
+            remaining,
+            options.get("num_predict"),
+        )
+        return {**payload, "options": options}, remaining
+
+    @staticmethod
+    def _is_cacheable(result: Dict[str, Any]) -> bool:
+        """Partial recoveries and fallbacks are not worth replaying"""
+        return "parsing_status" not in result and "error" not in result
+
+    async def _stream_hedged(
+        self,
+        payload: Dict[str, Any],
+        timeout: float,
+        on_token: Optional[TokenCallback] = None,
+    ) -> Dict[str, Any]:
+        """Stream a generate call, sending a duplicate to another backend
+        once it runs longer than this agent's usual tail latency.
+
+        The first successful result wins and the other call is
+        cancelled. The duplicate streams no tokens to the client; hedges are
+        drawn from a budget so they add only a small share of extra load.
+        """
+        tracker = latency_tracker(self.role)
+        threshold = tracker.percentile(HEDGE_PERCENTILE)
+        HEDGE_BUDGET.record_request()
+        started = time.monotonic()
+        used: Set[str] = set()
+        calls = [
+            asyncio.ensure_future(
+                self._stream_json(payload, timeout, on_token, used=used)
+            )
+        ]
+        try:
+            if threshold is not None:
+                done, _ = await asyncio.wait(calls, timeout=threshold)
+                if not done and self.pool.has_available(exclude=used):
+                    if HEDGE_BUDGET.try_spend():
+                        HEDGE_STATS["hedges"] += 1
+                        logger.info(
+                            "🪁 [%s] No answer after %.2fs, hedging on another "
+                            "backend",
+                            self.role,
+                            threshold,
+                        )
+                        calls.append(
+                            asyncio.ensure_future(
+                                self._stream_json(payload, timeout, exclude=used)
+                            )
+                        )
+                    else:
+                        HEDGE_STATS["budget_exhausted"] += 1
+
+            winner = await self._first_success(calls)
+            if winner is not calls[0]:
+                HEDGE_STATS["hedge_wins"] += 1
+            result = winner.result()
+        finally:
+            for call in calls:
+                call.cancel()
+
+        tracker.record(time.monotonic() - started)
+        return result
 
-            return self._get_fallback_response()
+    @staticmethod
+    async def _first_success(calls: List[asyncio.Future]) -> asyncio.Future:
+        """Wait for the first call that succeeds; if all fail, the first
+        one's error is raised"""
+        pending = set(calls)
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for call in done:
+                if not call.cancelled() and call.exception() is None:
+                    return call
+        return await calls[0]
+
+    async def _stream_json(
+        self,
+        payload: Dict[str, Any],
+        timeout: float,
+        on_token: Optional[TokenCallback] = None,
+        exclude: Collection[str] = (),
+        used: Optional[Set[str]] = None,
+    ) -> Dict[str, Any]:
+        """Stream a generate request and return the first JSON object.
+
+        Ollama's NDJSON stream is fed token by token into an incremental
+        parser; as soon as the top-level object closes the response is
+        closed, which aborts the generation on the Ollama side instead of
+        decoding up to num_predict tokens. The repair path only runs when
+        the stream ends without a complete object.
+
+        Connection failures and 502/503/504 answers are retried on another
+        backend with jittered backoff, as long as nothing was streamed yet
+        and the global retry budget allows it. When every backend's circuit
+        is open the request fails immediately.
+
+        If the analysis deadline passes mid-stream, the tokens received so
+        far are repaired into a partial result.
+
+        Backends whose URL is in exclude are not used; the URL of every
+        backend tried is added to used.
+        """
+        attempt = 0
+        parser = IncrementalJSONParser()
+        tokens: List[str] = []
+        partial = False
+        try:
+            async with asyncio.timeout(current_request().remaining()):
+                while True:
+                    parser = IncrementalJSONParser()
+                    tokens = []
+                    RETRY_BUDGET.record_request()
+                    try:
+                        await self._stream_attempt(
+                            payload, timeout, on_token, parser, tokens, exclude, used
+                        )
+                        break
+                    except NoBackendAvailable:
+                        RETRY_STATS["fast_failures"] += 1
+                        raise
+                    except RETRYABLE_ERRORS as e:
+                        if tokens or attempt >= MAX_RETRIES:
+                            raise
+                        if not RETRY_BUDGET.try_spend():
+                            RETRY_STATS["budget_exhausted"] += 1
+                            raise
+                        delay = backoff_delay(attempt)
+                        attempt += 1
+                        RETRY_STATS["retries"] += 1
+                        logger.warning(
+                            "🔁 [%s] Retrying Ollama request in %.2fs "
+                            "(attempt %d): %s",
+                            self.role,
+                            delay,
+                            attempt,
+                            e,
+                        )
+                        await asyncio.sleep(delay)
+        except TimeoutError as e:
+            SCHEDULER_STATS["deadline_expired"] += 1
+            if not tokens:
+                raise DeadlineExceeded("Analysis deadline passed") from e
+            SCHEDULER_STATS["partial_results"] += 1
+            partial = True
+            logger.warning(
+                "⏱️ [%s] Analysis deadline passed after %d tokens, "
+                "returning a partial result",
+                self.role,
+                len(tokens),
+            )
+
+        result = self._parse_streamed(parser, tokens)
+        if partial:
+            # Marked so it is never cached as the model's full answer
+            result.setdefault("parsing_status", "deadline_partial")
+        return result
+
+    async def _stream_attempt(
+        self,
+        payload: Dict[str, Any],
+        timeout: float,
+        on_token: Optional[TokenCallback],
+        parser: IncrementalJSONParser,
+        tokens: List[str],
+        exclude: Collection[str] = (),
+        used: Optional[Set[str]] = None,
+    ):
+        """Run one generate request, feeding its tokens to the parser; the
+        time to first chunk is reported to the backend's concurrency limiter"""
+        model = payload.get("model")
+        async with self.pool.acquire(model, exclude, used) as backend:
+            started = time.monotonic()
+            first_chunk = True
+            async with backend.session.stream(
+                "POST", backend.generate_url, json=payload, timeout=timeout
+            ) as response:
+                logger.debug(
+                    f"🌐 [{self.role}] Response status: {response.status_code}"
+                )
+                if response.status_code in (502, 503, 504):
+                    raise RetryableOllamaError(
+                        f"Ollama returned HTTP {response.status_code}"
+                    )
+                if response.status_code != 200:
+                    raise OllamaRequestError(
+                        f"Ollama returned HTTP {response.status_code}"
+                    )
+
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+
+                    chunk = json.loads(line)
+                    if first_chunk:
+                        first_chunk = False
+                        backend.limiter(model).record_latency(
+                            time.monotonic() - started
+                        )
+                    if "error" in chunk:
+                        raise OllamaRequestError(chunk["error"])
+
+                    token = chunk.get("response", "")
+                    if token:
+                        tokens.append(token)
+                        if on_token is not None:
+                            await on_token(token)
+                        if parser.feed(token):
+                            if not chunk.get("done"):
+                                logger.info(
+                                    "✂️ [%s] JSON object complete after %d tokens, "
+                                    "stopping generation",
+                                    self.role,
+                                    len(tokens),
+                                )
+                            break
+
+                    if chunk.get("done"):
+                        break
+
+    def _parse_streamed(
+        self, parser: IncrementalJSONParser, tokens: List[str]
+    ) -> Dict[str, Any]:
+        """Turn a finished stream into a result, repairing it if needed"""
+        if parser.complete:
+            try:
+                result = parser.parse()
+                JSON_PARSE_STATS["strict"] += 1
+                return result
+            except json.JSONDecodeError as e:
+                logger.warning("⚠️ [%s] Streamed JSON invalid: %s", self.role, e)
+                JSON_PARSE_STATS["repaired"] += 1
+                return self._fix_incomplete_json(parser.text)
+
+        logger.warning("🌊 [%s] Stream ended without a complete object", self.role)
+        if parser.started:
+            # Truncated by num_predict: close the open structures
+            JSON_PARSE_STATS["truncated"] += 1
+            return self._fix_incomplete_json(parser.text)
+        JSON_PARSE_STATS["unstructured"] += 1
+        return self._parse_json_response("".join(tokens))
 
     def _find_and_fix_json(self, text_blob: str) -> Dict[str, Any]:
         """
@@ -326,7 +644,7 @@ class OllamaAgent:  # pylint: disable=too-few-public-methods
             logger.warning(
                 "⚠️ [%s] No valid JSON structure found in response", self.role
             )
-            return self._create_partial_response(json_str)
+            return self._create_partial_response(response)
 
         except Exception as error:
             logger.error("❌ [%s] JSON parsing exception: %s", self.role, error)
@@ -0,0 +1,238 @@
+"""
+Small DAG engine that runs the analysis stages as soon as their inputs are ready
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from .single_flight import TokenCallback
+
+logger = logging.getLogger(__name__)
+
+# Calls a stage's agent with the values of the stage's inputs
+StageCall = Callable[
+    [Dict[str, Any], Optional[TokenCallback]], Awaitable[Dict[str, Any]]
+]
+# Receives each stage's result as soon as the stage finishes
+ResultCallback = Callable[[str, Dict[str, Any]], Awaitable[None]]
+# Receives the status message of each stage as it starts
+StatusCallback = Callable[[str], Awaitable[None]]
+# Returns the token callback for a stage, if its tokens are streamed
+TokenCallbackFactory = Callable[[str], Optional[TokenCallback]]
+# Returns the result to use instead of running a stage, or None to run it
+SkipCheck = Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+# Per stage: "runs", "timeouts", "skipped" and "total_ms"
+STAGE_STATS: Dict[str, Counter] = {}
+
+
+class PipelineError(ValueError):
+    """Raised for a stage graph that cannot run"""
+
+
+class Stage:  # pylint: disable=too-few-public-methods
+    """One step of an analysis pipeline.
+
+    inputs names the pipeline inputs and earlier stages whose results the
+    stage needs; the stage starts as soon as all of them are available. A
+    stage running longer than timeout is replaced by fallback(), or fails
+    the pipeline when it has none. When skip_if returns a result for the
+    stage's inputs, that result is used and the stage's call is not made.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        call: StageCall,
+        inputs: Iterable[str] = (),
+        timeout: Optional[float] = None,
+        fallback: Optional[Callable[[], Dict[str, Any]]] = None,
+        status: Optional[str] = None,
+        skip_if: Optional[SkipCheck] = None,
+    ):
+        self.name = name
+        self.call = call
+        self.inputs = tuple(inputs)
+        self.timeout = timeout
+        self.fallback = fallback
+        self.status = status
+        self.skip_if = skip_if
+
+
+class PipelineRun:  # pylint: disable=too-few-public-methods
+    """Results and timings of one pipeline execution"""
+
+    def __init__(self):
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.timings: Dict[str, Dict[str, Any]] = {}
+
+
+class Pipeline:
+    """Directed acyclic graph of stages, executed with every stage started
+    the moment its inputs are ready, so independent stages run concurrently"""
+
+    def __init__(self, stages: List[Stage]):
+        self.stages: Dict[str, Stage] = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise PipelineError(f"Duplicate stage: {stage.name}")
+            self.stages[stage.name] = stage
+        self.external_inputs = {
+            name for stage in stages for name in stage.inputs if name not in self.stages
+        }
+        self._check_acyclic()
+
+    def _check_acyclic(self):
+        resolved = set(self.external_inputs)
+        remaining = dict(self.stages)
+        while remaining:
+            ready = [
+                name
+                for name, stage in remaining.items()
+                if all(item in resolved for item in stage.inputs)
+            ]
+            if not ready:
+                raise PipelineError(f"Stages in a cycle: {sorted(remaining)}")
+            for name in ready:
+                resolved.add(name)
+                del remaining[name]
+
+    async def run(
+        self,
+        inputs: Dict[str, Any],
+        on_result: Optional[ResultCallback] = None,
+        on_status: Optional[StatusCallback] = None,
+        token_callback: Optional[TokenCallbackFactory] = None,
+    ) -> PipelineRun:
+        """Execute every stage once; a failing stage cancels the others"""
+        missing = self.external_inputs - inputs.keys()
+        if missing:
+            raise PipelineError(f"Missing pipeline inputs: {sorted(missing)}")
+
+        run = PipelineRun()
+        values = dict(inputs)
+        pending = dict(self.stages)
+        running: Dict[asyncio.Task, Stage] = {}
+        started = time.monotonic()
+        try:
+            while pending or running:
+                # A skipped stage's result is ready at once, so keep scanning
+                # until no further stage can start
+                ready = True
+                while ready:
+                    ready = [
+                        stage
+                        for stage in pending.values()
+                        if all(item in values for item in stage.inputs)
+                    ]
+                    for stage in ready:
+                        del pending[stage.name]
+                        skipped = self._skip(stage, values, started)
+                        if skipped is not None:
+                            values[stage.name], run.timings[stage.name] = skipped
+                            run.results[stage.name] = values[stage.name]
+                            if on_result is not None:
+                                await on_result(stage.name, values[stage.name])
+                            continue
+                        if on_status is not None and stage.status:
+                            await on_status(stage.status)
+                        on_token = (
+                            token_callback(stage.name) if token_callback else None
+                        )
+                        task = asyncio.create_task(
+                            self._run_stage(stage, values, on_token, started)
+                        )
+                        running[task] = stage
+                if not running:
+                    break
+
+                done, _ = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    stage = running.pop(task)
+                    result, timing = task.result()
+                    values[stage.name] = result
+                    run.results[stage.name] = result
+                    run.timings[stage.name] = timing
+                    if on_result is not None:
+                        await on_result(stage.name, result)
+        finally:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+        return run
+
+    @staticmethod
+    def _skip(stage: Stage, values: Dict[str, Any], pipeline_started: float):
+        if stage.skip_if is None:
+            return None
+        result = stage.skip_if({name: values[name] for name in stage.inputs})
+        if result is None:
+            return None
+        logger.info("⏭️ Stage %s skipped", stage.name)
+        STAGE_STATS.setdefault(stage.name, Counter())["skipped"] += 1
+        timing = {
+            "start_ms": round((time.monotonic() - pipeline_started) * 1000, 1),
+            "duration_ms": 0.0,
+            "outcome": "skipped",
+        }
+        return result, timing
+
+    @staticmethod
+    async def _run_stage(
+        stage: Stage,
+        values: Dict[str, Any],
+        on_token: Optional[TokenCallback],
+        pipeline_started: float,
+    ):
+        started = time.monotonic()
+        outcome = "ok"
+        try:
+            async with asyncio.timeout(stage.timeout):
+                result = await stage.call(
+                    {name: values[name] for name in stage.inputs}, on_token
+                )
+        except TimeoutError:
+            if stage.fallback is None:
+                raise
+            outcome = "timeout"
+            logger.warning(
+                "⏱️ Stage %s timed out after %.0fs, using its fallback",
+                stage.name,
+                stage.timeout,
+            )
+            result = stage.fallback()
+
+        duration_ms = (time.monotonic() - started) * 1000
+        stats = STAGE_STATS.setdefault(stage.name, Counter())
+        stats["runs"] += 1
+        stats["total_ms"] += duration_ms
+        if outcome == "timeout":
+            stats["timeouts"] += 1
+
+        timing = {
+            "start_ms": round((started - pipeline_started) * 1000, 1),
+            "duration_ms": round(duration_ms, 1),
+            "outcome": outcome,
+        }
+        return result, timing
+
+
+def stage_snapshot() -> Dict[str, Dict[str, Any]]:
+    """Runs, timeouts, skips and mean duration of every stage for metrics"""
+    return {
+        name: {
+            "runs": stats["runs"],
+            "timeouts": stats["timeouts"],
+            "skipped": stats["skipped"],
+            "avg_ms": (
+                round(stats["total_ms"] / stats["runs"], 1) if stats["runs"] else None
+            ),
+        }
+        for name, stats in STAGE_STATS.items()
+    }
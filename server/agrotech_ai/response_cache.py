@@ -0,0 +1,180 @@
+"""
+Two-tier cache of parsed agent results: in-memory LRU backed by SQLite
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .single_flight import request_key
+
+CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+# Empty path keeps the cache in memory only
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+CACHE_DISK_MAX_ENTRIES = int(os.getenv("LLM_CACHE_DISK_MAX_ENTRIES", "10000"))
+
+# Expired rows are pruned from disk every this many writes
+_PRUNE_EVERY = 100
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(payload: Dict[str, Any]) -> str:
+    """Key on model, options, format, images and the prompt with its
+    whitespace normalized"""
+    prompt = " ".join(payload.get("prompt", "").split())
+    return request_key({**payload, "prompt": prompt})
+
+
+class ResponseCache:
+    """LRU/TTL memory tier in front of a persistent SQLite tier.
+
+    Disk reads promote entries into memory. SQLite calls run in a worker
+    thread so they never block the event loop.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        ttl_seconds: float = CACHE_TTL_SECONDS,
+        path: Optional[str] = CACHE_PATH,
+        disk_max_entries: int = CACHE_DISK_MAX_ENTRIES,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_max_entries = disk_max_entries
+        self.stats: Counter = Counter()
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            try:
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                    "expires_at REAL NOT NULL, stored_at REAL NOT NULL)"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning("⚠️ Response cache disk tier disabled: %s", e)
+                self._db = None
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None on a miss"""
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return json.loads(value)
+            del self._memory[key]
+            self.stats["expired"] += 1
+
+        if self._db is not None:
+            row = await self._run_disk(self._disk_get, key)
+            if row is not None:
+                value, expires_at = row
+                if expires_at > now:
+                    self._remember(key, value, expires_at)
+                    self.stats["disk_hits"] += 1
+                    return json.loads(value)
+                self.stats["expired"] += 1
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: Any):
+        """Store a JSON-serialisable value in both tiers"""
+        encoded = json.dumps(value, ensure_ascii=False)
+        expires_at = time.time() + self.ttl_seconds
+        self._remember(key, encoded, expires_at)
+        self.stats["stores"] += 1
+        if self._db is not None:
+            await self._run_disk(self._disk_set, key, encoded, expires_at)
+
+    async def _run_disk(self, func, *args) -> Any:
+        """Run a SQLite operation in a worker thread; a broken disk tier
+        degrades to memory-only caching instead of failing the request"""
+        try:
+            return await asyncio.to_thread(func, *args)
+        except sqlite3.Error as e:
+            logger.warning("⚠️ Response cache disk tier failed: %s", e)
+            self.stats["disk_errors"] += 1
+            return None
+
+    def _remember(self, key: str, value: str, expires_at: float):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _disk_get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            return self._db.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+    def _disk_set(self, key: str, value: str, expires_at: float):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, time.time()),
+            )
+            self._writes += 1
+            if self._writes % _PRUNE_EVERY == 0:
+                self._prune()
+            self._db.commit()
+
+    def _prune(self):
+        """Drop expired rows and the oldest rows beyond the disk limit"""
+        self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+        pruned = self._db.execute(
+            "DELETE FROM responses WHERE key NOT IN ("
+            "SELECT key FROM responses ORDER BY stored_at DESC LIMIT ?)",
+            (self.disk_max_entries,),
+        ).rowcount
+        self.stats["evictions"] += max(pruned, 0)
+
+    def snapshot(self) -> Dict[str, int]:
+        """Hit, miss and eviction counters for metrics"""
+        return {"memory_entries": len(self._memory), **self.stats}
+
+    def close(self):
+        """Close the SQLite connection"""
+        if self._db is not None:
+            with self._lock:
+                self._db.close()
+            self._db = None
+
+
+_RESPONSE_CACHE: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Get or create the process-wide response cache"""
+    global _RESPONSE_CACHE  # pylint: disable=global-statement
+    if _RESPONSE_CACHE is None:
+        _RESPONSE_CACHE = ResponseCache()
+        logger.info("💾 LLM response cache: %s", CACHE_PATH or "memory only")
+    return _RESPONSE_CACHE
+
+
+def close_response_cache():
+    """Close the process-wide cache; the next access reopens it"""
+    global _RESPONSE_CACHE  # pylint: disable=global-statement
+    if _RESPONSE_CACHE is not None:
+        cache, _RESPONSE_CACHE = _RESPONSE_CACHE, None
+        cache.close()
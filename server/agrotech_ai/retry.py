@@ -0,0 +1,76 @@
+"""
+Global retry budget and jittered backoff for Ollama requests
+"""
+
+import os
+import random
+import time
+from collections import Counter
+
+# Retries may add at most this fraction of extra load, plus a small floor so
+# a quiet server can still retry the occasional failure
+RETRY_BUDGET_RATIO = float(os.getenv("OLLAMA_RETRY_BUDGET_RATIO", "0.1"))
+RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv("OLLAMA_RETRY_MIN_PER_SECOND", "0.2"))
+MAX_RETRIES = int(os.getenv("OLLAMA_MAX_RETRIES", "2"))
+RETRY_BACKOFF_BASE = float(os.getenv("OLLAMA_RETRY_BACKOFF_BASE", "0.25"))
+RETRY_BACKOFF_MAX = float(os.getenv("OLLAMA_RETRY_BACKOFF_MAX", "4"))
+
+# "retries" taken, "budget_exhausted" when the budget denied one and
+# "fast_failures" for requests refused because every circuit was open
+RETRY_STATS: Counter = Counter()
+
+
+class RetryBudget:
+    """Token bucket shared by all agents: every request deposits `ratio`
+    tokens, time deposits `min_per_second`, and every retry withdraws one.
+    Under a broad outage requests stop earning retries faster than they
+    fail, so retries cannot multiply the load on a struggling Ollama."""
+
+    def __init__(
+        self,
+        ratio: float = RETRY_BUDGET_RATIO,
+        min_per_second: float = RETRY_BUDGET_MIN_PER_SECOND,
+        max_tokens: float = 10.0,
+    ):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._updated = time.monotonic()
+
+    @property
+    def tokens(self) -> float:
+        """Retries currently available"""
+        self._refill()
+        return self._tokens
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(
+            self.max_tokens, self._tokens + elapsed * self.min_per_second
+        )
+
+    def record_request(self):
+        """Deposit the share of a retry earned by one request"""
+        self._refill()
+        self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        """Withdraw one retry if the budget allows it"""
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+
+def backoff_delay(
+    attempt: int, base: float = RETRY_BACKOFF_BASE, cap: float = RETRY_BACKOFF_MAX
+) -> float:
+    """Full-jitter exponential backoff for the given retry attempt (0-based)"""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+RETRY_BUDGET = RetryBudget()
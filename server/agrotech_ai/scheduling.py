@@ -0,0 +1,187 @@
+"""
+Priority classes, per-request scheduling context and the fair wait queue
+used in front of Ollama capacity
+"""
+
+import asyncio
+import itertools
+import os
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+INTERACTIVE = "interactive"
+SCHEDULED = "scheduled"
+BULK = "bulk"
+
+# Served strictly in this order: a live analysis never waits behind bulk work
+PRIORITY_ORDER = (INTERACTIVE, SCHEDULED, BULK)
+
+# Waiters this close to their deadline jump ahead within their class
+DEADLINE_SLACK_SECONDS = float(os.getenv("SCHEDULER_DEADLINE_SLACK", "2"))
+
+# "deadline_expired" counts model calls cut short by their deadline and
+# "partial_results" those that still returned what was streamed so far
+SCHEDULER_STATS: Counter = Counter()
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's deadline passes while it waits for capacity"""
+
+
+class RequestContext:  # pylint: disable=too-few-public-methods
+    """Who a model call is made for, how urgent it is and when it expires"""
+
+    def __init__(
+        self,
+        client_id: str = "default",
+        priority: str = INTERACTIVE,
+        deadline: Optional[float] = None,
+        weight: float = 1.0,
+    ):
+        if priority not in PRIORITY_ORDER:
+            raise ValueError(f"Unknown priority class: {priority}")
+        self.client_id = client_id
+        self.priority = priority
+        self.deadline = deadline
+        self.weight = weight
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, if there is one"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+
+_CURRENT_REQUEST: ContextVar[RequestContext] = ContextVar(
+    "current_request", default=RequestContext()
+)
+
+
+def current_request() -> RequestContext:
+    """Scheduling context of the model call being made"""
+    return _CURRENT_REQUEST.get()
+
+
+@contextmanager
+def request_context(
+    client_id: str = "default",
+    priority: str = INTERACTIVE,
+    deadline_seconds: Optional[float] = None,
+    weight: float = 1.0,
+) -> Iterator[RequestContext]:
+    """Run the enclosed model calls (and tasks started from them) under a
+    scheduling context"""
+    deadline = (
+        time.monotonic() + deadline_seconds if deadline_seconds is not None else None
+    )
+    context = RequestContext(client_id, priority, deadline, weight)
+    token = _CURRENT_REQUEST.set(context)
+    try:
+        yield context
+    finally:
+        _CURRENT_REQUEST.reset(token)
+
+
+# (finish tag, sequence, future, context)
+_Entry = Tuple[float, int, asyncio.Future, RequestContext]
+
+
+class _ClassQueue:
+    """Weighted fair queue across clients for one priority class"""
+
+    def __init__(self):
+        self.virtual_time = 0.0
+        self.clients: Dict[str, Deque[_Entry]] = {}
+        self.last_finish: Dict[str, float] = {}
+
+    def push(self, entry_seq: int, future: asyncio.Future, context: RequestContext):
+        start = max(self.virtual_time, self.last_finish.get(context.client_id, 0.0))
+        finish = start + 1.0 / context.weight
+        self.last_finish[context.client_id] = finish
+        self.clients.setdefault(context.client_id, deque()).append(
+            (finish, entry_seq, future, context)
+        )
+
+    def heads(self) -> List[_Entry]:
+        return [queue[0] for queue in self.clients.values() if queue]
+
+    def pop_entry(self, entry: _Entry):
+        client_id = entry[3].client_id
+        queue = self.clients[client_id]
+        queue.remove(entry)
+        if not queue:
+            del self.clients[client_id]
+            # A finish tag behind the virtual clock no longer affects
+            # anything, so idle clients are forgotten
+            if self.last_finish.get(client_id, 0.0) <= self.virtual_time:
+                self.last_finish.pop(client_id, None)
+        self.virtual_time = max(self.virtual_time, entry[0] - 1.0 / entry[3].weight)
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self.clients.values())
+
+
+class FairQueue:
+    """Wait queue ordered by priority class first, then by weighted fair
+    queuing across clients, serving waiters close to their deadline first
+    and failing waiters whose deadline has already passed"""
+
+    def __init__(self):
+        self._classes = {priority: _ClassQueue() for priority in PRIORITY_ORDER}
+        self._sequence = itertools.count()
+
+    def push(self, future: asyncio.Future, context: RequestContext):
+        """Queue a waiter under its scheduling context"""
+        self._classes[context.priority].push(next(self._sequence), future, context)
+
+    def remove(self, future: asyncio.Future):
+        """Drop a waiter that gave up"""
+        for class_queue in self._classes.values():
+            for queue in class_queue.clients.values():
+                for entry in queue:
+                    if entry[2] is future:
+                        class_queue.pop_entry(entry)
+                        return
+
+    def pop(self) -> Optional[asyncio.Future]:
+        """Next waiter to serve, or None when nobody is waiting"""
+        now = time.monotonic()
+        for priority in PRIORITY_ORDER:
+            class_queue = self._classes[priority]
+            while len(class_queue):
+                entry = self._select(class_queue, now)
+                class_queue.pop_entry(entry)
+                future, context = entry[2], entry[3]
+                if future.done():
+                    continue
+                if context.deadline is not None and context.deadline <= now:
+                    SCHEDULER_STATS["deadline_expired"] += 1
+                    future.set_exception(
+                        DeadlineExceeded("Deadline passed while waiting for Ollama")
+                    )
+                    continue
+                return future
+        return None
+
+    @staticmethod
+    def _select(class_queue: _ClassQueue, now: float) -> _Entry:
+        heads = class_queue.heads()
+        urgent = [
+            entry
+            for entry in heads
+            if entry[3].deadline is not None
+            and entry[3].deadline - now <= DEADLINE_SLACK_SECONDS
+        ]
+        if urgent:
+            return min(urgent, key=lambda entry: entry[3].deadline)
+        return min(heads, key=lambda entry: (entry[0], entry[1]))
+
+    def depth(self) -> Dict[str, int]:
+        """Number of waiters per priority class"""
+        return {priority: len(queue) for priority, queue in self._classes.items()}
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self._classes.values())
@@ -0,0 +1,125 @@
+"""
+JSON schemas sent to Ollama as the `format` constraint for each agent
+"""
+
+from typing import Any, Dict
+
+NULLABLE_STRING = {"type": ["string", "null"]}
+
+IMAGE_VISION_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "is_agricultural_image": {"type": "boolean"},
+        "reason": NULLABLE_STRING,
+        "image_description": NULLABLE_STRING,
+        "soil_visual_indicators": NULLABLE_STRING,
+        "environmental_context": NULLABLE_STRING,
+        "plant_health_indicators": NULLABLE_STRING,
+        "recommended_focus_areas": {
+            "type": ["array", "null"],
+            "items": {"type": "string"},
+            "maxItems": 5,
+        },
+        "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+    },
+    "required": [
+        "is_agricultural_image",
+        "image_description",
+        "soil_visual_indicators",
+        "environmental_context",
+        "plant_health_indicators",
+        "recommended_focus_areas",
+        "confidence",
+    ],
+}
+
+AGRI_VISION_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "crop_health": {"type": "string", "enum": ["healthy", "stressed", "diseased"]},
+        "pest_detected": {"type": "boolean"},
+        "leaf_condition": {
+            "type": "string",
+            "enum": ["excellent", "good", "fair", "poor"],
+        },
+        "disease_probability": {"type": "number", "minimum": 0, "maximum": 1},
+        "visual_symptoms": {"type": "array", "items": {"type": "string"}},
+        "recommendations": {"type": "array", "items": {"type": "string"}},
+        "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+    },
+    "required": [
+        "crop_health",
+        "pest_detected",
+        "leaf_condition",
+        "disease_probability",
+        "visual_symptoms",
+        "recommendations",
+        "confidence",
+    ],
+}
+
+SOIL_SENSE_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "soil_moisture": {"type": "number", "minimum": 0, "maximum": 100},
+        "ph_level": {"type": "number", "minimum": 4, "maximum": 9},
+        "temperature": {"type": "number", "minimum": -10, "maximum": 50},
+        "humidity": {"type": "number", "minimum": 0, "maximum": 100},
+        "irrigation_needed": {"type": "boolean"},
+        "fertilizer_status": {
+            "type": "string",
+            "enum": ["deficient", "adequate", "excess"],
+        },
+        "environmental_stress": {"type": "string", "enum": ["low", "medium", "high"]},
+        "alerts": {"type": "array", "items": {"type": "string"}},
+        "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+    },
+    "required": [
+        "soil_moisture",
+        "ph_level",
+        "temperature",
+        "humidity",
+        "irrigation_needed",
+        "fertilizer_status",
+        "environmental_stress",
+        "alerts",
+        "confidence",
+    ],
+}
+
+CROP_MASTER_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "overall_status": {
+            "type": "string",
+            "enum": ["excellent", "good", "warning", "critical"],
+        },
+        "priority_actions": {
+            "type": "array",
+            "items": {"type": "string"},
+            "maxItems": 4,
+        },
+        "estimated_yield": {"type": "string", "enum": ["high", "medium", "low"]},
+        "risk_assessment": {
+            "type": "string",
+            "enum": ["low", "medium", "high", "critical"],
+        },
+        "next_inspection_hours": {"type": "integer", "minimum": 1, "maximum": 168},
+        "economic_impact": {
+            "type": "string",
+            "enum": ["positive", "neutral", "negative"],
+        },
+        "urgent_alerts": {"type": "array", "items": {"type": "string"}},
+        "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+    },
+    "required": [
+        "overall_status",
+        "priority_actions",
+        "estimated_yield",
+        "risk_assessment",
+        "next_inspection_hours",
+        "economic_impact",
+        "urgent_alerts",
+        "confidence",
+    ],
+}
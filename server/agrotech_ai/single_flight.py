@@ -0,0 +1,117 @@
+"""
+Single-flight coalescing of identical in-flight Ollama requests
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# Async callback receiving each generated token while streaming
+TokenCallback = Callable[[str], Awaitable[None]]
+
+# "leaders" made an Ollama call, "coalesced" shared one already in flight
+COALESCE_STATS: Counter = Counter()
+
+logger = logging.getLogger(__name__)
+
+
+def request_key(payload: Dict[str, Any]) -> str:
+    """Hash of everything that determines the model output: model, prompt,
+    options, format and a digest of each attached image"""
+    keyed = {key: value for key, value in payload.items() if key != "images"}
+    keyed["images"] = [
+        hashlib.sha256(image.encode()).hexdigest()
+        for image in payload.get("images", [])
+    ]
+    encoded = json.dumps(keyed, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class _Flight:
+    """One shared Ollama call and the callers waiting on it"""
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.tokens: List[str] = []
+        self.subscribers: List[TokenCallback] = []
+        self.waiters = 0
+
+    async def publish(self, token: str):
+        """Record a token and forward it to every subscribed caller"""
+        self.tokens.append(token)
+        for callback in list(self.subscribers):
+            try:
+                await callback(token)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                # One caller's broken stream must not fail the shared call
+                logger.warning("⚠️ Dropping token subscriber: %s", e)
+                if callback in self.subscribers:
+                    self.subscribers.remove(callback)
+
+    async def subscribe(self, on_token: TokenCallback):
+        """Replay the tokens generated so far, then follow the stream"""
+        replayed = 0
+        while replayed < len(self.tokens):
+            pending = self.tokens[replayed:]
+            replayed += len(pending)
+            await on_token("".join(pending))
+        # No await between the last length check and subscribing, so no
+        # token published by the leader can fall in between
+        self.subscribers.append(on_token)
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; callers arriving while it is
+    in flight share its result instead of issuing their own.
+
+    The call runs in its own task so a caller that gives up does not cancel
+    it for the others; it is only cancelled once every caller has left.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+
+    @property
+    def in_flight(self) -> int:
+        """Number of distinct calls currently running"""
+        return len(self._flights)
+
+    async def do(
+        self,
+        key: str,
+        call: Callable[[TokenCallback], Awaitable[Any]],
+        on_token: Optional[TokenCallback] = None,
+    ) -> Any:
+        """Run call(publish) for the key, or join the call already running"""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            flight.task = asyncio.ensure_future(call(flight.publish))
+            flight.task.add_done_callback(lambda _task: self._forget(key, flight))
+            self._flights[key] = flight
+            COALESCE_STATS["leaders"] += 1
+        else:
+            COALESCE_STATS["coalesced"] += 1
+
+        flight.waiters += 1
+        try:
+            if on_token is not None:
+                await flight.subscribe(on_token)
+            result = await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if on_token in flight.subscribers:
+                flight.subscribers.remove(on_token)
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+        # Every caller gets its own copy, so none can mutate another's result
+        return copy.deepcopy(result)
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
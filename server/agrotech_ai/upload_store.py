@@ -0,0 +1,266 @@
+"""
+Disk staging of chunked image uploads, so an interrupted upload resumes
+from its last acknowledged offset instead of starting over
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Directory for partial uploads; they outlive the connection that sent them
+UPLOAD_DIR = os.getenv(
+    "UPLOAD_STAGING_DIR", os.path.join(tempfile.gettempdir(), "agrotech-uploads")
+)
+# Largest image a client may upload, chunked or as binary frames
+MAX_UPLOAD_BYTES = int(os.getenv("WS_MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+# Largest chunk accepted in one upload_chunk message
+MAX_CHUNK_BYTES = int(os.getenv("UPLOAD_MAX_CHUNK_BYTES", str(1024 * 1024)))
+# Uploads that received nothing for this many seconds are discarded
+UPLOAD_TTL_SECONDS = float(os.getenv("UPLOAD_TTL_SECONDS", "3600"))
+# Most uploads staged at once, and the most bytes they may announce in total
+UPLOAD_MAX_STAGED = int(os.getenv("UPLOAD_MAX_STAGED", "32"))
+UPLOAD_MAX_STAGED_BYTES = int(
+    os.getenv("UPLOAD_MAX_STAGED_BYTES", str(256 * 1024 * 1024))
+)
+
+# "started", "resumed", "refused" over the staging limits, "chunks" and
+# "bytes" written, "stale_chunks" for another offset, "rejected_chunks",
+# "completed" and "expired" uploads
+UPLOAD_STATS: Counter = Counter()
+
+# Ids sent back by clients become file names
+_UPLOAD_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class UploadError(ValueError):
+    """Raised for an upload the server refuses; the message is for the client"""
+
+
+class UploadStore:
+    """Partial uploads staged as an <id>.part file beside an <id>.json
+    manifest holding the announced size and checksum.
+
+    The length of the .part file is the acknowledged offset, so a client
+    that reconnects, even to a restarted server, resumes from there. Ids
+    are random and issued by the server, so only the client that started
+    an upload can resume or take it. File I/O runs in a worker thread so it
+    never blocks the event loop."""
+
+    def __init__(
+        self,
+        directory: str = UPLOAD_DIR,
+        max_bytes: int = MAX_UPLOAD_BYTES,
+        max_chunk_bytes: int = MAX_CHUNK_BYTES,
+        ttl_seconds: float = UPLOAD_TTL_SECONDS,
+        max_staged: int = UPLOAD_MAX_STAGED,
+        max_staged_bytes: int = UPLOAD_MAX_STAGED_BYTES,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_chunk_bytes = max_chunk_bytes
+        self.ttl_seconds = ttl_seconds
+        self.max_staged = max_staged
+        self.max_staged_bytes = max_staged_bytes
+        # Writes to one upload are serialized, whichever connection sends them
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # New uploads are checked against the staging limits one at a time
+        self._start_lock = asyncio.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, upload_id: Any) -> Tuple[str, str]:
+        if not isinstance(upload_id, str) or not _UPLOAD_ID.match(upload_id):
+            raise UploadError("Identificador de subida no válido")
+        base = os.path.join(self.directory, upload_id)
+        return base + ".part", base + ".json"
+
+    def _manifest(self, upload_id: str) -> Dict[str, Any]:
+        part, manifest = self._paths(upload_id)
+        try:
+            with open(manifest, encoding="utf-8") as f:
+                entry = json.load(f)
+            entry["offset"] = os.path.getsize(part)
+        except (OSError, ValueError) as e:
+            raise UploadError("Subida desconocida o caducada") from e
+        return entry
+
+    def _lock(self, upload_id: str) -> asyncio.Lock:
+        return self._locks.setdefault(upload_id, asyncio.Lock())
+
+    async def start(
+        self, upload_id: Optional[str], size: Any, sha256: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Begin an upload under a new id, or, given the id of one already
+        staged, resume it; return its id, size and the offset to continue
+        from"""
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError("Tamaño de imagen no válido")
+        if size > self.max_bytes:
+            raise UploadError(
+                f"La imagen supera el tamaño máximo de {self.max_bytes} bytes"
+            )
+        if upload_id is None:
+            async with self._start_lock:
+                return await asyncio.to_thread(self._create, size, sha256)
+        self._paths(upload_id)
+        async with self._lock(upload_id):
+            return await asyncio.to_thread(self._resume, upload_id, size, sha256)
+
+    def _create(self, size: int, sha256: Optional[str]):
+        self.purge_expired()
+        sizes = self._staged_sizes()
+        if len(sizes) >= self.max_staged or sum(sizes) + size > self.max_staged_bytes:
+            UPLOAD_STATS["refused"] += 1
+            raise UploadError("Demasiadas subidas en curso, inténtalo más tarde")
+
+        upload_id = uuid.uuid4().hex
+        part, manifest = self._paths(upload_id)
+        with open(manifest, "w", encoding="utf-8") as f:
+            json.dump({"size": size, "sha256": sha256}, f)
+        open(part, "wb").close()  # pylint: disable=consider-using-with
+        UPLOAD_STATS["started"] += 1
+        logger.info("📤 Upload %s started: %d bytes", upload_id, size)
+        return {"upload_id": upload_id, "offset": 0, "size": size}
+
+    def _resume(self, upload_id: str, size: int, sha256: Optional[str]):
+        self.purge_expired()
+        entry = self._manifest(upload_id)
+        if entry["size"] != size or entry["sha256"] != sha256:
+            raise UploadError("El identificador de subida ya se usa para otra imagen")
+        UPLOAD_STATS["resumed"] += 1
+        logger.info(
+            "📤 Upload %s resumed at %d of %d bytes", upload_id, entry["offset"], size
+        )
+        return {"upload_id": upload_id, "offset": entry["offset"], "size": size}
+
+    async def write_chunk(
+        self, upload_id: Any, offset: Any, chunk: bytes, checksum: Any
+    ) -> Dict[str, Any]:
+        """Append a chunk after checking its sha256, and return the new
+        acknowledged offset.
+
+        A chunk for any other offset, such as one resent after a lost
+        acknowledgement, is not written; the staged offset is returned so
+        the client continues from there."""
+        if not isinstance(offset, int) or offset < 0:
+            raise UploadError("Desplazamiento de subida no válido")
+        if len(chunk) > self.max_chunk_bytes:
+            UPLOAD_STATS["rejected_chunks"] += 1
+            raise UploadError(
+                f"El fragmento supera el máximo de {self.max_chunk_bytes} bytes"
+            )
+        if hashlib.sha256(chunk).hexdigest() != checksum:
+            UPLOAD_STATS["rejected_chunks"] += 1
+            raise UploadError("El checksum del fragmento no coincide")
+        self._paths(upload_id)
+        async with self._lock(upload_id):
+            return await asyncio.to_thread(self._write, upload_id, offset, chunk)
+
+    def _write(self, upload_id: str, offset: int, chunk: bytes):
+        entry = self._manifest(upload_id)
+        staged, size = entry["offset"], entry["size"]
+        if offset != staged:
+            UPLOAD_STATS["stale_chunks"] += 1
+            return {"upload_id": upload_id, "offset": staged, "size": size}
+        if staged + len(chunk) > size:
+            UPLOAD_STATS["rejected_chunks"] += 1
+            raise UploadError(f"La imagen supera los {size} bytes anunciados")
+
+        part, _ = self._paths(upload_id)
+        with open(part, "ab") as f:
+            f.write(chunk)
+        UPLOAD_STATS["chunks"] += 1
+        UPLOAD_STATS["bytes"] += len(chunk)
+        return {"upload_id": upload_id, "offset": staged + len(chunk), "size": size}
+
+    async def take(self, upload_id: Any) -> bytes:
+        """Bytes of a finished upload, which leaves the staging area; the
+        whole image is checked against the sha256 given at the start"""
+        self._paths(upload_id)
+        async with self._lock(upload_id):
+            data = await asyncio.to_thread(self._take, upload_id)
+        self._locks.pop(upload_id, None)
+        return data
+
+    def _take(self, upload_id: str) -> bytes:
+        entry = self._manifest(upload_id)
+        if entry["offset"] != entry["size"]:
+            raise UploadError(
+                f"La subida no está completa: {entry['offset']} de "
+                f"{entry['size']} bytes"
+            )
+        part, _ = self._paths(upload_id)
+        with open(part, "rb") as f:
+            data = f.read()
+        self._discard(upload_id)
+        if entry["sha256"] and hashlib.sha256(data).hexdigest() != entry["sha256"]:
+            raise UploadError("La imagen recibida no coincide con su checksum")
+        UPLOAD_STATS["completed"] += 1
+        logger.info("📥 Upload %s complete: %d bytes", upload_id, len(data))
+        return data
+
+    def _discard(self, upload_id: str):
+        for path in self._paths(upload_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _staged_sizes(self) -> List[int]:
+        """Announced sizes of the uploads staged now"""
+        sizes = []
+        for name in os.listdir(self.directory):
+            upload_id, extension = os.path.splitext(name)
+            if extension != ".json" or not _UPLOAD_ID.match(upload_id):
+                continue
+            try:
+                sizes.append(self._manifest(upload_id)["size"])
+            except UploadError:
+                continue
+        return sizes
+
+    def purge_expired(self):
+        """Remove uploads that received nothing within the TTL, and the
+        locks of uploads that are gone"""
+        cutoff = time.time() - self.ttl_seconds
+        for name in os.listdir(self.directory):
+            upload_id, extension = os.path.splitext(name)
+            if extension != ".json" or not _UPLOAD_ID.match(upload_id):
+                continue
+            part, manifest = self._paths(upload_id)
+            try:
+                last_write = max(os.path.getmtime(part), os.path.getmtime(manifest))
+            except OSError:
+                last_write = 0.0
+            if last_write < cutoff:
+                self._discard(upload_id)
+                UPLOAD_STATS["expired"] += 1
+                logger.info("🗑️ Upload %s expired", upload_id)
+        for upload_id, lock in list(self._locks.items()):
+            if not lock.locked() and not os.path.exists(self._paths(upload_id)[1]):
+                self._locks.pop(upload_id, None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Upload counters and the number of uploads staged for metrics"""
+        staged = sum(name.endswith(".json") for name in os.listdir(self.directory))
+        return {**UPLOAD_STATS, "staged": staged}
+
+
+_UPLOAD_STORE: Optional[UploadStore] = None
+
+
+def get_upload_store() -> UploadStore:
+    """Get or create the process-wide upload store"""
+    global _UPLOAD_STORE  # pylint: disable=global-statement
+    if _UPLOAD_STORE is None:
+        _UPLOAD_STORE = UploadStore()
+    return _UPLOAD_STORE
@@ -3,10 +3,16 @@ WebSocket handler for real-time agricultural monitoring
 """
 
 import asyncio
+import base64
+import binascii
+import json
 import logging
-from typing import Any, Dict
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Union
 
-from fastapi import WebSocket
+from fastapi import WebSocket, WebSocketDisconnect
 
 from .agents import (
     AgriVisionAgent,
@@ -14,26 +20,199 @@ from .agents import (
     ImageVisionAgent,
     SoilSenseAgent,
 )
-from .ollama_client import check_ollama_connection
+from .analysis_pipeline import (
+    AnalysisAgents,
+    image_analysis_pipeline,
+    scenario_pipeline,
+    stored_image_pipeline,
+)
+from .health import get_health_monitor
+from .image_store import StoredImage, content_id, get_image_store
+from .ollama_client import TokenCallback
+from .pipeline import Pipeline
+from .scheduling import (
+    INTERACTIVE,
+    PRIORITY_ORDER,
+    current_request,
+    request_context,
+)
+from .upload_store import MAX_UPLOAD_BYTES, UploadError, get_upload_store
 
 logger = logging.getLogger(__name__)
 
+# Token streaming to the client
+STREAM_TOKENS = os.getenv("WS_STREAM_TOKENS", "true").lower() == "true"
+STREAM_PARTIAL_INTERVAL = float(os.getenv("WS_STREAM_PARTIAL_INTERVAL", "0.5"))
+
+# Latency budget for a whole analysis unless the client sends its own
+# deadline_seconds; 0 disables it
+ANALYSIS_DEADLINE_SECONDS = float(os.getenv("ANALYSIS_DEADLINE_SECONDS", "300"))
+
+
+class BinaryUpload:
+    """Image announced by an image_analysis header with image_bytes, whose
+    bytes follow as binary frames.
+
+    The frames are copied through a memoryview into one buffer allocated at
+    the announced size, so the upload is neither base64-decoded nor joined
+    from pieces."""
+
+    def __init__(self, message: Dict[str, Any], size: int):
+        self.message = message
+        self.buffer = bytearray(size)
+        self.received = 0
+        self._view = memoryview(self.buffer)
+
+    @property
+    def complete(self) -> bool:
+        return self.received == len(self.buffer)
+
+    def feed(self, frame: bytes):
+        """Copy the next frame into the buffer"""
+        end = self.received + len(frame)
+        if end > len(self.buffer):
+            raise UploadError(
+                f"La imagen enviada supera los {len(self.buffer)} bytes anunciados"
+            )
+        self._view[self.received : end] = frame
+        self.received = end
+
+    def finish(self) -> Dict[str, Any]:
+        """The header message with the received bytes as its image_data"""
+        self._view.release()
+        return {**self.message, "image_data": self.buffer}
+
+
+class MessageReader:  # pylint: disable=too-few-public-methods
+    """Reads client messages from text frames, assembling binary uploads.
+
+    An image_analysis message may carry image_bytes instead of image_data;
+    it is then held back until that many bytes have arrived in binary
+    frames. Other messages (ping, cancel) may arrive in between."""
+
+    def __init__(self, websocket: WebSocket, max_upload_bytes: int = MAX_UPLOAD_BYTES):
+        self.websocket = websocket
+        self.max_upload_bytes = max_upload_bytes
+        self.upload: Optional[BinaryUpload] = None
+
+    async def receive(self) -> Dict[str, Any]:
+        """Next complete message; raises WebSocketDisconnect on close"""
+        while True:
+            frame = await self.websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            try:
+                if frame.get("bytes") is not None:
+                    message = self._feed(frame["bytes"])
+                else:
+                    message = self._read_text(frame["text"])
+            except UploadError as e:
+                self.upload = None
+                await self.websocket.send_json({"type": "error", "message": str(e)})
+                continue
+            if message is not None:
+                return message
+
+    def _read_text(self, text: str) -> Optional[Dict[str, Any]]:
+        message = json.loads(text)
+        if message.get("type") != "image_analysis" or "image_bytes" not in message:
+            return message
+        if self.upload is not None:
+            raise UploadError(
+                "Se recibió una nueva imagen antes de terminar la anterior"
+            )
+        size = message["image_bytes"]
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError("Tamaño de imagen no válido")
+        if size > self.max_upload_bytes:
+            raise UploadError(
+                f"La imagen supera el tamaño máximo de {self.max_upload_bytes} bytes"
+            )
+        self.upload = BinaryUpload(message, size)
+        return None
+
+    def _feed(self, frame: bytes) -> Optional[Dict[str, Any]]:
+        if self.upload is None:
+            raise UploadError("Datos de imagen recibidos sin cabecera image_bytes")
+        self.upload.feed(frame)
+        if not self.upload.complete:
+            return None
+        upload, self.upload = self.upload, None
+        return upload.finish()
+
+
+class TokenForwarder:  # pylint: disable=too-few-public-methods
+    """Forwards the tokens streamed by one agent to the WebSocket client"""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        agent: str,
+        partial_interval: float = STREAM_PARTIAL_INTERVAL,
+    ):
+        self.websocket = websocket
+        self.agent = agent
+        self.partial_interval = partial_interval
+        self.tokens: List[str] = []
+        self._last_partial = time.monotonic()
+
+    async def __call__(self, token: str):
+        self.tokens.append(token)
+        await self.websocket.send_json(
+            {"type": "agent_token", "agent": self.agent, "token": token}
+        )
+
+        # Periodically resend the accumulated text so late joiners catch up
+        now = time.monotonic()
+        if now - self._last_partial >= self.partial_interval:
+            self._last_partial = now
+            await self.websocket.send_json(
+                {
+                    "type": "agent_partial",
+                    "agent": self.agent,
+                    "text": "".join(self.tokens),
+                }
+            )
+
+
+class AnalysisSocket:  # pylint: disable=too-few-public-methods
+    """The connection as one analysis sees it: every frame the analysis
+    sends carries its request_id, so a client running several analyses on
+    one connection can tell their results apart"""
+
+    def __init__(self, websocket: WebSocket, request_id: str):
+        self.websocket = websocket
+        self.request_id = request_id
+
+    async def send_json(self, data: Dict[str, Any]):
+        """Send a frame tagged with the analysis' request_id"""
+        await self.websocket.send_json({**data, "request_id": self.request_id})
+
 
 class WebSocketHandler:
     """Handles WebSocket connections and agent orchestration"""
 
-    def __init__(self):
+    def __init__(self, stream_tokens: bool = STREAM_TOKENS):
         self.image_vision = ImageVisionAgent()
         self.agri_vision = AgriVisionAgent()
         self.soil_sense = SoilSenseAgent()
         self.crop_master = CropMasterAgent()
+        self.stream_tokens = stream_tokens
+
+    def _token_forwarder(
+        self, websocket: WebSocket, agent: str
+    ) -> Optional[TokenCallback]:
+        """Return a token callback for the agent, or None when not streaming"""
+        if not self.stream_tokens:
+            return None
+        return TokenForwarder(websocket, agent)
 
     async def handle_connection(self, websocket: WebSocket):
         """Main WebSocket connection handler"""
         await websocket.accept()
 
-        # Verificar que Ollama esté funcionando
-        if not check_ollama_connection():
+        # Verificar que Ollama esté funcionando (estado cacheado por el monitor)
+        if not await get_health_monitor().ollama_available():
             await websocket.send_json(
                 {
                     "type": "error",
@@ -45,12 +224,22 @@ class WebSocketHandler:
             )
             return
 
+        # Analyses run as tasks keyed by request id, so the loop keeps
+        # reading messages (cancel, disconnect) while they are in progress
+        analyses: Dict[str, asyncio.Task] = {}
+        reader = MessageReader(websocket)
         try:
             while True:
                 # Esperar mensaje del cliente
-                message = await websocket.receive_json()
-                await self.process_message(websocket, message)
-
+                message = await reader.receive()
+                await self.process_message(websocket, message, analyses)
+
+        except WebSocketDisconnect:
+            if analyses:
+                logger.info(
+                    "🔌 Client disconnected, cancelling %d running analyses",
+                    len(analyses),
+                )
         except Exception as e:
             logger.error("❌ WebSocket error: %s", str(e), exc_info=True)
             try:
@@ -67,9 +256,25 @@ class WebSocketHandler:
             # Re-raise the exception so calling code can handle connection
             # cleanup
             raise
+        finally:
+            # Nobody is left to read the results: stop the pipelines, which
+            # closes their streams and aborts the generations in Ollama
+            for task in analyses.values():
+                task.cancel()
+            await asyncio.gather(*analyses.values(), return_exceptions=True)
+
+    async def process_message(
+        self,
+        websocket: WebSocket,
+        message: Dict[str, Any],
+        analyses: Optional[Dict[str, asyncio.Task]] = None,
+    ):
+        """Process incoming WebSocket messages.
 
-    async def process_message(self, websocket: WebSocket, message: Dict[str, Any]):
-        """Process incoming WebSocket messages"""
+        With the connection's analyses registry, an image analysis is
+        started in the background under its request id and can be cancelled;
+        without it the analysis runs to completion before returning.
+        """
         message_type = message.get("type")
         logger.info("📨 Received message type: %s", message_type)
 
@@ -78,7 +283,45 @@ class WebSocketHandler:
             await websocket.send_json({"type": "pong", "message": "connection success"})
         elif message_type == "image_analysis":
             logger.info("📸 Processing image analysis")
-            await self.handle_image_analysis(websocket, message)
+            priority = message.get("priority", INTERACTIVE)
+            if priority not in PRIORITY_ORDER:
+                await websocket.send_json(
+                    {
+                        "type": "error",
+                        "message": f"Prioridad no reconocida: {priority}",
+                    }
+                )
+                return
+            deadline = message.get("deadline_seconds")
+            if deadline is not None and (
+                isinstance(deadline, bool)
+                or not isinstance(deadline, (int, float))
+                or not deadline > 0
+            ):
+                await websocket.send_json(
+                    {
+                        "type": "error",
+                        "message": (
+                            "deadline_seconds debe ser un número positivo: "
+                            f"{deadline!r}"
+                        ),
+                    }
+                )
+                return
+            if analyses is None:
+                request_id = message.get("request_id")
+                await self._run_analysis(
+                    websocket,
+                    message,
+                    priority,
+                    str(request_id) if request_id is not None else None,
+                )
+            else:
+                await self._start_analysis(websocket, message, priority, analyses)
+        elif message_type in ("upload_start", "upload_chunk"):
+            await self.handle_upload(websocket, message)
+        elif message_type == "cancel":
+            await self.cancel_analysis(websocket, message, analyses or {})
         else:
             logger.warning("❓ Unknown message type: %s", message_type)
             await websocket.send_json(
@@ -88,6 +331,91 @@ class WebSocketHandler:
                 }
             )
 
+    async def _run_analysis(
+        self,
+        websocket: WebSocket,
+        message: Dict[str, Any],
+        priority: str,
+        request_id: Optional[str] = None,
+    ):
+        # Model calls made for this message queue fairly against other
+        # connections and share one latency budget: each stage gets what
+        # the previous ones left, and calls are cut short when it runs out
+        deadline_seconds = message.get("deadline_seconds", ANALYSIS_DEADLINE_SECONDS)
+        with request_context(
+            client_id=f"ws-{id(websocket)}",
+            priority=priority,
+            deadline_seconds=deadline_seconds or None,
+        ):
+            sender: Any = websocket
+            if request_id is not None:
+                sender = AnalysisSocket(websocket, request_id)
+            await self.handle_image_analysis(sender, message)
+
+    async def _start_analysis(
+        self,
+        websocket: WebSocket,
+        message: Dict[str, Any],
+        priority: str,
+        analyses: Dict[str, asyncio.Task],
+    ):
+        """Run an image analysis in the background under its request id,
+        which the client is sent first and every frame of the analysis
+        carries"""
+        request_id = str(message.get("request_id") or uuid.uuid4().hex)
+        if request_id in analyses:
+            await websocket.send_json(
+                {
+                    "type": "error",
+                    "request_id": request_id,
+                    "message": f"El análisis {request_id} ya está en curso",
+                }
+            )
+            return
+
+        await websocket.send_json(
+            {"type": "analysis_started", "request_id": request_id}
+        )
+        task = asyncio.create_task(
+            self._run_analysis(websocket, message, priority, request_id)
+        )
+        analyses[request_id] = task
+
+        def forget(_task: asyncio.Task):
+            if analyses.get(request_id) is task:
+                del analyses[request_id]
+
+        task.add_done_callback(forget)
+
+    async def cancel_analysis(
+        self,
+        websocket: WebSocket,
+        message: Dict[str, Any],
+        analyses: Dict[str, asyncio.Task],
+    ):
+        """Cancel the analysis with the given request id, or every running
+        analysis of the connection when no id is given"""
+        request_id = message.get("request_id")
+        if request_id is None:
+            request_ids = list(analyses)
+        elif str(request_id) in analyses:
+            request_ids = [str(request_id)]
+        else:
+            await websocket.send_json(
+                {
+                    "type": "error",
+                    "message": f"No hay ningún análisis en curso con id {request_id}",
+                }
+            )
+            return
+
+        for cancelled_id in request_ids:
+            task = analyses.pop(cancelled_id)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            logger.info("🛑 Analysis %s cancelled by the client", cancelled_id)
+            await websocket.send_json({"type": "cancelled", "request_id": cancelled_id})
+
     async def handle_custom_scenario(
         self, websocket: WebSocket, message: Dict[str, Any]
     ):
@@ -112,16 +440,21 @@ class WebSocketHandler:
             image_description,
             environment_description,
             "🔍 Escenario Personalizado",
+            use_cache=not message.get("bypass_cache", False),
         )
 
     async def handle_image_analysis(
         self, websocket: WebSocket, message: Dict[str, Any]
     ):
         """Handle image analysis with ImageVision agent"""
-        image_base64 = message.get("image_data", "")
+        # Base64 text, the bytes of a binary upload, a finished chunked
+        # upload named by its upload_id, or a photo analysed before named by
+        # its image_id
+        image = message.get("image_data", "")
         environment_description = message.get("environment_description", "")
+        use_cache = not message.get("bypass_cache", False)
 
-        if not image_base64:
+        if not image and "upload_id" not in message and "image_id" not in message:
             await websocket.send_json(
                 {
                     "type": "error",
@@ -139,21 +472,92 @@ class WebSocketHandler:
             )
             return
 
+        if not image and "image_id" in message:
+            key = message["image_id"]
+            stored = get_image_store().get(key) if isinstance(key, str) else None
+            if stored is None:
+                await websocket.send_json(
+                    {
+                        "type": "error",
+                        "image_id": key,
+                        "message": "Imagen desconocida o caducada, vuelve a enviarla",
+                    }
+                )
+                return
+            await self.analyze_stored_image(
+                websocket,
+                key,
+                stored,
+                environment_description,
+                "📸 Análisis de Imagen",
+                use_cache=use_cache,
+            )
+            return
+
+        # Taken only once the request is valid, so a rejected request can be
+        # resent without uploading the image again
+        if not image:
+            try:
+                image = await get_upload_store().take(message["upload_id"])
+            except UploadError as e:
+                await websocket.send_json(
+                    {
+                        "type": "error",
+                        "upload_id": message["upload_id"],
+                        "message": str(e),
+                    }
+                )
+                return
+
         await self.analyze_image_scenario(
             websocket,
-            image_base64,
+            image,
             environment_description,
             "📸 Análisis de Imagen",
+            use_cache=use_cache,
         )
 
-    async def _run_concurrent_analysis(
+    async def handle_upload(self, websocket: WebSocket, message: Dict[str, Any]):
+        """Stage an upload_start or upload_chunk message and acknowledge the
+        offset the client should continue from"""
+        upload_id = message.get("upload_id")
+        store = get_upload_store()
+        try:
+            if message["type"] == "upload_start":
+                ack = await store.start(
+                    upload_id, message.get("size"), message.get("sha256")
+                )
+            else:
+                try:
+                    chunk = base64.b64decode(message.get("data") or "", validate=True)
+                except (binascii.Error, TypeError) as e:
+                    raise UploadError("Fragmento de imagen no válido") from e
+                ack = await store.write_chunk(
+                    upload_id, message.get("offset"), chunk, message.get("checksum")
+                )
+        except UploadError as e:
+            await websocket.send_json(
+                {"type": "error", "upload_id": upload_id, "message": str(e)}
+            )
+            return
+        await websocket.send_json({"type": "upload_ack", **ack})
+
+    def _agents(self) -> AnalysisAgents:
+        return AnalysisAgents(
+            self.image_vision, self.agri_vision, self.soil_sense, self.crop_master
+        )
+
+    async def _run_pipeline(
         self,
         websocket: WebSocket,
-        image_description: str,
-        environment_description: str,
+        pipeline: Pipeline,
+        inputs: Dict[str, Any],
         scenario_name: str,
+        known_results: Optional[Dict[str, Dict[str, Any]]] = None,
     ):
-        """Run AgriVision and SoilSense concurrently, then CropMaster decision"""
+        """Run an analysis pipeline, sending each agent's result as soon as
+        it is ready; known_results, reused from an earlier analysis, are
+        sent first"""
         # Informar escenario actual
         await websocket.send_json(
             {
@@ -165,112 +569,117 @@ class WebSocketHandler:
             }
         )
 
-        # Ejecutar AgriVision y SoilSense CONCURRENTEMENTE
-        await websocket.send_json(
-            {
-                "type": "status",
-                "message": (
-                    "🔍🌍 Analizando salud del cultivo y condiciones "
-                    "ambientales concurrentemente..."
-                ),
-            }
-        )
-
-        # Ejecutar ambos agentes en paralelo
-        vision_task = self.agri_vision.analyze_image(image_description)
-        soil_task = self.soil_sense.analyze_environment(environment_description)
-
-        # Esperar a que ambos terminen
-        vision_result, soil_result = await asyncio.gather(vision_task, soil_task)
-
-        # Enviar resultados tan pronto como estén listos
-        await websocket.send_json(
-            {
-                "type": "agent_result",
-                "agent": "AgriVision",
-                "data": vision_result,
-            }
-        )
-
-        await websocket.send_json(
-            {
-                "type": "agent_result",
-                "agent": "SoilSense",
-                "data": soil_result,
-            }
-        )
+        for agent, result in (known_results or {}).items():
+            await websocket.send_json(
+                {"type": "agent_result", "agent": agent, "data": result}
+            )
 
-        await asyncio.sleep(1)  # Reduced delay since they ran concurrently
+        async def send_status(message: str):
+            await websocket.send_json({"type": "status", "message": message})
 
-        # CropMaster (decisión final)
-        await websocket.send_json(
-            {
-                "type": "status",
-                "message": "🧠 CropMaster fusionando datos y decidiendo...",
-            }
-        )
+        async def send_result(agent: str, result: Dict[str, Any]):
+            await websocket.send_json(
+                {"type": "agent_result", "agent": agent, "data": result}
+            )
 
-        final_decision = await self.crop_master.make_decision(
-            vision_result, soil_result
+        run = await pipeline.run(
+            inputs,
+            on_result=send_result,
+            on_status=send_status,
+            token_callback=lambda agent: self._token_forwarder(websocket, agent),
         )
+        logger.info("⏱️ Stage timings for %s: %s", scenario_name, run.timings)
+
+        remaining = current_request().remaining()
+        skipped = [
+            agent
+            for agent, timing in run.timings.items()
+            if timing["outcome"] == "skipped"
+        ]
+        if remaining is not None and remaining <= 0:
+            message = (
+                "⏱️ Análisis completado con resultados parciales: se agotó el tiempo"
+            )
+        elif skipped:
+            message = (
+                "🚫 Análisis completado: la imagen no es apta para el análisis, "
+                f"se omitieron {', '.join(skipped)}"
+            )
+        else:
+            message = "✅ Análisis completado"
         await websocket.send_json(
-            {
-                "type": "agent_result",
-                "agent": "CropMaster",
-                "data": final_decision,
-            }
-        )
-
-        await websocket.send_json(
-            {"type": "status", "message": "✅ Análisis completado"}
+            {"type": "status", "message": message, "timings": run.timings}
         )
 
     async def analyze_image_scenario(
         self,
         websocket: WebSocket,
-        image_base64: str,
+        image: Union[str, bytes, bytearray],
         environment_description: str,
         scenario_name: str,
+        use_cache: bool = True,
+        image_id: Optional[str] = None,
     ):
-        """Analyze a scenario starting with image analysis using ImageVision"""
+        """Analyze a scenario starting with image analysis using ImageVision.
+
+        The client is sent the photo's image_id first; once ImageVision has
+        described it, image_analysis requests can name it instead of
+        sending the image again."""
         try:
-            # Paso 1: ImageVision (análisis de imagen)
-            await websocket.send_json(
+            image_id = image_id or content_id(image)
+            await websocket.send_json({"type": "image_received", "image_id": image_id})
+            await self._run_pipeline(
+                websocket,
+                image_analysis_pipeline(self._agents(), use_cache),
                 {
-                    "type": "status",
-                    "message": "📸 ImageVision procesando imagen...",
-                }
+                    "image": image,
+                    "image_id": image_id,
+                    "environment_description": environment_description,
+                },
+                scenario_name,
             )
 
-            image_analysis = await self.image_vision.analyze_image(image_base64)
+        except Exception as e:
             await websocket.send_json(
                 {
-                    "type": "agent_result",
-                    "agent": "ImageVision",
-                    "data": image_analysis,
+                    "type": "error",
+                    "message": f"Error en análisis de imagen: {str(e)}",
                 }
             )
 
-            await asyncio.sleep(2)
-
-            # Extraer descripción de la imagen para AgriVision
-            image_description = image_analysis.get(
-                "image_description", "Error en análisis"
-            )
-
-            # Preparar datos para SoilSense
-            soil_indicators = image_analysis.get("soil_visual_indicators", "")
-            environmental_context = image_analysis.get("environmental_context", "")
-            combined_environment = (
-                f"{environment_description}. Indicadores visuales: "
-                f"{soil_indicators}. Contexto: {environmental_context}"
+    async def analyze_stored_image(
+        self,
+        websocket: WebSocket,
+        image_id: str,
+        stored: StoredImage,
+        environment_description: str,
+        scenario_name: str,
+        use_cache: bool = True,
+    ):
+        """Re-analyze a stored photo under new conditions: ImageVision's
+        stored result is reused and only the downstream agents run. With the
+        cache bypassed ImageVision describes the stored image again."""
+        if not use_cache:
+            await self.analyze_image_scenario(
+                websocket,
+                stored.image,
+                environment_description,
+                scenario_name,
+                use_cache=False,
+                image_id=image_id,
             )
-
-            # Paso 2: Ejecutar el análisis concurrente común
-            await self._run_concurrent_analysis(
-                websocket, image_description, combined_environment, scenario_name
+            return
+        try:
+            await self._run_pipeline(
+                websocket,
+                stored_image_pipeline(self._agents(), use_cache),
+                {
+                    "ImageVision": stored.result,
+                    "environment_description": environment_description,
+                },
+                scenario_name,
+                known_results={"ImageVision": stored.result},
             )
-
         except Exception as e:
             await websocket.send_json(
                 {
@@ -285,11 +694,18 @@ class WebSocketHandler:
         image_description: str,
         environment_description: str,
         scenario_name: str,
+        use_cache: bool = True,
     ):
         """Analyze a scenario using all three AI agents"""
         try:
-            await self._run_concurrent_analysis(
-                websocket, image_description, environment_description, scenario_name
+            await self._run_pipeline(
+                websocket,
+                scenario_pipeline(self._agents(), use_cache),
+                {
+                    "image_description": image_description,
+                    "environment_description": environment_description,
+                },
+                scenario_name,
             )
 
         except Exception as e:
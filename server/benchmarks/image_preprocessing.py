@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the image preprocessing fast path.
+
+Compares, per input size, the original full-resolution decode plus LANCZOS
+resize with the JPEG draft-mode path used by the image workers, and prints
+milliseconds per image.
+
+Usage: python benchmarks/image_preprocessing.py [--repeat N] [--size PX]
+"""
+
+import argparse
+import base64
+import io
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# pylint: disable=wrong-import-position
+from agrotech_ai.image_processing import optimize_image  # noqa: E402
+
+# Typical phone and camera resolutions, from 1 MP to 24 MP
+INPUT_SIZES = [(1280, 960), (2048, 1536), (3000, 2250), (4032, 3024), (6000, 4000)]
+
+
+def synthetic_photo(size):
+    """Base64 JPEG with enough detail to encode like a real photo."""
+    noise = Image.effect_noise(size, 40).convert("RGB")
+    gradient = Image.linear_gradient("L").resize(size).convert("RGB")
+    image = Image.blend(noise, gradient, 0.5)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def full_decode(image_base64, max_size):
+    """The original path: decode at native size, LANCZOS, re-encode."""
+    image = Image.open(io.BytesIO(base64.b64decode(image_base64)))
+    if max(image.size) > max_size:
+        ratio = max_size / max(image.size)
+        new_size = tuple(int(dim * ratio) for dim in image.size)
+        image = image.resize(new_size, Image.Resampling.LANCZOS)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=85, optimize=True)
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def median_ms(func, image_base64, max_size, repeat):
+    """Median wall time of func over repeat runs."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(image_base64, max_size=max_size)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    """Print a table of ms per image for both paths."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--size", type=int, default=1024, help="target longest side")
+    args = parser.parse_args()
+
+    print(f"Target {args.size}px, median of {args.repeat} runs")
+    print(f"{'input':>12} {'MP':>5} {'full (ms)':>10} {'fast (ms)':>10} {'speedup':>8}")
+    for size in INPUT_SIZES:
+        photo = synthetic_photo(size)
+        full = median_ms(full_decode, photo, args.size, args.repeat)
+        fast = median_ms(optimize_image, photo, args.size, args.repeat)
+        print(
+            f"{size[0]:>5}x{size[1]:<6} {size[0] * size[1] / 1e6:>5.1f} "
+            f"{full:>10.1f} {fast:>10.1f} {full / fast:>7.1f}x"
+        )
+
+    small = synthetic_photo((800, 600))
+    fast = median_ms(optimize_image, small, args.size, args.repeat)
+    print(f"{'800x600':>12} {0.5:>5.1f} {'':>10} {fast:>10.1f}  (sent as is)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 import asyncio
+import json
 from unittest.mock import AsyncMock, Mock
 
+import httpx
 import pytest
 from fastapi.testclient import TestClient
 from httpx import AsyncClient
@@ -12,7 +14,15 @@ from agrotech_ai.agents import (
     SoilSenseAgent,
 )
 from agrotech_ai.app import app
-from agrotech_ai.ollama_client import reset_shared_session
+from agrotech_ai.backend_pool import BackendPool, OllamaBackend, reset_backend_pool
+from agrotech_ai.health import reset_health_monitor
+from agrotech_ai.image_pool import ImagePool
+from agrotech_ai.image_store import ImageStore
+from agrotech_ai.response_cache import ResponseCache
+from agrotech_ai.retry import RetryBudget
+from agrotech_ai.upload_store import UploadStore
+
+from .utils import create_mock_ollama_stream
 
 
 @pytest.fixture(scope="session")
@@ -47,16 +57,54 @@ def mock_ollama_response():
     }
 
 
-@pytest.fixture
-def mock_requests_session():
-    """Mock requests session for testing."""
-    session = Mock()
-    session.post.return_value = Mock()
-    session.post.return_value.status_code = 200
-    session.post.return_value.json.return_value = {
-        "response": '{"test": "response", "confidence": 0.9}'
+def mock_backend_pool(*handlers, **kwargs) -> BackendPool:
+    """Build a pool with one MockTransport-backed backend per handler;
+    circuit breaker settings are passed on to every backend."""
+    breaker_kwargs = {
+        key: kwargs.pop(key)
+        for key in ("failure_threshold", "open_seconds", "max_open_seconds")
+        if key in kwargs
     }
-    return session
+    return BackendPool(
+        [
+            OllamaBackend(
+                f"http://ollama-{index}:11434",
+                session=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+                **breaker_kwargs,
+            )
+            for index, handler in enumerate(handlers)
+        ],
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def backend_pool_factory():
+    """Factory for a backend pool whose backends are request handlers."""
+    return mock_backend_pool
+
+
+@pytest.fixture
+def ollama_stream_pool():
+    """Factory for a backend pool that replays a streamed Ollama reply."""
+
+    def factory(response_text: str, status_code: int = 200, chunk_size: int = 8):
+        sent = []
+
+        def handler(request):
+            if request.url.path != "/api/generate":
+                return httpx.Response(200, json={"models": []})
+            sent.append(json.loads(request.content))
+            return httpx.Response(
+                status_code,
+                content=create_mock_ollama_stream(response_text, chunk_size),
+            )
+
+        pool = mock_backend_pool(handler)
+        pool.sent = sent
+        return pool
+
+    return factory
 
 
 @pytest.fixture
@@ -73,7 +121,7 @@ def sample_base64_image():
 def image_vision_agent():
     """ImageVision agent fixture."""
     agent = ImageVisionAgent()
-    agent.session = Mock()
+    agent.pool = Mock()
     return agent
 
 
@@ -81,7 +129,7 @@ def image_vision_agent():
 def agri_vision_agent():
     """AgriVision agent fixture."""
     agent = AgriVisionAgent()
-    agent.session = Mock()
+    agent.pool = Mock()
     return agent
 
 
@@ -89,7 +137,7 @@ def agri_vision_agent():
 def soil_sense_agent():
     """SoilSense agent fixture."""
     agent = SoilSenseAgent()
-    agent.session = Mock()
+    agent.pool = Mock()
     return agent
 
 
@@ -97,7 +145,7 @@ def soil_sense_agent():
 def crop_master_agent():
     """CropMaster agent fixture."""
     agent = CropMasterAgent()
-    agent.session = Mock()
+    agent.pool = Mock()
     return agent
 
 
@@ -145,11 +193,55 @@ def sample_soil_result():
 
 
 @pytest.fixture(autouse=True)
-def reset_session():
-    """Reset shared session before each test."""
-    reset_shared_session()
+def reset_pool():
+    """Reset the shared backend pool and health monitor before each test."""
+    reset_backend_pool()
+    reset_health_monitor()
     yield
-    reset_shared_session()
+    reset_backend_pool()
+    reset_health_monitor()
+
+
+@pytest.fixture(autouse=True)
+def retry_budget(monkeypatch):
+    """Give each test a full retry budget and no backoff delay."""
+    budget = RetryBudget()
+    monkeypatch.setattr("agrotech_ai.ollama_client.RETRY_BUDGET", budget)
+    monkeypatch.setattr("agrotech_ai.ollama_client.backoff_delay", lambda _: 0)
+    return budget
+
+
+@pytest.fixture(autouse=True)
+def response_cache(monkeypatch):
+    """Give each test an empty, memory-only response cache."""
+    cache = ResponseCache(path=None)
+    monkeypatch.setattr("agrotech_ai.response_cache._RESPONSE_CACHE", cache)
+    return cache
+
+
+@pytest.fixture(autouse=True)
+def image_pool(monkeypatch):
+    """Run each test's image jobs on threads rather than worker processes."""
+    pool = ImagePool(workers=0)
+    monkeypatch.setattr("agrotech_ai.image_pool._IMAGE_POOL", pool)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture(autouse=True)
+def image_store(monkeypatch):
+    """Give each test an empty store of analysed photos."""
+    store = ImageStore()
+    monkeypatch.setattr("agrotech_ai.image_store._IMAGE_STORE", store)
+    return store
+
+
+@pytest.fixture(autouse=True)
+def upload_store(monkeypatch, tmp_path):
+    """Stage each test's chunked uploads in its own directory."""
+    store = UploadStore(directory=str(tmp_path / "uploads"))
+    monkeypatch.setattr("agrotech_ai.upload_store._UPLOAD_STORE", store)
+    return store
 
 
 @pytest.fixture
@@ -158,6 +250,6 @@ def mock_websocket():
     websocket = AsyncMock()
     websocket.accept = AsyncMock()
     websocket.send_json = AsyncMock()
-    websocket.receive_json = AsyncMock()
+    websocket.receive = AsyncMock()
     websocket.client.host = "127.0.0.1"
     return websocket
@@ -1,8 +1,28 @@
+import asyncio
+import base64
+import hashlib
+import json
 from unittest.mock import AsyncMock, patch
 
 import pytest
+from fastapi import WebSocketDisconnect
 
-from agrotech_ai.websocket_handler import WebSocketHandler
+from agrotech_ai.scheduling import current_request, request_context
+from agrotech_ai.websocket_handler import (
+    MessageReader,
+    TokenForwarder,
+    WebSocketHandler,
+)
+
+
+def text_frame(message):
+    """ASGI receive event of a JSON text frame."""
+    return {"type": "websocket.receive", "text": json.dumps(message)}
+
+
+def binary_frame(data):
+    """ASGI receive event of a binary frame."""
+    return {"type": "websocket.receive", "bytes": data}
 
 
 class TestWebSocketHandler:
@@ -19,17 +39,17 @@ class TestWebSocketHandler:
         websocket = AsyncMock()
         websocket.accept = AsyncMock()
         websocket.send_json = AsyncMock()
-        websocket.receive_json = AsyncMock()
+        websocket.receive = AsyncMock()
         websocket.client.host = "127.0.0.1"
         return websocket
 
     @pytest.mark.asyncio
-    @patch("agrotech_ai.websocket_handler.check_ollama_connection")
+    @patch("agrotech_ai.websocket_handler.get_health_monitor")
     async def test_handle_connection_ollama_not_running(
-        self, mock_check, handler, mock_websocket
+        self, mock_monitor, handler, mock_websocket
     ):
         """Test WebSocket connection when Ollama is not running."""
-        mock_check.return_value = False
+        mock_monitor.return_value.ollama_available = AsyncMock(return_value=False)
 
         await handler.handle_connection(mock_websocket)
 
@@ -41,11 +61,13 @@ class TestWebSocketHandler:
         assert "Ollama" in call_args["message"]
 
     @pytest.mark.asyncio
-    @patch("agrotech_ai.websocket_handler.check_ollama_connection")
-    async def test_handle_connection_success(self, mock_check, handler, mock_websocket):
+    @patch("agrotech_ai.websocket_handler.get_health_monitor")
+    async def test_handle_connection_success(
+        self, mock_monitor, handler, mock_websocket
+    ):
         """Test successful WebSocket connection."""
-        mock_check.return_value = True
-        mock_websocket.receive_json.side_effect = Exception("Connection closed")
+        mock_monitor.return_value.ollama_available = AsyncMock(return_value=True)
+        mock_websocket.receive.side_effect = Exception("Connection closed")
 
         with pytest.raises(Exception):
             await handler.handle_connection(mock_websocket)
@@ -106,10 +128,7 @@ class TestWebSocketHandler:
         assert call_args["type"] == "error"
 
     @pytest.mark.asyncio
-    @patch("agrotech_ai.websocket_handler.asyncio.sleep", new_callable=AsyncMock)
-    async def test_analyze_scenario_complete_flow(
-        self, mock_sleep, handler, mock_websocket
-    ):
+    async def test_analyze_scenario_complete_flow(self, handler, mock_websocket):
         """Test complete scenario analysis flow."""
         # Mock agent responses
         vision_result = {"crop_health": "healthy", "confidence": 0.9}
@@ -144,9 +163,8 @@ class TestWebSocketHandler:
             assert "completado" in final_call["message"]
 
     @pytest.mark.asyncio
-    @patch("agrotech_ai.websocket_handler.asyncio.sleep", new_callable=AsyncMock)
     async def test_analyze_image_scenario_complete_flow(
-        self, mock_sleep, handler, mock_websocket, sample_base64_image
+        self, handler, mock_websocket, sample_base64_image
     ):
         """Test complete image analysis scenario flow."""
         # Mock agent responses
@@ -157,6 +175,7 @@ class TestWebSocketHandler:
             "plant_health_indicators": "Green leaves",
             "recommended_focus_areas": ["leaves", "soil"],
             "confidence": 0.92,
+            "image_analytics": {"canopy_coverage": 0.8},
         }
 
         vision_result = {"crop_health": "healthy", "confidence": 0.9}
@@ -190,11 +209,86 @@ class TestWebSocketHandler:
             # Verify multiple send_json calls were made
             assert mock_websocket.send_json.call_count >= 6
 
-            # Verify ImageVision was called
-            handler.image_vision.analyze_image.assert_called_once_with(
-                sample_base64_image
+            # Verify ImageVision was called with a token forwarder
+            handler.image_vision.analyze_image.assert_called_once()
+            call = handler.image_vision.analyze_image.call_args
+            assert call.args[0] == sample_base64_image
+            assert isinstance(call.kwargs["on_token"], TokenForwarder)
+
+            # AgriVision gets the pixel measurements alongside the description
+            call = handler.agri_vision.analyze_image.call_args
+            assert call.kwargs["image_analytics"] == {"canopy_coverage": 0.8}
+
+    @pytest.mark.asyncio
+    async def test_non_agricultural_image_skips_downstream_agents(
+        self, handler, mock_websocket, sample_base64_image
+    ):
+        """Test that a confidently rejected photo costs a single LLM call."""
+        image_analysis = {
+            "is_agricultural_image": False,
+            "reason": "La foto muestra un coche",
+            "image_description": None,
+            "confidence": 0.95,
+        }
+
+        with (
+            patch.object(
+                handler.image_vision, "analyze_image", return_value=image_analysis
+            ),
+            patch.object(handler.agri_vision, "analyze_image") as agri_vision,
+            patch.object(handler.soil_sense, "analyze_environment") as soil_sense,
+            patch.object(handler.crop_master, "make_decision") as crop_master,
+        ):
+            await handler.analyze_image_scenario(
+                mock_websocket, sample_base64_image, "", "Junk Upload"
             )
 
+        agri_vision.assert_not_called()
+        soil_sense.assert_not_called()
+        crop_master.assert_not_called()
+        sent = [call.args[0] for call in mock_websocket.send_json.call_args_list]
+        results = {m["agent"]: m["data"] for m in sent if m["type"] == "agent_result"}
+        for agent in ("AgriVision", "SoilSense", "CropMaster"):
+            assert results[agent] == {
+                "status": "not_applicable",
+                "reason": "La foto muestra un coche",
+            }
+        assert "completado" in sent[-1]["message"]
+        assert sent[-1]["timings"]["CropMaster"]["outcome"] == "skipped"
+
+    @pytest.mark.asyncio
+    async def test_unsure_non_agricultural_verdict_still_runs_agents(
+        self, handler, mock_websocket, sample_base64_image
+    ):
+        """Test that a low-confidence rejection does not skip the analysis."""
+        image_analysis = {
+            "is_agricultural_image": False,
+            "reason": "Demasiado oscura",
+            "image_description": "Hojas poco visibles",
+            "confidence": 0.2,
+        }
+
+        with (
+            patch.object(
+                handler.image_vision, "analyze_image", return_value=image_analysis
+            ),
+            patch.object(
+                handler.agri_vision, "analyze_image", return_value={"crop": "ok"}
+            ) as agri_vision,
+            patch.object(
+                handler.soil_sense, "analyze_environment", return_value={"soil": "ok"}
+            ),
+            patch.object(
+                handler.crop_master, "make_decision", return_value={"decision": "ok"}
+            ) as crop_master,
+        ):
+            await handler.analyze_image_scenario(
+                mock_websocket, sample_base64_image, "", "Dark Photo"
+            )
+
+        agri_vision.assert_called_once()
+        crop_master.assert_called_once()
+
     @pytest.mark.asyncio
     async def test_analyze_scenario_agent_error(self, handler, mock_websocket):
         """Test scenario analysis with agent error."""
@@ -213,3 +307,577 @@ class TestWebSocketHandler:
                 if call[0][0].get("type") == "error"
             ]
             assert len(error_calls) > 0
+
+    @pytest.mark.asyncio
+    async def test_token_forwarder_sends_tokens_and_partials(self, mock_websocket):
+        """Test that streamed tokens are forwarded with periodic partials."""
+        forwarder = TokenForwarder(mock_websocket, "SoilSense", partial_interval=0)
+
+        await forwarder('{"soil')
+        await forwarder('_moisture": 40}')
+
+        messages = [call[0][0] for call in mock_websocket.send_json.call_args_list]
+        tokens = [m for m in messages if m["type"] == "agent_token"]
+        partials = [m for m in messages if m["type"] == "agent_partial"]
+
+        assert [m["token"] for m in tokens] == ['{"soil', '_moisture": 40}']
+        assert all(m["agent"] == "SoilSense" for m in messages)
+        assert partials[-1]["text"] == '{"soil_moisture": 40}'
+
+    @pytest.mark.asyncio
+    async def test_streaming_disabled_passes_no_forwarder(self, mock_websocket):
+        """Test that agents get no token callback when streaming is off."""
+        handler = WebSocketHandler(stream_tokens=False)
+
+        with (
+            patch.object(handler.agri_vision, "analyze_image", return_value={}),
+            patch.object(handler.soil_sense, "analyze_environment", return_value={}),
+            patch.object(handler.crop_master, "make_decision", return_value={}),
+        ):
+            await handler.analyze_scenario(
+                mock_websocket, "Plants", "Dry soil", "No Stream"
+            )
+
+            assert (
+                handler.agri_vision.analyze_image.call_args.kwargs["on_token"] is None
+            )
+
+    @pytest.mark.asyncio
+    async def test_bypass_cache_flag_reaches_every_agent(
+        self, handler, mock_websocket, sample_base64_image
+    ):
+        """Test that bypass_cache disables the response cache for the request."""
+        message = {
+            "type": "image_analysis",
+            "image_data": sample_base64_image,
+            "environment_description": "Dry soil",
+            "bypass_cache": True,
+        }
+        agents = [
+            (handler.image_vision, "analyze_image"),
+            (handler.agri_vision, "analyze_image"),
+            (handler.soil_sense, "analyze_environment"),
+            (handler.crop_master, "make_decision"),
+        ]
+
+        with (
+            patch.object(*agents[0], return_value={}) as image_mock,
+            patch.object(*agents[1], return_value={}) as vision_mock,
+            patch.object(*agents[2], return_value={}) as soil_mock,
+            patch.object(*agents[3], return_value={}) as decision_mock,
+        ):
+            await handler.handle_image_analysis(mock_websocket, message)
+
+        for agent_mock in (image_mock, vision_mock, soil_mock, decision_mock):
+            assert agent_mock.call_args.kwargs["use_cache"] is False
+
+    @pytest.mark.asyncio
+    async def test_priority_and_deadline_reach_the_agents(
+        self, handler, mock_websocket, sample_base64_image
+    ):
+        """Test that agent calls run under the message's scheduling context."""
+        message = {
+            "type": "image_analysis",
+            "image_data": sample_base64_image,
+            "environment_description": "Dry soil",
+            "priority": "bulk",
+            "deadline_seconds": 30,
+        }
+        seen = []
+
+        async def record_context(*args, **kwargs):
+            seen.append(current_request())
+            return {}
+
+        with (
+            patch.object(handler.image_vision, "analyze_image", record_context),
+            patch.object(handler.agri_vision, "analyze_image", record_context),
+            patch.object(handler.soil_sense, "analyze_environment", record_context),
+            patch.object(handler.crop_master, "make_decision", record_context),
+        ):
+            await handler.process_message(mock_websocket, message)
+
+        assert len(seen) == 4
+        assert {context.priority for context in seen} == {"bulk"}
+        assert len({context.client_id for context in seen}) == 1
+        assert all(0 < context.remaining() <= 30 for context in seen)
+
+    @pytest.mark.asyncio
+    async def test_unknown_priority_is_rejected(self, handler, mock_websocket):
+        """Test that an unknown priority class is reported to the client."""
+        message = {"type": "image_analysis", "priority": "urgent"}
+
+        await handler.process_message(mock_websocket, message)
+
+        sent = mock_websocket.send_json.call_args[0][0]
+        assert sent["type"] == "error"
+        assert "urgent" in sent["message"]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("deadline", ["30", -1, 0, True, [30]])
+    async def test_invalid_deadline_is_rejected(
+        self, handler, mock_websocket, deadline
+    ):
+        """Test that a malformed deadline is reported, not left to crash."""
+        analyses = {}
+        message = {"type": "image_analysis", "deadline_seconds": deadline}
+
+        await handler.process_message(mock_websocket, message, analyses)
+
+        sent = mock_websocket.send_json.call_args[0][0]
+        assert sent["type"] == "error"
+        assert "deadline_seconds" in sent["message"]
+        assert analyses == {}
+
+    @pytest.mark.asyncio
+    @patch("agrotech_ai.websocket_handler.get_health_monitor")
+    async def test_disconnect_cancels_running_analysis(
+        self, mock_monitor, handler, mock_websocket, sample_base64_image
+    ):
+        """Test that closing the socket stops the pipeline mid-analysis."""
+        mock_monitor.return_value.ollama_available = AsyncMock(return_value=True)
+        started = asyncio.Event()
+        cancelled = []
+
+        async def slow_analysis(*args, **kwargs):
+            started.set()
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        messages = [
+            {
+                "type": "image_analysis",
+                "image_data": sample_base64_image,
+                "environment_description": "Dry soil",
+            }
+        ]
+
+        async def receive():
+            if messages:
+                return text_frame(messages.pop())
+            # The tab is closed while ImageVision is still generating
+            await started.wait()
+            raise WebSocketDisconnect()
+
+        mock_websocket.receive.side_effect = receive
+
+        with patch.object(handler.image_vision, "analyze_image", slow_analysis):
+            await handler.handle_connection(mock_websocket)
+
+        assert cancelled == [True]
+
+    @pytest.mark.asyncio
+    async def test_cancel_message_stops_analysis_by_request_id(
+        self, handler, mock_websocket, sample_base64_image
+    ):
+        """Test that a cancel message stops only the named analysis."""
+        started = asyncio.Event()
+
+        async def slow_analysis(*args, **kwargs):
+            started.set()
+            await asyncio.Event().wait()
+
+        analyses = {}
+        with patch.object(handler.image_vision, "analyze_image", slow_analysis):
+            await handler.process_message(
+                mock_websocket,
+                {
+                    "type": "image_analysis",
+                    "request_id": "photo-1",
+                    "image_data": sample_base64_image,
+                    "environment_description": "Dry soil",
+                },
+                analyses,
+            )
+            await started.wait()
+            task = analyses["photo-1"]
+
+            await handler.process_message(
+                mock_websocket, {"type": "cancel", "request_id": "photo-1"}, analyses
+            )
+
+        assert task.cancelled()
+        assert analyses == {}
+        mock_websocket.send_json.assert_called_with(
+            {"type": "cancelled", "request_id": "photo-1"}
+        )
+
+    @pytest.mark.asyncio
+    async def test_every_frame_carries_the_generated_request_id(
+        self, handler, mock_websocket, sample_base64_image
+    ):
+        """Test that an analysis sent without request_id gets one back and
+        every frame it sends carries it."""
+        analyses = {}
+        with (
+            patch.object(handler.image_vision, "analyze_image", return_value={}),
+            patch.object(handler.agri_vision, "analyze_image", return_value={}),
+            patch.object(handler.soil_sense, "analyze_environment", return_value={}),
+            patch.object(handler.crop_master, "make_decision", return_value={}),
+        ):
+            await handler.process_message(
+                mock_websocket,
+                {
+                    "type": "image_analysis",
+                    "image_data": sample_base64_image,
+                    "environment_description": "Dry soil",
+                },
+                analyses,
+            )
+            await asyncio.gather(*analyses.values())
+
+        frames = [call.args[0] for call in mock_websocket.send_json.call_args_list]
+        assert frames[0]["type"] == "analysis_started"
+        request_id = frames[0]["request_id"]
+        assert request_id
+        assert {frame["type"] for frame in frames} >= {"agent_result", "status"}
+        assert all(frame["request_id"] == request_id for frame in frames)
+
+    @pytest.mark.asyncio
+    async def test_cancel_unknown_request_id_reports_error(
+        self, handler, mock_websocket
+    ):
+        """Test that cancelling an unknown analysis is reported to the client."""
+        await handler.process_message(
+            mock_websocket, {"type": "cancel", "request_id": "missing"}, {}
+        )
+
+        sent = mock_websocket.send_json.call_args[0][0]
+        assert sent["type"] == "error"
+        assert "missing" in sent["message"]
+
+    @pytest.mark.asyncio
+    async def test_spent_budget_is_reported_as_partial(self, handler, mock_websocket):
+        """Test that the client is told when the budget ran out."""
+        with (
+            patch.object(handler.agri_vision, "analyze_image", return_value={}),
+            patch.object(handler.soil_sense, "analyze_environment", return_value={}),
+            patch.object(handler.crop_master, "make_decision", return_value={}),
+            request_context(deadline_seconds=-1),
+        ):
+            await handler.analyze_scenario(
+                mock_websocket, "Plants", "Dry soil", "Late Scenario"
+            )
+
+        final = mock_websocket.send_json.call_args[0][0]
+        assert final["type"] == "status"
+        assert "parciales" in final["message"]
+
+    @pytest.mark.asyncio
+    async def test_configured_budget_applies_without_client_deadline(
+        self, handler, mock_websocket, sample_base64_image
+    ):
+        """Test that the configured budget is used when none is sent."""
+        seen = []
+
+        async def record_context(*args, **kwargs):
+            seen.append(current_request().remaining())
+            return {}
+
+        message = {
+            "type": "image_analysis",
+            "image_data": sample_base64_image,
+            "environment_description": "Dry soil",
+        }
+        with (
+            patch("agrotech_ai.websocket_handler.ANALYSIS_DEADLINE_SECONDS", 90),
+            patch.object(handler.image_vision, "analyze_image", record_context),
+        ):
+            await handler.process_message(mock_websocket, message)
+
+        assert 0 < seen[0] <= 90
+
+    @pytest.mark.asyncio
+    async def test_each_result_is_sent_as_its_agent_completes(
+        self, handler, mock_websocket
+    ):
+        """Test that a fast agent's result is not held back by a slow one."""
+        release_vision = asyncio.Event()
+
+        async def slow_vision(*args, **kwargs):
+            await release_vision.wait()
+            return {"crop_health": "healthy"}
+
+        async def fast_soil(*args, **kwargs):
+            return {"soil_moisture": 70}
+
+        def results_sent():
+            return [
+                call[0][0]["agent"]
+                for call in mock_websocket.send_json.call_args_list
+                if call[0][0]["type"] == "agent_result"
+            ]
+
+        with (
+            patch.object(handler.agri_vision, "analyze_image", slow_vision),
+            patch.object(handler.soil_sense, "analyze_environment", fast_soil),
+            patch.object(handler.crop_master, "make_decision", return_value={}),
+        ):
+            analysis = asyncio.create_task(
+                handler.analyze_scenario(
+                    mock_websocket, "Plants", "Dry soil", "As Completed"
+                )
+            )
+            await asyncio.sleep(0.01)
+            assert results_sent() == ["SoilSense"]
+
+            release_vision.set()
+            await analysis
+
+        assert results_sent() == ["SoilSense", "AgriVision", "CropMaster"]
+
+
+class TestBinaryUpload:
+    """Test cases for images uploaded as binary frames."""
+
+    @pytest.fixture
+    def header(self):
+        """Header of an upload of ten bytes."""
+        return {
+            "type": "image_analysis",
+            "image_bytes": 10,
+            "environment_description": "Dry soil",
+        }
+
+    @pytest.mark.asyncio
+    async def test_frames_are_gathered_into_one_message(self, mock_websocket, header):
+        """Test that the header is delivered once all its bytes arrived."""
+        mock_websocket.receive.side_effect = [
+            text_frame(header),
+            binary_frame(b"0123"),
+            text_frame({"type": "ping"}),
+            binary_frame(b"456789"),
+        ]
+        reader = MessageReader(mock_websocket)
+
+        assert await reader.receive() == {"type": "ping"}
+        message = await reader.receive()
+
+        assert message["image_data"] == b"0123456789"
+        assert message["environment_description"] == "Dry soil"
+
+    @pytest.mark.asyncio
+    async def test_oversized_upload_is_refused(self, mock_websocket, header):
+        """Test that an upload above the limit is rejected at its header."""
+        mock_websocket.receive.side_effect = [
+            text_frame(header),
+            text_frame({"type": "ping"}),
+        ]
+        reader = MessageReader(mock_websocket, max_upload_bytes=5)
+
+        assert await reader.receive() == {"type": "ping"}
+
+        error = mock_websocket.send_json.call_args[0][0]
+        assert error["type"] == "error"
+        assert "tamaño máximo" in error["message"]
+
+    @pytest.mark.asyncio
+    async def test_bytes_beyond_the_header_drop_the_upload(
+        self, mock_websocket, header
+    ):
+        """Test that more bytes than announced fail the upload."""
+        mock_websocket.receive.side_effect = [
+            text_frame(header),
+            binary_frame(b"0123456789ab"),
+            text_frame({"type": "ping"}),
+        ]
+        reader = MessageReader(mock_websocket)
+
+        assert await reader.receive() == {"type": "ping"}
+
+        assert reader.upload is None
+        assert mock_websocket.send_json.call_args[0][0]["type"] == "error"
+
+    @pytest.mark.asyncio
+    async def test_binary_upload_reaches_image_vision(
+        self, mock_websocket, sample_base64_image
+    ):
+        """Test that the bytes are analysed like the base64 upload."""
+        handler = WebSocketHandler(stream_tokens=False)
+        image = base64.b64decode(sample_base64_image)
+        mock_websocket.receive.side_effect = [
+            text_frame(
+                {
+                    "type": "image_analysis",
+                    "image_bytes": len(image),
+                    "environment_description": "Dry soil",
+                }
+            ),
+            binary_frame(image),
+        ]
+        message = await MessageReader(mock_websocket).receive()
+        received = []
+
+        async def analyze_image(image, **kwargs):
+            received.append(image)
+            return {"image_description": "Plants"}
+
+        with (
+            patch.object(handler.image_vision, "analyze_image", analyze_image),
+            patch.object(handler.agri_vision, "analyze_image", return_value={}),
+            patch.object(handler.soil_sense, "analyze_environment", return_value={}),
+            patch.object(handler.crop_master, "make_decision", return_value={}),
+        ):
+            await handler.process_message(mock_websocket, message)
+
+        assert received == [image]
+
+
+class TestChunkedUpload:
+    """Test cases for resumable chunked uploads."""
+
+    @pytest.mark.asyncio
+    async def test_upload_is_acknowledged_and_analysed(
+        self, mock_websocket, sample_base64_image
+    ):
+        """Test that chunks are acked by offset and analysed by upload id."""
+        handler = WebSocketHandler(stream_tokens=False)
+        image = base64.b64decode(sample_base64_image)
+        half = len(image) // 2
+
+        await handler.process_message(
+            mock_websocket, {"type": "upload_start", "size": len(image)}
+        )
+        upload_id = mock_websocket.send_json.call_args[0][0]["upload_id"]
+        for offset, chunk in ((0, image[:half]), (half, image[half:])):
+            await handler.process_message(
+                mock_websocket,
+                {
+                    "type": "upload_chunk",
+                    "upload_id": upload_id,
+                    "offset": offset,
+                    "data": base64.b64encode(chunk).decode(),
+                    "checksum": hashlib.sha256(chunk).hexdigest(),
+                },
+            )
+
+        acks = [call[0][0] for call in mock_websocket.send_json.call_args_list]
+        assert [ack["offset"] for ack in acks] == [0, half, len(image)]
+        assert {ack["type"] for ack in acks} == {"upload_ack"}
+
+        received = []
+
+        async def analyze_image(image, **kwargs):
+            received.append(image)
+            return {"image_description": "Plants"}
+
+        with (
+            patch.object(handler.image_vision, "analyze_image", analyze_image),
+            patch.object(handler.agri_vision, "analyze_image", return_value={}),
+            patch.object(handler.soil_sense, "analyze_environment", return_value={}),
+            patch.object(handler.crop_master, "make_decision", return_value={}),
+        ):
+            await handler.process_message(
+                mock_websocket,
+                {
+                    "type": "image_analysis",
+                    "upload_id": upload_id,
+                    "environment_description": "Dry soil",
+                },
+            )
+
+        assert received == [image]
+
+    @pytest.mark.asyncio
+    async def test_unknown_upload_is_an_error(self, handler, mock_websocket):
+        """Test that analysing an upload that was never staged fails."""
+        await handler.handle_image_analysis(
+            mock_websocket,
+            {
+                "type": "image_analysis",
+                "upload_id": "missing",
+                "environment_description": "Dry soil",
+            },
+        )
+
+        error = mock_websocket.send_json.call_args[0][0]
+        assert error == {
+            "type": "error",
+            "upload_id": "missing",
+            "message": "Subida desconocida o caducada",
+        }
+
+    @pytest.fixture
+    def handler(self):
+        """WebSocket handler fixture."""
+        return WebSocketHandler()
+
+
+class TestStoredImage:
+    """Test cases for re-analysing a photo by its image_id."""
+
+    @pytest.mark.asyncio
+    async def test_image_id_reuses_image_vision(
+        self, mock_websocket, image_store, sample_base64_image
+    ):
+        """Test that only the downstream agents run for a stored photo."""
+        handler = WebSocketHandler(stream_tokens=False)
+        described = {"image_description": "Tomates", "confidence": 0.9}
+
+        async def analyze_image(image, image_id=None, **kwargs):
+            image_store.put(image_id, image, described)
+            return described
+
+        environments = []
+
+        async def analyze_environment(environment, **kwargs):
+            environments.append(environment)
+            return {}
+
+        with (
+            patch.object(
+                handler.image_vision, "analyze_image", side_effect=analyze_image
+            ) as image_vision,
+            patch.object(handler.agri_vision, "analyze_image", return_value={}),
+            patch.object(
+                handler.soil_sense, "analyze_environment", analyze_environment
+            ),
+            patch.object(handler.crop_master, "make_decision", return_value={}),
+        ):
+            await handler.handle_image_analysis(
+                mock_websocket,
+                {"image_data": sample_base64_image, "environment_description": "Seco"},
+            )
+            sent = [call[0][0] for call in mock_websocket.send_json.call_args_list]
+            image_id = sent[0]["image_id"]
+            mock_websocket.send_json.reset_mock()
+
+            await handler.handle_image_analysis(
+                mock_websocket,
+                {"image_id": image_id, "environment_description": "Lluvioso"},
+            )
+
+        assert sent[0]["type"] == "image_received"
+        assert image_vision.call_count == 1
+        assert environments[1].startswith("Lluvioso")
+        results = [
+            call[0][0]
+            for call in mock_websocket.send_json.call_args_list
+            if call[0][0]["type"] == "agent_result"
+        ]
+        assert results[0] == {
+            "type": "agent_result",
+            "agent": "ImageVision",
+            "data": described,
+        }
+        assert {result["agent"] for result in results[1:3]} == {
+            "AgriVision",
+            "SoilSense",
+        }
+        assert results[3]["agent"] == "CropMaster"
+
+    @pytest.mark.asyncio
+    async def test_unknown_image_id_asks_for_the_image(self, mock_websocket):
+        """Test that an evicted photo has to be sent again."""
+        handler = WebSocketHandler()
+
+        await handler.handle_image_analysis(
+            mock_websocket, {"image_id": "gone", "environment_description": "Seco"}
+        )
+
+        error = mock_websocket.send_json.call_args[0][0]
+        assert error["type"] == "error"
+        assert error["image_id"] == "gone"
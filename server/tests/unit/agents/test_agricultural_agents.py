@@ -1,8 +1,9 @@
-from unittest.mock import Mock, patch
+from unittest.mock import patch
 
 import pytest
 
 from agrotech_ai.agents import AgriVisionAgent, CropMasterAgent, SoilSenseAgent
+from agrotech_ai.schemas import AGRI_VISION_SCHEMA
 
 
 class TestAgriVisionAgent:
@@ -19,7 +20,7 @@ class TestAgriVisionAgent:
         assert agent.expertise == "análisis visual de cultivos"
 
     @pytest.mark.asyncio
-    async def test_analyze_image_healthy_crop(self, agent):
+    async def test_analyze_image_healthy_crop(self, agent, ollama_stream_pool):
         """Test image analysis for healthy crop."""
         mock_response = {
             "response": """{
@@ -33,10 +34,7 @@ class TestAgriVisionAgent:
             }"""
         }
 
-        with patch.object(agent.session, "post") as mock_post:
-            mock_post.return_value = Mock()
-            mock_post.return_value.status_code = 200
-            mock_post.return_value.json.return_value = mock_response
+        with patch.object(agent, "pool", ollama_stream_pool(mock_response["response"])):
 
             result = await agent.analyze_image(
                 "Healthy tomato plants with green leaves"
@@ -44,11 +42,12 @@ class TestAgriVisionAgent:
 
             assert result["crop_health"] == "healthy"
             assert result["pest_detected"] is False
+            assert agent.pool.sent[0]["format"] == AGRI_VISION_SCHEMA
             assert result["leaf_condition"] == "excellent"
             assert result["confidence"] == 0.9
 
     @pytest.mark.asyncio
-    async def test_analyze_image_diseased_crop(self, agent):
+    async def test_analyze_image_diseased_crop(self, agent, ollama_stream_pool):
         """Test image analysis for diseased crop."""
         mock_response = {
             "response": """{
@@ -62,10 +61,7 @@ class TestAgriVisionAgent:
             }"""
         }
 
-        with patch.object(agent.session, "post") as mock_post:
-            mock_post.return_value = Mock()
-            mock_post.return_value.status_code = 200
-            mock_post.return_value.json.return_value = mock_response
+        with patch.object(agent, "pool", ollama_stream_pool(mock_response["response"])):
 
             result = await agent.analyze_image("Plants with yellowing leaves and spots")
 
@@ -109,7 +105,7 @@ class TestSoilSenseAgent:
         assert agent.expertise == "condiciones ambientales y del suelo"
 
     @pytest.mark.asyncio
-    async def test_analyze_environment_good_conditions(self, agent):
+    async def test_analyze_environment_good_conditions(self, agent, ollama_stream_pool):
         """Test environmental analysis with good conditions."""
         mock_response = {
             "response": """{
@@ -125,10 +121,7 @@ class TestSoilSenseAgent:
             }"""
         }
 
-        with patch.object(agent.session, "post") as mock_post:
-            mock_post.return_value = Mock()
-            mock_post.return_value.status_code = 200
-            mock_post.return_value.json.return_value = mock_response
+        with patch.object(agent, "pool", ollama_stream_pool(mock_response["response"])):
 
             conditions = "Good soil moisture, optimal pH, moderate temperature"
             result = await agent.analyze_environment(conditions)
@@ -139,7 +132,9 @@ class TestSoilSenseAgent:
             assert result["environmental_stress"] == "low"
 
     @pytest.mark.asyncio
-    async def test_analyze_environment_stress_conditions(self, agent):
+    async def test_analyze_environment_stress_conditions(
+        self, agent, ollama_stream_pool
+    ):
         """Test environmental analysis with stress conditions."""
         mock_response = {
             "response": """{
@@ -155,10 +150,7 @@ class TestSoilSenseAgent:
             }"""
         }
 
-        with patch.object(agent.session, "post") as mock_post:
-            mock_post.return_value = Mock()
-            mock_post.return_value.status_code = 200
-            mock_post.return_value.json.return_value = mock_response
+        with patch.object(agent, "pool", ollama_stream_pool(mock_response["response"])):
 
             conditions = "Dry soil, high pH, hot temperature, low humidity"
             result = await agent.analyze_environment(conditions)
@@ -207,7 +199,7 @@ class TestCropMasterAgent:
 
     @pytest.mark.asyncio
     async def test_make_decision_healthy_scenario(
-        self, agent, sample_vision_result, sample_soil_result
+        self, agent, sample_vision_result, sample_soil_result, ollama_stream_pool
     ):
         """Test decision making for healthy scenario."""
         mock_response = {
@@ -223,10 +215,7 @@ class TestCropMasterAgent:
             }"""
         }
 
-        with patch.object(agent.session, "post") as mock_post:
-            mock_post.return_value = Mock()
-            mock_post.return_value.status_code = 200
-            mock_post.return_value.json.return_value = mock_response
+        with patch.object(agent, "pool", ollama_stream_pool(mock_response["response"])):
 
             result = await agent.make_decision(sample_vision_result, sample_soil_result)
 
@@ -237,7 +226,7 @@ class TestCropMasterAgent:
             assert len(result["urgent_alerts"]) == 0
 
     @pytest.mark.asyncio
-    async def test_make_decision_critical_scenario(self, agent):
+    async def test_make_decision_critical_scenario(self, agent, ollama_stream_pool):
         """Test decision making for critical scenario."""
         vision_data = {
             "crop_health": "diseased",
@@ -272,10 +261,7 @@ class TestCropMasterAgent:
             }"""
         }
 
-        with patch.object(agent.session, "post") as mock_post:
-            mock_post.return_value = Mock()
-            mock_post.return_value.status_code = 200
-            mock_post.return_value.json.return_value = mock_response
+        with patch.object(agent, "pool", ollama_stream_pool(mock_response["response"])):
 
             result = await agent.make_decision(vision_data, soil_data)
 
@@ -291,8 +277,8 @@ class TestCropMasterAgent:
         vision_data = {}
         soil_data = {}
 
-        with patch.object(agent.session, "post") as mock_post:
-            mock_post.side_effect = Exception("Connection error")
+        with patch.object(agent.pool.backends[0].session, "stream") as mock_stream:
+            mock_stream.side_effect = Exception("Connection error")
 
             result = await agent.make_decision(vision_data, soil_data)
 
@@ -0,0 +1,163 @@
+import httpx
+import pytest
+
+from agrotech_ai.backend_pool import NoBackendAvailable, OllamaRequestError
+from agrotech_ai.circuit_breaker import CLOSED, HALF_OPEN, OPEN
+from agrotech_ai.ollama_client import OllamaAgent
+
+
+def ok_handler(request):
+    """Backend that answers every request successfully."""
+    return httpx.Response(200, json={"models": []})
+
+
+class TestBackendPool:
+    """Test cases for least-outstanding routing and backend ejection."""
+
+    @pytest.mark.asyncio
+    async def test_routes_to_least_outstanding_backend(self, backend_pool_factory):
+        """Test that a busy backend is skipped while another is idle."""
+        pool = backend_pool_factory(ok_handler, ok_handler)
+
+        async with pool.acquire() as first:
+            async with pool.acquire() as second:
+                assert first is not second
+                assert first.in_flight == 1
+                assert second.in_flight == 1
+
+        assert [backend.in_flight for backend in pool.backends] == [0, 0]
+
+    @pytest.mark.asyncio
+    async def test_spreads_sequential_requests(self, backend_pool_factory):
+        """Test that idle backends share sequential requests."""
+        pool = backend_pool_factory(ok_handler, ok_handler)
+
+        for _ in range(4):
+            async with pool.acquire():
+                pass
+
+        assert [backend.total_requests for backend in pool.backends] == [2, 2]
+
+    @pytest.mark.asyncio
+    async def test_opens_circuit_after_consecutive_failures(self, backend_pool_factory):
+        """Test that repeated transport failures open the backend's circuit."""
+        pool = backend_pool_factory(ok_handler, failure_threshold=2)
+        backend = pool.backends[0]
+
+        for _ in range(2):
+            with pytest.raises(OllamaRequestError):
+                async with pool.acquire():
+                    raise OllamaRequestError("HTTP 500")
+
+        assert backend.breaker.state == OPEN
+        with pytest.raises(NoBackendAvailable):
+            pool.select()
+
+    @pytest.mark.asyncio
+    async def test_non_backend_errors_do_not_count(self, backend_pool_factory):
+        """Test that caller errors are not blamed on the backend."""
+        pool = backend_pool_factory(ok_handler, failure_threshold=1)
+
+        with pytest.raises(ValueError):
+            async with pool.acquire():
+                raise ValueError("client went away")
+
+        assert pool.backends[0].breaker.state == CLOSED
+
+    @pytest.mark.asyncio
+    async def test_half_open_allows_one_trial_request(self, backend_pool_factory):
+        """Test that an expired open period lets a single trial through."""
+        pool = backend_pool_factory(ok_handler, failure_threshold=1, open_seconds=0)
+        backend = pool.backends[0]
+        backend.record_failure()
+        assert backend.breaker.state == HALF_OPEN
+
+        async with pool.acquire():
+            with pytest.raises(NoBackendAvailable):
+                pool.select()
+
+        assert backend.breaker.state == CLOSED
+
+    @pytest.mark.asyncio
+    async def test_agent_fails_over_to_healthy_backend(
+        self, backend_pool_factory, ollama_stream_pool
+    ):
+        """Test that agents keep working after one backend's circuit opens."""
+
+        def broken_handler(request):
+            return httpx.Response(500)
+
+        healthy = ollama_stream_pool('{"ok": true}').backends[0]
+        pool = backend_pool_factory(broken_handler, failure_threshold=1)
+        pool.backends.append(healthy)
+
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = pool
+
+        results = [
+            await agent.generate_response("prompt", use_cache=False) for _ in range(3)
+        ]
+
+        assert pool.backends[0].breaker.state == OPEN
+        assert results[-1] == {"ok": True}
+        assert pool.backends[0].total_requests == 1
+
+
+class TestModelAffinity:
+    """Test cases for routing each model to the backend that has it loaded."""
+
+    @pytest.mark.asyncio
+    async def test_refresh_reads_loaded_models_from_ps(self, backend_pool_factory):
+        """Test that /api/ps populates each backend's loaded models."""
+
+        def ps_handler(request):
+            assert request.url.path == "/api/ps"
+            return httpx.Response(200, json={"models": [{"name": "llava"}]})
+
+        pool = backend_pool_factory(ps_handler)
+
+        await pool.refresh_loaded_models()
+
+        assert pool.backends[0].has_model("llava:latest")
+        assert pool.snapshot()[0]["loaded_models"] == ["llava:latest"]
+
+    def test_prefers_backend_with_model_loaded(self, backend_pool_factory):
+        """Test that a warm backend wins over an idle cold one."""
+        pool = backend_pool_factory(ok_handler, ok_handler)
+        cold, warm = pool.backends
+        warm.loaded_models = {"llava:latest"}
+        warm.in_flight = 1
+
+        assert pool.select("llava") is warm
+        assert pool.select("gemma3:270m") is cold
+
+    def test_busy_warm_backend_falls_back_to_least_loaded(self, backend_pool_factory):
+        """Test that affinity gives way when the warm backend is overloaded."""
+        pool = backend_pool_factory(ok_handler, ok_handler, affinity_max_skew=1)
+        cold, warm = pool.backends
+        warm.loaded_models = {"llava:latest"}
+        warm.in_flight = 3
+
+        assert pool.select("llava") is cold
+
+    @pytest.mark.asyncio
+    async def test_successful_request_marks_model_loaded(self, backend_pool_factory):
+        """Test that serving a model records it as loaded on the backend."""
+        pool = backend_pool_factory(ok_handler)
+
+        async with pool.acquire("gemma3:270m") as backend:
+            assert backend.gate.active_model == "gemma3:270m"
+
+        assert backend.has_model("gemma3:270m")
+        assert backend.gate.running == 0
+
+    @pytest.mark.asyncio
+    async def test_loaded_models_do_not_wait_for_each_other(self, backend_pool_factory):
+        """Test that two models loaded side by side are not gated."""
+        pool = backend_pool_factory(ok_handler)
+        pool.backends[0].loaded_models = {"gemma3:4b", "qwen2.5vl:3b"}
+
+        async with pool.acquire("qwen2.5vl:3b"):
+            async with pool.acquire("gemma3:4b") as backend:
+                assert backend.gate.running == 2
+                assert backend.gate.queued == 0
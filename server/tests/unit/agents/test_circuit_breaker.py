@@ -0,0 +1,211 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from agrotech_ai.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from agrotech_ai.ollama_client import OllamaAgent
+from agrotech_ai.retry import RETRY_STATS, RetryBudget, backoff_delay
+
+
+class TestCircuitBreaker:
+    """Test cases for the closed/open/half-open state machine."""
+
+    def test_opens_at_threshold_and_blocks_requests(self):
+        """Test that the breaker opens after consecutive failures."""
+        breaker = CircuitBreaker("backend", failure_threshold=2, open_seconds=30)
+
+        breaker.record_failure()
+        assert breaker.state == CLOSED
+        breaker.record_failure()
+
+        assert breaker.state == OPEN
+        assert not breaker.allow_request()
+
+    def test_success_resets_failure_streak(self):
+        """Test that only consecutive failures count."""
+        breaker = CircuitBreaker("backend", failure_threshold=2, open_seconds=30)
+
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+
+        assert breaker.state == CLOSED
+
+    def test_failed_trial_reopens_for_longer(self):
+        """Test that a failed half-open trial doubles the open period."""
+        breaker = CircuitBreaker("backend", failure_threshold=1, open_seconds=10)
+        breaker.record_failure(unreachable=True)
+
+        breaker.half_open()
+        assert breaker.state == HALF_OPEN
+        assert breaker.allow_request()
+        breaker.on_request()
+        assert not breaker.allow_request()
+        breaker.record_failure()
+
+        assert breaker.state == OPEN
+        assert breaker.opened_until - time.monotonic() > 15
+        breaker.half_open()
+        assert breaker.state == OPEN
+
+    def test_health_probe_half_opens_backend(self):
+        """Test that half_open only applies to an open breaker."""
+        breaker = CircuitBreaker("backend", failure_threshold=1, open_seconds=30)
+
+        breaker.half_open()
+        assert breaker.state == CLOSED
+
+        breaker.record_failure(unreachable=True)
+        breaker.half_open()
+        assert breaker.state == HALF_OPEN
+
+    def test_health_probe_ignores_error_answers(self):
+        """Test that a probe does not cut short an open period it cannot
+        vouch for, such as one caused by 5xx answers or read timeouts."""
+        breaker = CircuitBreaker("backend", failure_threshold=1, open_seconds=30)
+        breaker.record_failure()
+
+        breaker.half_open()
+
+        assert breaker.state == OPEN
+        assert not breaker.allow_request()
+
+    def test_abandoned_trial_is_given_back(self):
+        """Test that a trial that ends without an outcome frees its slot."""
+        breaker = CircuitBreaker("backend", failure_threshold=1, open_seconds=30)
+        breaker.record_failure(unreachable=True)
+        breaker.half_open()
+        breaker.on_request()
+        assert not breaker.allow_request()
+
+        breaker.on_abandoned()
+        assert breaker.allow_request()
+
+    def test_health_probe_leaves_running_trial_alone(self):
+        """Test that a probe does not let a second trial past a running one."""
+        breaker = CircuitBreaker("backend", failure_threshold=1, open_seconds=30)
+        breaker.record_failure(unreachable=True)
+        breaker.half_open()
+        breaker.on_request()
+
+        breaker.half_open()
+
+        assert breaker.state == HALF_OPEN
+        assert not breaker.allow_request()
+
+    @pytest.mark.asyncio
+    async def test_cancelled_trial_does_not_strand_backend(self, backend_pool_factory):
+        """Test that a cancelled half-open request leaves the backend usable."""
+        pool = backend_pool_factory(
+            lambda request: httpx.Response(200), failure_threshold=1
+        )
+        backend = pool.backends[0]
+        backend.record_failure(httpx.ConnectError("connection refused"))
+        backend.breaker.half_open()
+        entered = asyncio.Event()
+
+        async def trial():
+            async with pool.acquire():
+                entered.set()
+                await asyncio.Event().wait()
+
+        task = asyncio.create_task(trial())
+        await entered.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert backend.breaker.state == HALF_OPEN
+        assert pool.has_available()
+
+
+class TestRetryBudget:
+    """Test cases for the global retry budget and backoff."""
+
+    def test_budget_is_spent_and_earned_back_by_requests(self):
+        """Test that retries are limited to a share of the traffic."""
+        budget = RetryBudget(ratio=0.5, min_per_second=0, max_tokens=1)
+
+        assert budget.try_spend()
+        assert not budget.try_spend()
+
+        budget.record_request()
+        budget.record_request()
+        assert budget.try_spend()
+
+    def test_backoff_is_jittered_and_capped(self):
+        """Test that delays stay within the exponential envelope."""
+        delays = [backoff_delay(5, base=0.25, cap=2) for _ in range(50)]
+
+        assert all(0 <= delay <= 2 for delay in delays)
+        assert len(set(delays)) > 1
+
+
+class TestAgentRetries:
+    """Test cases for retrying Ollama calls through the budget."""
+
+    @pytest.fixture(autouse=True)
+    def clear_stats(self):
+        RETRY_STATS.clear()
+        yield
+        RETRY_STATS.clear()
+
+    @pytest.mark.asyncio
+    async def test_overloaded_backend_is_retried_elsewhere(
+        self, backend_pool_factory, ollama_stream_pool
+    ):
+        """Test that a 503 is retried on another backend."""
+
+        def overloaded(request):
+            return httpx.Response(503)
+
+        pool = backend_pool_factory(overloaded)
+        pool.backends.append(ollama_stream_pool('{"ok": true}').backends[0])
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = pool
+
+        result = await agent.generate_response("prompt")
+
+        assert result == {"ok": True}
+        assert RETRY_STATS["retries"] == 1
+
+    @pytest.mark.asyncio
+    async def test_exhausted_budget_falls_back(
+        self, backend_pool_factory, retry_budget
+    ):
+        """Test that no retry is made once the budget is spent."""
+
+        def overloaded(request):
+            return httpx.Response(503)
+
+        retry_budget.max_tokens = 0
+        retry_budget._tokens = 0
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = backend_pool_factory(overloaded, overloaded)
+
+        result = await agent.generate_response("prompt")
+
+        assert "error" in result
+        assert RETRY_STATS["budget_exhausted"] == 1
+        assert sum(b.total_requests for b in agent.pool.backends) == 1
+
+    @pytest.mark.asyncio
+    async def test_open_circuits_fail_fast(self, backend_pool_factory):
+        """Test that requests are refused without calling Ollama."""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(200)
+
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = backend_pool_factory(handler, failure_threshold=1)
+        agent.pool.backends[0].record_failure()
+
+        result = await agent.generate_response("prompt")
+
+        assert result == agent._get_fallback_response()
+        assert RETRY_STATS["fast_failures"] == 1
+        assert calls == []
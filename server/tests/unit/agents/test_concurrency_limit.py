@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from agrotech_ai.concurrency_limit import AdaptiveLimiter
+from agrotech_ai.scheduling import DeadlineExceeded, RequestContext
+
+
+class TestAdaptiveLimiter:
+    """Test cases for the AIMD concurrency limit."""
+
+    @pytest.mark.asyncio
+    async def test_requests_over_the_limit_are_queued(self):
+        """Test that excess requests wait in FIFO order for a slot."""
+        limiter = AdaptiveLimiter("backend", initial=1)
+        await limiter.acquire()
+
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.queued == 1
+        assert not waiter.done()
+
+        limiter.release()
+        await waiter
+
+        assert limiter.in_flight == 1
+        assert limiter.queued == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_leaves_queue(self):
+        """Test that a cancelled request does not hold a queue position."""
+        limiter = AdaptiveLimiter("backend", initial=1)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        assert limiter.queued == 0
+
+    @pytest.mark.asyncio
+    async def test_slot_granted_as_deadline_fires_is_released(self, monkeypatch):
+        """Test that a slot granted in the tick the deadline fires is not leaked."""
+        limiter = AdaptiveLimiter("backend", initial=1)
+        await limiter.acquire()
+
+        async def granted_then_timed_out(future, timeout):
+            limiter.release()
+            assert future.done()
+            raise asyncio.TimeoutError
+
+        monkeypatch.setattr(asyncio, "wait_for", granted_then_timed_out)
+        with pytest.raises(DeadlineExceeded):
+            await limiter.acquire(RequestContext(deadline=time.monotonic() + 1))
+
+        assert limiter.in_flight == 0
+        assert limiter.queued == 0
+
+    @pytest.mark.asyncio
+    async def test_fast_samples_grow_a_saturated_limit(self):
+        """Test additive increase while the limit is fully used."""
+        limiter = AdaptiveLimiter("backend", initial=2, maximum=4)
+        await limiter.acquire()
+        await limiter.acquire()
+
+        for _ in range(4):
+            limiter.record_latency(0.1)
+
+        assert limiter.slots == 3
+
+    def test_fast_samples_do_not_grow_an_idle_limit(self):
+        """Test that unused headroom is not added to."""
+        limiter = AdaptiveLimiter("backend", initial=2)
+
+        limiter.record_latency(0.1)
+
+        assert limiter.limit == 2
+
+    def test_slow_first_token_and_drops_shrink_limit(self):
+        """Test multiplicative decrease down to the minimum."""
+        limiter = AdaptiveLimiter("backend", initial=8, minimum=1, backoff=0.5)
+        limiter.record_latency(0.1)
+
+        limiter.record_latency(1.0)
+        assert limiter.slots == 4
+
+        for _ in range(5):
+            limiter.record_drop()
+        assert limiter.limit == 1
+
+    @pytest.mark.asyncio
+    async def test_pool_exposes_queue_depth(self, backend_pool_factory):
+        """Test that per-model limits and queue depth reach the snapshot."""
+
+        def handler(request):
+            return httpx.Response(200, json={"models": []})
+
+        pool = backend_pool_factory(handler)
+        backend = pool.backends[0]
+        backend.limiter("gemma3:270m").limit = 1
+
+        async with pool.acquire("gemma3:270m"):
+            waiter = asyncio.create_task(pool.acquire("gemma3:270m").__aenter__())
+            await asyncio.sleep(0)
+            snapshot = pool.snapshot()[0]
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+
+        assert snapshot["queued"] == 1
+        assert backend.in_flight == 0
+        assert snapshot["concurrency"]["gemma3:270m"]["limit"] == 1
@@ -0,0 +1,105 @@
+import asyncio
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from agrotech_ai.circuit_breaker import HALF_OPEN, OPEN
+from agrotech_ai.health import HealthMonitor
+
+
+def healthy_handler(request):
+    """Backend answering /api/tags and /api/ps with a loaded model."""
+    if request.url.path == "/api/ps":
+        return httpx.Response(200, json={"models": [{"name": "gemma3:270m"}]})
+    return httpx.Response(200, json={"models": []})
+
+
+def down_handler(request):
+    """Backend that refuses connections."""
+    raise httpx.ConnectError("connection refused", request=request)
+
+
+class TestHealthMonitor:
+    """Test cases for the cached background health probing."""
+
+    @pytest.fixture
+    def pool(self, backend_pool_factory):
+        pool = backend_pool_factory(healthy_handler, down_handler)
+        with patch("agrotech_ai.health.get_backend_pool", return_value=pool):
+            yield pool
+
+    @pytest.mark.asyncio
+    async def test_probe_records_status_latency_and_models(self, pool):
+        """Test that each backend's status is cached after a probe."""
+        monitor = HealthMonitor()
+
+        await monitor.probe_all()
+
+        up, down = monitor.backends
+        assert up["healthy"] is True
+        assert up["latency_ms"] is not None
+        assert up["loaded_models"] == ["gemma3:270m"]
+        assert down["healthy"] is False
+        assert "refused" in down["error"]
+        assert down["last_seen"] is None
+        assert monitor.is_ready()
+
+    @pytest.mark.asyncio
+    async def test_probe_half_opens_only_unreachable_backends(
+        self, backend_pool_factory
+    ):
+        """Test that answering /api/tags ends only an outage a probe can see."""
+        pool = backend_pool_factory(
+            healthy_handler, healthy_handler, failure_threshold=1
+        )
+        refused, erroring = pool.backends
+        refused.record_failure(httpx.ConnectError("connection refused"))
+        erroring.record_failure(httpx.ReadTimeout("timed out"))
+
+        with patch("agrotech_ai.health.get_backend_pool", return_value=pool):
+            await HealthMonitor().probe_all()
+
+        assert refused.breaker.state == HALF_OPEN
+        assert erroring.breaker.state == OPEN
+
+    @pytest.mark.asyncio
+    async def test_not_ready_when_all_backends_down(self, backend_pool_factory):
+        """Test that readiness needs at least one healthy backend."""
+        monitor = HealthMonitor()
+        pool = backend_pool_factory(down_handler)
+
+        with patch("agrotech_ai.health.get_backend_pool", return_value=pool):
+            assert await monitor.ollama_available() is False
+
+    @pytest.mark.asyncio
+    async def test_stale_status_is_not_ready(self, pool):
+        """Test that an old probe result is not trusted."""
+        monitor = HealthMonitor(stale_seconds=0)
+        await monitor.probe_all()
+        monitor.checked_at -= 1
+
+        assert not monitor.is_ready()
+
+    @pytest.mark.asyncio
+    async def test_available_uses_cache_when_fresh(self, pool):
+        """Test that admission checks only probe when nothing is cached."""
+        monitor = HealthMonitor()
+
+        with patch.object(monitor, "probe_all", wraps=monitor.probe_all) as probe:
+            assert await monitor.ollama_available() is True
+            assert await monitor.ollama_available() is True
+
+        assert probe.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_loop_probes_until_stopped(self, pool):
+        """Test that the background loop refreshes the cached status."""
+        monitor = HealthMonitor(interval=0.01)
+
+        monitor.start()
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+
+        assert monitor.checked_at is not None
+        assert monitor._task is None
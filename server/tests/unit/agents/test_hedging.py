@@ -0,0 +1,167 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from agrotech_ai.hedging import HEDGE_STATS, LatencyTracker
+from agrotech_ai.ollama_client import OllamaAgent
+from agrotech_ai.retry import RetryBudget
+
+
+def reply(backend: str) -> bytes:
+    """A complete streamed Ollama reply naming the backend."""
+    chunks = [
+        {"response": json.dumps({"backend": backend}), "done": False},
+        {"response": "", "done": True},
+    ]
+    return "\n".join(json.dumps(chunk) for chunk in chunks).encode()
+
+
+@pytest.fixture
+def hedging(monkeypatch):
+    """Enable hedging with a 50 ms threshold and a fresh budget."""
+    tracker = LatencyTracker(min_samples=1)
+    tracker.record(0.05)
+    budget = RetryBudget(ratio=0.0, min_per_second=0.0, max_tokens=1.0)
+    monkeypatch.setattr("agrotech_ai.ollama_client.HEDGE_REQUESTS", True)
+    monkeypatch.setattr("agrotech_ai.ollama_client.HEDGE_BUDGET", budget)
+    monkeypatch.setattr("agrotech_ai.ollama_client.latency_tracker", lambda _: tracker)
+    HEDGE_STATS.clear()
+    return budget
+
+
+def slow_backend(delay: float, closed: list):
+    """Handler whose reply starts only after the delay."""
+
+    async def body():
+        try:
+            await asyncio.sleep(delay)
+            yield reply("slow")
+        finally:
+            closed.append(True)
+
+    def handler(request):
+        if request.url.path != "/api/generate":
+            return httpx.Response(200, json={"models": []})
+        return httpx.Response(200, content=body())
+
+    return handler
+
+
+def fast_backend(request):
+    """Handler that replies at once."""
+    if request.url.path != "/api/generate":
+        return httpx.Response(200, json={"models": []})
+    return httpx.Response(200, content=reply("fast"))
+
+
+class TestLatencyTracker:
+    """Test cases for the per-agent latency window."""
+
+    def test_no_percentile_before_enough_samples(self):
+        """Test that hedging waits for a trustworthy percentile."""
+        tracker = LatencyTracker(min_samples=3)
+        tracker.record(1.0)
+        tracker.record(2.0)
+
+        assert tracker.percentile(95) is None
+
+    def test_nearest_rank_percentile(self):
+        """Test the percentile over the sliding window."""
+        tracker = LatencyTracker(window=100, min_samples=1)
+        for sample in range(1, 101):
+            tracker.record(float(sample))
+
+        assert tracker.percentile(95) == 95.0
+        assert tracker.percentile(50) == 50.0
+
+    def test_window_keeps_recent_samples(self):
+        """Test that old samples fall out of the window."""
+        tracker = LatencyTracker(window=2, min_samples=1)
+        for sample in (10.0, 1.0, 2.0):
+            tracker.record(sample)
+
+        assert tracker.percentile(100) == 2.0
+
+
+class TestHedgedRequests:
+    """Test cases for hedging slow text-agent calls."""
+
+    @pytest.mark.asyncio
+    async def test_slow_call_is_hedged_and_loser_cancelled(
+        self, hedging, backend_pool_factory
+    ):
+        """Test that a duplicate on another backend wins over a slow call."""
+        closed = []
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = backend_pool_factory(slow_backend(10, closed), fast_backend)
+
+        result = await agent.generate_response("test prompt")
+        await asyncio.sleep(0)
+
+        assert result == {"backend": "fast"}
+        assert HEDGE_STATS["hedges"] == 1
+        assert HEDGE_STATS["hedge_wins"] == 1
+        assert closed == [True]
+        assert all(backend.in_flight == 0 for backend in agent.pool.backends)
+
+    @pytest.mark.asyncio
+    async def test_fast_call_is_not_hedged(self, hedging, backend_pool_factory):
+        """Test that a call within the threshold sends no duplicate."""
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = backend_pool_factory(fast_backend, fast_backend)
+
+        result = await agent.generate_response("test prompt")
+
+        assert result == {"backend": "fast"}
+        assert HEDGE_STATS["hedges"] == 0
+
+    @pytest.mark.asyncio
+    async def test_exhausted_budget_stops_hedging(self, hedging, backend_pool_factory):
+        """Test that hedges are capped by the budget."""
+        hedging.try_spend()
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = backend_pool_factory(slow_backend(0.1, []), fast_backend)
+
+        result = await agent.generate_response("test prompt")
+
+        assert result == {"backend": "slow"}
+        assert HEDGE_STATS["hedges"] == 0
+        assert HEDGE_STATS["budget_exhausted"] == 1
+
+    @pytest.mark.asyncio
+    async def test_no_hedge_without_a_second_backend(
+        self, hedging, backend_pool_factory
+    ):
+        """Test that a single backend is never sent a duplicate."""
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = backend_pool_factory(slow_backend(0.1, []))
+
+        result = await agent.generate_response("test prompt")
+
+        assert result == {"backend": "slow"}
+        assert HEDGE_STATS["hedges"] == 0
+
+    @pytest.mark.asyncio
+    async def test_failed_call_falls_back_to_the_hedge(
+        self, hedging, backend_pool_factory
+    ):
+        """Test that the hedge's result is used when the first call fails."""
+
+        async def failing_body():
+            await asyncio.sleep(0.1)
+            yield (json.dumps({"error": "model crashed"}) + "\n").encode()
+
+        def failing_backend(request):
+            if request.url.path != "/api/generate":
+                return httpx.Response(200, json={"models": []})
+            return httpx.Response(200, content=failing_body())
+
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = backend_pool_factory(failing_backend, slow_backend(0.2, []))
+
+        result = await agent.generate_response("test prompt")
+
+        assert result == {"backend": "slow"}
+        assert HEDGE_STATS["hedge_wins"] == 1
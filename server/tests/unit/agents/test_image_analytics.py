@@ -0,0 +1,97 @@
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from agrotech_ai.agents import AgriVisionAgent
+from agrotech_ai.image_analytics import analytics_summary, compute_analytics
+
+LEAF = (60, 150, 50)
+SOIL = (110, 80, 50)
+LESION = (110, 70, 40)
+CHLOROSIS = (200, 190, 60)
+
+
+def field(background, size=150):
+    """Square image of one colour, as an array to paint on."""
+    pixels = np.zeros((size, size, 3), np.uint8)
+    pixels[:] = background
+    return pixels
+
+
+class TestImageAnalytics:
+    """Test cases for the vegetation and lesion measurements."""
+
+    def test_healthy_canopy(self):
+        """Test that a fully green photo is all canopy without damage."""
+        analytics = compute_analytics(Image.fromarray(field(LEAF)))
+
+        assert analytics["canopy_coverage"] == 1.0
+        assert analytics["lesion_fraction"] == 0.0
+        assert analytics["discoloured_fraction"] == 0.0
+        assert analytics["vari"] > 0
+        assert analytics["exg"] > 0
+        assert analytics["gli"] > 0
+
+    def test_spots_inside_leaves_are_measured(self):
+        """Test that brown and yellow patches on foliage are counted."""
+        pixels = field(LEAF)
+        pixels[10:20, 10:20] = LESION
+        pixels[60:70, 60:70] = CHLOROSIS
+
+        analytics = compute_analytics(Image.fromarray(pixels))
+
+        assert analytics["lesion_fraction"] == pytest.approx(100 / 22500, abs=1e-3)
+        assert analytics["discoloured_fraction"] == pytest.approx(100 / 22500, abs=1e-3)
+        assert analytics["tiles"][0][0]["lesion_fraction"] > 0
+        assert analytics["tiles"][2][2]["lesion_fraction"] == 0
+
+    def test_soil_around_a_plant_is_not_a_lesion(self):
+        """Test that bare soil outside the foliage is not counted as damage."""
+        pixels = field(SOIL)
+        pixels[50:100, 50:100] = LEAF
+
+        analytics = compute_analytics(Image.fromarray(pixels))
+
+        assert analytics["canopy_coverage"] == pytest.approx(2500 / 22500, abs=1e-3)
+        assert analytics["lesion_fraction"] == 0.0
+        assert analytics["tiles"][1][1]["canopy_coverage"] == 1.0
+        assert analytics["tiles"][0][0]["canopy_coverage"] == 0.0
+
+    def test_summary_names_the_most_affected_tile(self):
+        """Test the compact line given to the agent prompt."""
+        pixels = field(LEAF)
+        pixels[120:135, 120:135] = LESION
+
+        summary = analytics_summary(compute_analytics(Image.fromarray(pixels)))
+
+        assert "cobertura vegetal" in summary
+        assert "fila 3, columna 3" in summary
+
+
+class TestAgriVisionAnalytics:
+    """Test cases for giving the measurements to AgriVision."""
+
+    @pytest.mark.asyncio
+    async def test_measurements_are_in_the_prompt(self):
+        """Test that measured figures reach the model as facts."""
+        agent = AgriVisionAgent()
+        analytics = compute_analytics(Image.fromarray(field(LEAF)))
+
+        with patch.object(agent, "generate_response", return_value={}) as generate:
+            await agent.analyze_image("Hojas verdes", image_analytics=analytics)
+
+        prompt = generate.call_args.args[0]
+        assert "MEDIDAS DE LA IMAGEN" in prompt
+        assert "cobertura vegetal 100%" in prompt
+
+    @pytest.mark.asyncio
+    async def test_prompt_without_measurements(self):
+        """Test that scenario analyses keep the plain prompt."""
+        agent = AgriVisionAgent()
+
+        with patch.object(agent, "generate_response", return_value={}) as generate:
+            await agent.analyze_image("Hojas verdes")
+
+        assert "MEDIDAS" not in generate.call_args.args[0]
@@ -0,0 +1,136 @@
+import asyncio
+import base64
+import io
+import time
+
+import pytest
+from PIL import Image
+
+from agrotech_ai.agents import ImageVisionAgent
+from agrotech_ai.image_pool import IMAGE_POOL_STATS, ImagePool, ImagePoolFull
+from agrotech_ai.image_processing import preprocess_image
+
+
+def encoded_photo(size=(2048, 1536)):
+    """Base64 JPEG of a large, detailed photo."""
+    image = Image.effect_noise(size, 60).convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG")
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+class TestImagePool:
+    """Test cases for the bounded image worker pool."""
+
+    @pytest.mark.asyncio
+    async def test_job_runs_in_a_worker_process(self):
+        """Test that preprocessing runs in a spawned worker."""
+        IMAGE_POOL_STATS.clear()
+        pool = ImagePool(workers=1, limit=2, timeout=60)
+        try:
+            result = await pool.run(preprocess_image, encoded_photo(), False, False)
+        finally:
+            pool.close()
+
+        with Image.open(io.BytesIO(base64.b64decode(result["image"]))) as image:
+            assert max(image.size) == 1024
+        assert pool.pending == 0
+        assert pool.snapshot()["jobs"] == 1
+        assert pool.snapshot()["avg_run_ms"] > 0
+
+    @pytest.mark.asyncio
+    async def test_full_queue_refuses_jobs(self):
+        """Test that uploads beyond the limit are pushed back at once."""
+        IMAGE_POOL_STATS.clear()
+        pool = ImagePool(workers=0, limit=1)
+        first = asyncio.create_task(pool.run(time.sleep, 0.1))
+        await asyncio.sleep(0)
+
+        with pytest.raises(ImagePoolFull):
+            await pool.run(time.sleep, 0)
+        await first
+
+        assert IMAGE_POOL_STATS["rejected"] == 1
+        assert pool.pending == 0
+        await pool.run(time.sleep, 0)
+
+    @pytest.mark.asyncio
+    async def test_slow_job_is_abandoned(self):
+        """Test that a job past its timeout holds its queue slot until the
+        worker is done with it."""
+        IMAGE_POOL_STATS.clear()
+        pool = ImagePool(workers=0, limit=1, timeout=0.01)
+
+        with pytest.raises(TimeoutError):
+            await pool.run(time.sleep, 0.2)
+
+        assert IMAGE_POOL_STATS["timeouts"] == 1
+        assert pool.pending == 1
+        with pytest.raises(ImagePoolFull):
+            await pool.run(time.sleep, 0)
+
+        await asyncio.sleep(0.3)
+        assert pool.pending == 0
+        pool.close()
+
+    @pytest.mark.asyncio
+    async def test_cancelled_job_holds_slot_while_running(self):
+        """Test that a cancelled caller does not free a busy worker's slot."""
+        pool = ImagePool(workers=0, limit=2, timeout=60)
+        task = asyncio.create_task(pool.run(time.sleep, 0.2))
+        await asyncio.sleep(0.05)
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert pool.pending == 1
+        await asyncio.sleep(0.3)
+        assert pool.pending == 0
+        pool.close()
+
+    @pytest.mark.asyncio
+    async def test_event_loop_stays_free_during_a_job(self):
+        """Test that other coroutines run while an image is processed."""
+        pool = ImagePool(workers=0)
+        ticks = []
+
+        async def tick():
+            for _ in range(5):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(pool.run(time.sleep, 0.1), tick())
+
+        assert len(ticks) == 5
+        assert ticks[-1] - ticks[0] < 0.1
+
+
+class TestImageVisionPool:
+    """Test cases for ImageVision's use of the image pool."""
+
+    @pytest.mark.asyncio
+    async def test_full_queue_fails_the_analysis(self, image_pool):
+        """Test that a refused upload is reported instead of queued."""
+        image_pool.limit = 0
+        agent = ImageVisionAgent()
+
+        with pytest.raises(ImagePoolFull):
+            await agent.analyze_image(encoded_photo((64, 64)), use_cache=False)
+
+    @pytest.mark.asyncio
+    async def test_binary_upload_reaches_the_worker_as_bytes(self, image_pool):
+        """Test that a binary upload is not base64-encoded before the pool."""
+        agent = ImageVisionAgent()
+        upload = bytearray(base64.b64decode(encoded_photo((64, 64))))
+        sent = []
+        run = image_pool.run
+
+        async def spy(func, *args):
+            sent.append(args[0])
+            return await run(func, *args)
+
+        image_pool.run = spy
+        await agent.analyze_image(upload, use_cache=False)
+
+        assert sent == [upload]
@@ -0,0 +1,133 @@
+import base64
+import io
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from agrotech_ai.agents import ImageVisionAgent
+from agrotech_ai.image_prefilter import (
+    PREFILTER_STATS,
+    compute_signals,
+    rejection_reason,
+)
+
+
+def textured(base, size=(200, 150), spread=60, seed=0):
+    """Photo-like image: a base colour with per-pixel brightness noise."""
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(-spread, spread, size=(size[1], size[0], 1))
+    pixels = np.clip(np.array(base) + noise, 0, 255).astype(np.uint8)
+    return Image.fromarray(pixels, "RGB")
+
+
+def encode(image):
+    """Base64 JPEG of an image."""
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG")
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+class TestImageSignals:
+    """Test cases for the pixel statistics of the prefilter."""
+
+    def test_leafy_photo_is_vegetation(self):
+        """Test that a green, detailed photo passes every check."""
+        signals = compute_signals(textured((60, 160, 50)))
+
+        assert signals.vegetation_fraction > 0.9
+        assert signals.vari > 0
+        assert signals.flags == []
+        assert rejection_reason(signals) is None
+
+    def test_grey_photo_has_no_vegetation(self):
+        """Test that a photo without green is flagged but not rejected."""
+        signals = compute_signals(textured((120, 120, 120)))
+
+        assert signals.vegetation_fraction < 0.01
+        assert signals.flags == ["no_vegetation"]
+        assert rejection_reason(signals) is None
+
+    def test_flat_photo_is_blurry(self):
+        """Test that a photo without detail is rejected as blurry."""
+        signals = compute_signals(Image.new("RGB", (200, 150), color=(60, 160, 50)))
+
+        assert signals.sharpness == 0
+        assert "blurry" in signals.flags
+        assert "borrosa" in rejection_reason(signals)
+
+    def test_dark_photo_is_underexposed(self):
+        """Test that a nearly black photo is rejected."""
+        signals = compute_signals(textured((3, 3, 3), spread=3))
+
+        assert "underexposed" in signals.flags
+        assert rejection_reason(signals) is not None
+
+    def test_tiny_image_skips_sharpness(self):
+        """Test that sharpness is not judged on a handful of pixels."""
+        signals = compute_signals(Image.new("RGB", (4, 4), color="green"))
+
+        assert signals.sharpness is None
+        assert "blurry" not in signals.flags
+
+    def test_large_image_is_measured_on_a_thumbnail(self):
+        """Test that the original image is left as it was."""
+        image = textured((60, 160, 50), size=(2048, 1536))
+
+        signals = compute_signals(image)
+
+        assert image.size == (2048, 1536)
+        assert signals.flags == []
+
+
+class TestImageVisionPrefilter:
+    """Test cases for screening uploads in ImageVision."""
+
+    @pytest.mark.asyncio
+    async def test_unusable_photo_never_reaches_the_model(self):
+        """Test that a rejected photo returns at once without a model call."""
+        PREFILTER_STATS.clear()
+        agent = ImageVisionAgent()
+        blurry = encode(Image.new("RGB", (200, 150), color=(60, 160, 50)))
+
+        with patch.object(agent, "_generate_json") as generate:
+            result = await agent.analyze_image(blurry, use_cache=False)
+
+        generate.assert_not_called()
+        assert result["image_usable"] is False
+        assert "borrosa" in result["reason"]
+        assert "blurry" in result["prefilter"]["flags"]
+        assert PREFILTER_STATS["rejected"] == 1
+
+    @pytest.mark.asyncio
+    async def test_usable_photo_carries_its_signals(self):
+        """Test that the model's answer is returned with the signals."""
+        agent = ImageVisionAgent()
+        photo = encode(textured((60, 160, 50)))
+
+        with patch.object(
+            agent, "_generate_json", return_value={"image_description": "Hojas"}
+        ) as generate:
+            result = await agent.analyze_image(photo, use_cache=False)
+
+        generate.assert_called_once()
+        assert result["image_description"] == "Hojas"
+        assert result["prefilter"]["vegetation_fraction"] > 0.9
+
+    @pytest.mark.asyncio
+    async def test_disabled_prefilter_sends_every_photo(self):
+        """Test that the prefilter can be turned off."""
+        agent = ImageVisionAgent()
+        blurry = encode(Image.new("RGB", (200, 150), color=(60, 160, 50)))
+
+        with (
+            patch("agrotech_ai.agents.PREFILTER_ENABLED", False),
+            patch.object(
+                agent, "_generate_json", return_value={"image_description": "Hojas"}
+            ),
+        ):
+            result = await agent.analyze_image(blurry, use_cache=False)
+
+        assert result["image_description"] == "Hojas"
+        assert "prefilter" not in result
@@ -0,0 +1,90 @@
+import base64
+import io
+
+from PIL import Image
+
+from agrotech_ai.image_processing import (
+    draft_for_size,
+    optimize_image,
+    preprocess_image,
+    target_image_size,
+)
+
+
+def encoded(size, image_format="JPEG", mode="RGB"):
+    """Base64 upload of a noisy image."""
+    image = Image.effect_noise(size, 60).convert(mode)
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format)
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def opened(image_base64):
+    """Lazily opened image of a base64 upload."""
+    return Image.open(io.BytesIO(base64.b64decode(image_base64)))
+
+
+class TestTargetSize:
+    """Test cases for the per-model image resolution."""
+
+    def test_known_model_family(self):
+        """Test that a model gets its encoder's resolution."""
+        assert target_image_size("gemma3:4b") == 896
+        assert target_image_size("llama3.2-vision:11b") == 1120
+        assert target_image_size("library/llava:13b") == 672
+
+    def test_unknown_model_uses_the_default(self):
+        """Test that other models get the configured default."""
+        assert target_image_size("some-vlm:latest") == 1024
+
+
+class TestFastDownscale:
+    """Test cases for decoding large JPEGs near the target size."""
+
+    def test_jpeg_is_decoded_at_a_reduced_scale(self):
+        """Test that the decoder does most of the downscaling."""
+        image = opened(encoded((4000, 3000)))
+
+        draft_for_size(image, 1024)
+
+        assert image.size == (2000, 1500)
+
+    def test_png_is_not_drafted(self):
+        """Test that formats without DCT scaling decode at full size."""
+        image = opened(encoded((2048, 1536), "PNG"))
+
+        draft_for_size(image, 1024)
+
+        assert image.size == (2048, 1536)
+
+    def test_large_jpeg_is_resized_to_the_target(self):
+        """Test that the fast path still ends at the requested size."""
+        result = optimize_image(encoded((4000, 3000)), max_size=896)
+
+        assert opened(result).size == (896, 672)
+
+    def test_small_rgb_jpeg_is_sent_as_is(self):
+        """Test that an upload already fit for the model is not re-encoded."""
+        upload = encoded((800, 600))
+
+        assert optimize_image(upload, max_size=1024) == upload
+        assert preprocess_image(upload, False, False, 1024)["image"] == upload
+
+    def test_small_png_is_still_converted(self):
+        """Test that other formats are re-encoded as JPEG."""
+        upload = encoded((800, 600), "PNG")
+
+        result = preprocess_image(upload, False, False, 1024)["image"]
+
+        assert opened(result).format == "JPEG"
+
+    def test_raw_upload_is_encoded_once_for_the_model(self):
+        """Test that binary uploads are processed as bytes."""
+        upload = encoded((2048, 1536))
+        raw = base64.b64decode(upload)
+
+        small = preprocess_image(raw[:], False, False, 4096)["image"]
+        resized = preprocess_image(bytearray(raw), False, False, 1024)["image"]
+
+        assert small == upload
+        assert opened(resized).size == (1024, 768)
@@ -0,0 +1,95 @@
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+from agrotech_ai.agents import ImageVisionAgent
+from agrotech_ai.image_store import IMAGE_STORE_STATS, ImageStore, content_id
+
+
+class TestImageStore:
+    """Test cases for the bounded store of analysed photos."""
+
+    def test_content_id_ignores_the_transport(self, sample_base64_image):
+        """Test that base64 and binary uploads of a photo share an id."""
+        raw = base64.b64decode(sample_base64_image)
+
+        assert content_id(sample_base64_image) == content_id(bytearray(raw))
+        assert content_id(sample_base64_image) != content_id(raw + b"\0")
+
+    def test_least_recently_used_photo_is_evicted(self):
+        """Test that the count bound keeps the photos in use."""
+        IMAGE_STORE_STATS.clear()
+        store = ImageStore(max_entries=2)
+        store.put("a", "aaaa", {})
+        store.put("b", "bbbb", {})
+        store.get("a")
+
+        store.put("c", "cccc", {})
+
+        assert store.get("b") is None
+        assert store.get("a") is not None
+        assert IMAGE_STORE_STATS["evictions"] == 1
+
+    def test_size_bound_counts_image_bytes(self):
+        """Test that large photos push older ones out."""
+        store = ImageStore(max_bytes=10)
+        store.put("a", "a" * 6, {})
+        store.put("b", "b" * 6, {})
+
+        assert store.get("a") is None
+        assert store.snapshot()["bytes"] == 6
+
+    def test_expired_photo_is_a_miss(self):
+        """Test that photos older than the TTL are not served."""
+        store = ImageStore(ttl_seconds=0)
+        store.put("a", "aaaa", {})
+
+        assert store.get("a") is None
+        assert store.snapshot()["entries"] == 0
+
+    @pytest.mark.asyncio
+    async def test_analysis_is_stored_with_the_model_image(
+        self, ollama_stream_pool, image_store, sample_base64_image
+    ):
+        """Test that ImageVision keeps its result under the image id."""
+        agent = ImageVisionAgent()
+        agent.pool = ollama_stream_pool('{"image_description": "Tomates"}')
+
+        result = await agent.analyze_image(sample_base64_image, image_id="photo")
+
+        stored = image_store.get("photo")
+        assert stored.result == result
+        assert stored.image == agent.pool.sent[0]["images"][0]
+
+    @pytest.mark.asyncio
+    async def test_failed_analysis_is_not_stored(
+        self, ollama_stream_pool, image_store, sample_base64_image
+    ):
+        """Test that fallbacks are not reused for later analyses."""
+        agent = ImageVisionAgent()
+        agent.pool = ollama_stream_pool("no json at all")
+
+        await agent.analyze_image(sample_base64_image, image_id="photo")
+
+        assert image_store.get("photo") is None
+
+    @pytest.mark.asyncio
+    async def test_cache_hit_stores_the_optimized_image(
+        self, ollama_stream_pool, image_store
+    ):
+        """Test that a photo answered from the cache is stored downscaled."""
+        buffer = io.BytesIO()
+        Image.effect_noise((2048, 1536), 60).convert("RGB").save(buffer, "JPEG")
+        upload = buffer.getvalue()
+        agent = ImageVisionAgent()
+        agent.pool = ollama_stream_pool('{"image_description": "Tomates"}')
+        await agent.analyze_image(upload)
+
+        result = await agent.analyze_image(upload, image_id=content_id(upload))
+
+        stored = image_store.get(content_id(upload))
+        assert len(agent.pool.sent) == 1
+        assert stored.result == result
+        assert stored.image == agent.pool.sent[0]["images"][0]
@@ -1,6 +1,6 @@
 import base64
 import io
-from unittest.mock import Mock, patch
+from unittest.mock import patch
 
 import pytest
 from PIL import Image
@@ -51,7 +51,9 @@ class TestImageVisionAgent:
         assert result == invalid_base64
 
     @pytest.mark.asyncio
-    async def test_analyze_image_success(self, agent, sample_base64_image):
+    async def test_analyze_image_success(
+        self, agent, sample_base64_image, ollama_stream_pool
+    ):
         """Test successful image analysis."""
         mock_response = {
             "response": """{
@@ -64,10 +66,7 @@ class TestImageVisionAgent:
             }"""
         }
 
-        with patch.object(agent.session, "post") as mock_post:
-            mock_post.return_value = Mock()
-            mock_post.return_value.status_code = 200
-            mock_post.return_value.json.return_value = mock_response
+        with patch.object(agent, "pool", ollama_stream_pool(mock_response["response"])):
 
             result = await agent.analyze_image(sample_base64_image)
 
@@ -76,7 +75,9 @@ class TestImageVisionAgent:
             assert result["confidence"] == 0.9
 
     @pytest.mark.asyncio
-    async def test_analyze_image_non_agricultural(self, agent, sample_base64_image):
+    async def test_analyze_image_non_agricultural(
+        self, agent, sample_base64_image, ollama_stream_pool
+    ):
         """Test image analysis with non-agricultural image."""
         mock_response = {
             "response": """{
@@ -91,10 +92,7 @@ class TestImageVisionAgent:
             }"""
         }
 
-        with patch.object(agent.session, "post") as mock_post:
-            mock_post.return_value = Mock()
-            mock_post.return_value.status_code = 200
-            mock_post.return_value.json.return_value = mock_response
+        with patch.object(agent, "pool", ollama_stream_pool(mock_response["response"])):
 
             result = await agent.analyze_image(sample_base64_image)
 
@@ -104,8 +102,8 @@ class TestImageVisionAgent:
     @pytest.mark.asyncio
     async def test_analyze_image_timeout(self, agent, sample_base64_image):
         """Test image analysis with timeout."""
-        with patch.object(agent.session, "post") as mock_post:
-            mock_post.side_effect = Exception("timeout")
+        with patch.object(agent.pool.backends[0].session, "stream") as mock_stream:
+            mock_stream.side_effect = Exception("timeout")
 
             result = await agent.analyze_image(sample_base64_image)
 
@@ -114,14 +112,13 @@ class TestImageVisionAgent:
             assert result["confidence"] == 0.0
 
     @pytest.mark.asyncio
-    async def test_analyze_image_invalid_response(self, agent, sample_base64_image):
+    async def test_analyze_image_invalid_response(
+        self, agent, sample_base64_image, ollama_stream_pool
+    ):
         """Test image analysis with invalid JSON response."""
         mock_response = {"response": "Invalid JSON response"}
 
-        with patch.object(agent.session, "post") as mock_post:
-            mock_post.return_value = Mock()
-            mock_post.return_value.status_code = 200
-            mock_post.return_value.json.return_value = mock_response
+        with patch.object(agent, "pool", ollama_stream_pool(mock_response["response"])):
 
             result = await agent.analyze_image(sample_base64_image)
 
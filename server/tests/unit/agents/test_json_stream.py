@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from agrotech_ai.json_stream import IncrementalJSONParser
+
+
+class TestIncrementalJSONParser:
+    """Test cases for the streamed JSON object detector."""
+
+    def test_detects_object_split_across_tokens(self):
+        """Test that completion is reported on the closing brace token."""
+        parser = IncrementalJSONParser()
+
+        assert parser.feed('{"crop') is False
+        assert parser.feed('_health": "healthy", ') is False
+        assert parser.feed('"alerts": []}') is True
+        assert parser.parse() == {"crop_health": "healthy", "alerts": []}
+
+    def test_ignores_preamble_and_trailing_text(self):
+        """Test that text around the object is not part of the result."""
+        parser = IncrementalJSONParser()
+
+        parser.feed("Aquí está el JSON: ")
+        parser.feed('{"ok": true} y una explicación')
+
+        assert parser.complete
+        assert parser.text == '{"ok": true}'
+        assert parser.feed("más texto") is True
+
+    def test_braces_inside_strings_do_not_close_object(self):
+        """Test that braces and escaped quotes inside strings are skipped."""
+        parser = IncrementalJSONParser()
+
+        parser.feed('{"note": "usa \\"{}\\" y }", ')
+        assert not parser.complete
+
+        parser.feed('"nested": {"a": [1, 2]}}')
+        assert parser.complete
+        assert parser.parse()["nested"] == {"a": [1, 2]}
+
+    def test_not_started_without_brace(self):
+        """Test that plain text never starts an object."""
+        parser = IncrementalJSONParser()
+
+        parser.feed("No JSON here")
+
+        assert not parser.started
+        assert not parser.complete
+
+    def test_parse_invalid_balanced_object_raises(self):
+        """Test that a balanced but invalid object raises on parse."""
+        parser = IncrementalJSONParser()
+        parser.feed('{"key": "value",}')
+
+        assert parser.complete
+        with pytest.raises(json.JSONDecodeError):
+            parser.parse()
@@ -0,0 +1,144 @@
+import asyncio
+
+import pytest
+
+from agrotech_ai.model_scheduler import (
+    MODEL_AFFINITY_STATS,
+    ModelGate,
+    affinity_snapshot,
+    normalize_model_name,
+)
+
+
+async def run_call(gate, model, order, hold=0.01):
+    """Run one gated call, recording the model when it is admitted."""
+    await gate.enter(model)
+    order.append(model)
+    try:
+        await asyncio.sleep(hold)
+    finally:
+        gate.exit()
+
+
+class TestModelGate:
+    """Test cases for grouping queued calls by model."""
+
+    @pytest.fixture(autouse=True)
+    def clear_stats(self):
+        MODEL_AFFINITY_STATS.clear()
+        yield
+        MODEL_AFFINITY_STATS.clear()
+
+    def test_normalize_model_name(self):
+        """Test that untagged names get Ollama's implicit tag."""
+        assert normalize_model_name("llava") == "llava:latest"
+        assert normalize_model_name("gemma3:270m") == "gemma3:270m"
+
+    @pytest.mark.asyncio
+    async def test_same_model_calls_run_concurrently(self):
+        """Test that calls for the active model are admitted immediately."""
+        gate = ModelGate()
+
+        await gate.enter("text")
+        await gate.enter("text")
+
+        assert gate.running == 2
+        assert gate.queued == 0
+
+    @pytest.mark.asyncio
+    async def test_interleaved_calls_are_grouped_by_model(self):
+        """Test that alternating arrivals run as one group per model."""
+        gate = ModelGate()
+        order = []
+
+        await asyncio.gather(
+            *(
+                run_call(gate, model, order)
+                for model in ["vision", "text", "vision", "text", "vision"]
+            )
+        )
+
+        assert order == ["vision", "vision", "vision", "text", "text"]
+        assert gate.swaps == 1
+        assert affinity_snapshot()["swaps_avoided"] > 0
+
+    @pytest.mark.asyncio
+    async def test_batch_limit_prevents_starvation(self):
+        """Test that a waiting model runs once the batch limit is reached."""
+        gate = ModelGate(batch_limit=2)
+        order = []
+
+        first = asyncio.create_task(run_call(gate, "text", order, hold=0.05))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(run_call(gate, "vision", order))
+        await asyncio.sleep(0)
+        late = [asyncio.create_task(run_call(gate, "text", order)) for _ in range(3)]
+        await asyncio.gather(first, waiting, *late)
+
+        assert order.index("vision") == 2
+
+    @pytest.mark.asyncio
+    async def test_loaded_model_runs_beside_the_active_one(self):
+        """Test that a call for an already loaded model does not wait."""
+        gate = ModelGate()
+        await gate.enter("vision")
+
+        await asyncio.wait_for(gate.enter("text", loaded=True), timeout=1)
+
+        assert gate.running == 2
+        assert gate.active_model == "vision"
+        assert gate.swaps == 0
+
+    @pytest.mark.asyncio
+    async def test_loaded_model_waits_without_sharing(self):
+        """Test that a one-model host still groups loaded models."""
+        gate = ModelGate(share_loaded=False)
+        await gate.enter("vision")
+
+        waiter = asyncio.create_task(gate.enter("text", loaded=True))
+        await asyncio.sleep(0)
+        assert gate.queued == 1
+
+        gate.exit()
+        await waiter
+        assert gate.active_model == "text"
+
+    @pytest.mark.asyncio
+    async def test_loaded_model_waits_behind_queued_calls(self):
+        """Test that a loaded model does not overtake calls waiting to swap."""
+        gate = ModelGate()
+        await gate.enter("vision")
+        cold = asyncio.create_task(gate.enter("other"))
+        await asyncio.sleep(0)
+
+        loaded = asyncio.create_task(gate.enter("text", loaded=True))
+        await asyncio.sleep(0)
+
+        assert gate.queued == 2
+        gate.exit()
+        await cold
+        assert gate.active_model == "other"
+        assert not loaded.done()
+
+        gate.exit()
+        await loaded
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_is_discarded(self):
+        """Test that a cancelled call leaves the queue and the gate reusable."""
+        gate = ModelGate()
+        await gate.enter("text")
+
+        waiter = asyncio.create_task(gate.enter("vision"))
+        await asyncio.sleep(0)
+        assert gate.queued == 1
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        gate.exit()
+
+        assert gate.queued == 0
+        assert gate.running == 0
+        await gate.enter("vision")
+        assert gate.active_model == "vision"
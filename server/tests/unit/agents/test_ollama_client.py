@@ -1,13 +1,14 @@
+import asyncio
+import json
+import time
 from unittest.mock import Mock, patch
 
+import httpx
 import pytest
 
-from agrotech_ai.ollama_client import (
-    OllamaAgent,
-    check_ollama_connection,
-    get_shared_session,
-    reset_shared_session,
-)
+from agrotech_ai.backend_pool import BackendPool, get_backend_pool, reset_backend_pool
+from agrotech_ai.ollama_client import JSON_PARSE_STATS, OllamaAgent
+from agrotech_ai.scheduling import SCHEDULER_STATS, request_context
 
 
 class TestOllamaAgent:
@@ -18,26 +19,26 @@ class TestOllamaAgent:
         agent = OllamaAgent("TestRole", "test expertise")
         assert agent.role == "TestRole"
         assert agent.expertise == "test expertise"
-        assert agent.session is not None
+        assert isinstance(agent.pool, BackendPool)
 
     @pytest.mark.asyncio
-    async def test_generate_response_success(self, mock_requests_session):
+    async def test_generate_response_success(self, ollama_stream_pool):
         """Test successful response generation."""
         agent = OllamaAgent("TestAgent", "testing")
-        agent.session = mock_requests_session
+        agent.pool = ollama_stream_pool('{"test": "response", "confidence": 0.9}')
 
         result = await agent.generate_response("test prompt")
 
-        mock_requests_session.post.assert_called_once()
+        assert len(agent.pool.sent) == 1
+        assert agent.pool.sent[0]["stream"] is True
         assert isinstance(result, dict)
         assert "test" in result
 
     @pytest.mark.asyncio
-    async def test_generate_response_http_error(self, mock_requests_session):
+    async def test_generate_response_http_error(self, ollama_stream_pool):
         """Test response generation with HTTP error."""
         agent = OllamaAgent("TestAgent", "testing")
-        agent.session = mock_requests_session
-        mock_requests_session.post.return_value.status_code = 500
+        agent.pool = ollama_stream_pool("", status_code=500)
 
         result = await agent.generate_response("test prompt")
 
@@ -46,11 +47,14 @@ class TestOllamaAgent:
         assert "error" in result
 
     @pytest.mark.asyncio
-    async def test_generate_response_connection_error(self):
+    async def test_generate_response_connection_error(self, ollama_stream_pool):
         """Test response generation with connection error."""
         agent = OllamaAgent("TestAgent", "testing")
-        agent.session = Mock()
-        agent.session.post.side_effect = Exception("Connection failed")
+        agent.pool = ollama_stream_pool("")
+        agent.pool.backends[0].session = Mock()
+        agent.pool.backends[0].session.stream.side_effect = Exception(
+            "Connection failed"
+        )
 
         result = await agent.generate_response("test prompt")
 
@@ -58,6 +62,175 @@ class TestOllamaAgent:
         assert isinstance(result, dict)
         assert "error" in result
 
+    @pytest.mark.asyncio
+    async def test_generate_response_does_not_block_event_loop(
+        self, backend_pool_factory
+    ):
+        """Test that concurrent calls overlap instead of running serially."""
+
+        async def slow_handler(_request):
+            await asyncio.sleep(0.2)
+            return httpx.Response(200, content='{"response": "{\\"ok\\": true}"}')
+
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = backend_pool_factory(slow_handler)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            agent.generate_response("first"), agent.generate_response("second")
+        )
+        elapsed = time.perf_counter() - start
+
+        assert results == [{"ok": True}, {"ok": True}]
+        assert elapsed < 0.35
+
+    @pytest.mark.asyncio
+    async def test_generate_response_streams_tokens(self, backend_pool_factory):
+        """Test that streaming mode forwards NDJSON tokens as they arrive."""
+        chunks = [
+            {"response": '{"key": ', "done": False},
+            {"response": '"value"}', "done": False},
+            {"response": "", "done": True},
+        ]
+        body = "\n".join(json.dumps(chunk) for chunk in chunks)
+
+        def handler(request):
+            assert json.loads(request.content)["stream"] is True
+            return httpx.Response(200, content=body)
+
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = backend_pool_factory(handler)
+        received = []
+
+        async def on_token(token):
+            received.append(token)
+
+        result = await agent.generate_response("test prompt", on_token=on_token)
+
+        assert received == ['{"key": ', '"value"}']
+        assert result == {"key": "value"}
+
+    @pytest.mark.asyncio
+    async def test_generate_response_stream_error(self, backend_pool_factory):
+        """Test that an error chunk in the stream yields the fallback."""
+
+        def handler(_request):
+            return httpx.Response(200, content='{"error": "model not found"}')
+
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = backend_pool_factory(handler)
+
+        async def on_token(_token):
+            pass
+
+        result = await agent.generate_response("test prompt", on_token=on_token)
+
+        assert "error" in result
+
+    @pytest.mark.asyncio
+    async def test_generate_response_stops_when_object_completes(
+        self, backend_pool_factory
+    ):
+        """Test that the stream is abandoned once the JSON object closes."""
+        consumed = []
+
+        async def body():
+            for token in ['{"key": ', '"value"}', " Here is why", " I chose..."]:
+                consumed.append(token)
+                yield (json.dumps({"response": token, "done": False}) + "\n").encode()
+            yield json.dumps({"response": "", "done": True}).encode()
+
+        def handler(request):
+            if request.url.path != "/api/generate":
+                return httpx.Response(200, json={"models": []})
+            return httpx.Response(200, content=body())
+
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = backend_pool_factory(handler)
+        received = []
+
+        async def on_token(token):
+            received.append(token)
+
+        result = await agent.generate_response("test prompt", on_token=on_token)
+
+        assert result == {"key": "value"}
+        assert received == ['{"key": ', '"value"}']
+        assert len(consumed) < 4
+
+    @pytest.mark.asyncio
+    async def test_cancelled_call_aborts_the_ollama_stream(self, backend_pool_factory):
+        """Test that cancelling an agent call closes its Ollama request."""
+        streaming = asyncio.Event()
+        closed = []
+
+        async def body():
+            try:
+                yield (json.dumps({"response": "{", "done": False}) + "\n").encode()
+                streaming.set()
+                await asyncio.Event().wait()
+            finally:
+                closed.append(True)
+
+        def handler(request):
+            if request.url.path != "/api/generate":
+                return httpx.Response(200, json={"models": []})
+            return httpx.Response(200, content=body())
+
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = backend_pool_factory(handler)
+        call = asyncio.create_task(agent.generate_response("test prompt"))
+        await streaming.wait()
+
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        await asyncio.sleep(0)
+
+        backend = agent.pool.backends[0]
+        assert closed == [True]
+        assert backend.in_flight == 0
+        assert backend.total_failures == 0
+
+    @pytest.mark.asyncio
+    async def test_generate_response_truncated_stream_is_repaired(
+        self, ollama_stream_pool
+    ):
+        """Test that a stream cut at num_predict falls back to JSON repair."""
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = ollama_stream_pool('{"key": "value", "other": "trunc')
+
+        result = await agent.generate_response("test prompt")
+
+        assert result["key"] == "value"
+
+    @pytest.mark.asyncio
+    async def test_generate_response_sends_schema_and_counts_outcome(
+        self, ollama_stream_pool
+    ):
+        """Test that the agent schema is sent as format and parsing is counted."""
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.response_schema = {"type": "object"}
+        agent.pool = ollama_stream_pool('{"ok": true}')
+
+        with patch.dict(JSON_PARSE_STATS, clear=True):
+            await agent.generate_response("test prompt")
+            assert JSON_PARSE_STATS["strict"] == 1
+
+        assert agent.pool.sent[0]["format"] == {"type": "object"}
+
+    @pytest.mark.asyncio
+    async def test_generate_response_without_schema_omits_format(
+        self, ollama_stream_pool
+    ):
+        """Test that agents without a schema send no format constraint."""
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = ollama_stream_pool('{"ok": true}')
+
+        await agent.generate_response("test prompt")
+
+        assert "format" not in agent.pool.sent[0]
+
     def test_parse_json_response_valid(self):
         """Test parsing valid JSON response."""
         agent = OllamaAgent("TestAgent", "testing")
@@ -117,95 +290,29 @@ class TestOllamaAgent:
         assert result["confidence"] == 0.0
 
 
-class TestSessionManagement:
-    """Test cases for session management functions."""
+class TestBackendPoolManagement:
+    """Test cases for the shared backend pool."""
 
-    def test_get_shared_session_creates_new(self):
-        """Test that get_shared_session creates a new session."""
-        reset_shared_session()
-        session = get_shared_session()
-        assert session is not None
+    def test_get_backend_pool_creates_new(self):
+        """Test that get_backend_pool creates a pool with backends."""
+        reset_backend_pool()
+        pool = get_backend_pool()
+        assert isinstance(pool, BackendPool)
+        assert isinstance(pool.backends[0].session, httpx.AsyncClient)
 
-    def test_get_shared_session_reuses_existing(self):
-        """Test that get_shared_session reuses existing session."""
-        reset_shared_session()
-        session1 = get_shared_session()
-        session2 = get_shared_session()
-        assert session1 is session2
+    def test_get_backend_pool_reuses_existing(self):
+        """Test that get_backend_pool reuses the existing pool."""
+        reset_backend_pool()
+        pool1 = get_backend_pool()
+        pool2 = get_backend_pool()
+        assert pool1 is pool2
 
-    def test_reset_shared_session(self):
-        """Test session reset functionality."""
-        session1 = get_shared_session()
-        reset_shared_session()
-        session2 = get_shared_session()
-        assert session1 is not session2
-
-
-class TestOllamaConnection:
-    """Test cases for Ollama connection checking."""
-
-    @patch("agrotech_ai.ollama_client.requests.get")
-    def test_check_ollama_connection_success(self, mock_get):
-        """Test successful Ollama connection check."""
-        mock_response = Mock()
-        mock_response.status_code = 200
-        mock_get.return_value = mock_response
-
-        result = check_ollama_connection()
-
-        assert result is True
-        mock_get.assert_called_once()
-        call_args = mock_get.call_args
-        assert "/api/tags" in call_args[0][0]
-        assert call_args[1]["timeout"] == 5
-
-    @patch("agrotech_ai.ollama_client.requests.get")
-    def test_check_ollama_connection_failure(self, mock_get):
-        """Test failed Ollama connection check."""
-        mock_response = Mock()
-        mock_response.status_code = 500
-        mock_get.return_value = mock_response
-
-        result = check_ollama_connection()
-
-        assert result is False
-        mock_get.assert_called_once()
-
-    @patch("agrotech_ai.ollama_client.requests.get")
-    def test_check_ollama_connection_timeout(self, mock_get):
-        """Test Ollama connection check with timeout."""
-        import requests
-
-        mock_get.side_effect = requests.exceptions.Timeout("Connection timeout")
-
-        result = check_ollama_connection()
-
-        assert result is False
-        mock_get.assert_called_once()
-
-    @patch("agrotech_ai.ollama_client.requests.get")
-    def test_check_ollama_connection_connection_error(self, mock_get):
-        """Test Ollama connection check with connection error."""
-        import requests
-
-        mock_get.side_effect = requests.exceptions.ConnectionError("Connection refused")
-
-        result = check_ollama_connection()
-
-        assert result is False
-        mock_get.assert_called_once()
-
-    @patch("agrotech_ai.ollama_client.requests.get")
-    def test_check_ollama_connection_generic_request_error(self, mock_get):
-        """Test Ollama connection check with generic request error."""
-        import requests
-
-        mock_get.side_effect = requests.exceptions.RequestException("Generic error")
-
-        result = check_ollama_connection()
-
-        assert result is False
-        mock_get.assert_called_once()
+    def test_reset_backend_pool(self):
+        """Test pool reset functionality."""
+        pool1 = get_backend_pool()
+        reset_backend_pool()
+        pool2 = get_backend_pool()
+        assert pool1 is not pool2
 
 
 class TestFindAndFixJson:
@@ -337,3 +444,108 @@ class TestFindAndFixJson:
 
         assert isinstance(result, dict)
         assert result == {"first": 1}
+
+
+class TestAnalysisDeadline:
+    """Test cases for fitting model calls into the analysis budget."""
+
+    @pytest.mark.asyncio
+    async def test_call_is_untouched_while_budget_is_ample(self, ollama_stream_pool):
+        """Test that a distant deadline leaves num_predict as configured."""
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = ollama_stream_pool('{"ok": true}')
+
+        with request_context(deadline_seconds=120):
+            await agent.generate_response("test prompt")
+
+        assert agent.pool.sent[0]["options"]["num_predict"] == 300
+
+    @pytest.mark.asyncio
+    async def test_short_budget_shrinks_num_predict(self, ollama_stream_pool):
+        """Test that num_predict shrinks with the share of the timeout left."""
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = ollama_stream_pool('{"ok": true}')
+
+        with request_context(deadline_seconds=30):
+            result = await agent.generate_response("test prompt")
+
+        assert result == {"ok": True}
+        assert 64 <= agent.pool.sent[0]["options"]["num_predict"] <= 150
+
+    @pytest.mark.asyncio
+    async def test_spent_budget_returns_fallback_without_calling(
+        self, ollama_stream_pool
+    ):
+        """Test that no model call is made once the deadline has passed."""
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = ollama_stream_pool('{"ok": true}')
+
+        with request_context(deadline_seconds=-1):
+            result = await agent.generate_response("test prompt")
+
+        assert result == agent._get_fallback_response()
+        assert agent.pool.sent == []
+
+    @pytest.mark.asyncio
+    async def test_deadline_mid_stream_returns_partial_result(
+        self, backend_pool_factory
+    ):
+        """Test that the tokens streamed before the deadline are kept."""
+
+        async def body():
+            for token in ['{"key": "value", ', '"other": "trunc']:
+                yield (json.dumps({"response": token, "done": False}) + "\n").encode()
+            await asyncio.Event().wait()
+
+        def handler(request):
+            if request.url.path != "/api/generate":
+                return httpx.Response(200, json={"models": []})
+            return httpx.Response(200, content=body())
+
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = backend_pool_factory(handler)
+
+        with (
+            patch.dict(SCHEDULER_STATS, clear=True),
+            request_context(deadline_seconds=0.2),
+        ):
+            result = await agent.generate_response("test prompt")
+
+            assert SCHEDULER_STATS["partial_results"] == 1
+
+        assert result["key"] == "value"
+        assert "error" not in result
+
+    @pytest.mark.asyncio
+    async def test_deadline_results_are_not_cached(
+        self, backend_pool_factory, ollama_stream_pool, response_cache
+    ):
+        """Test that partial or squeezed answers are not replayed later."""
+
+        async def body():
+            yield (
+                json.dumps({"response": '{"a": "hello wor', "done": False}) + "\n"
+            ).encode()
+            await asyncio.Event().wait()
+
+        def handler(request):
+            if request.url.path != "/api/generate":
+                return httpx.Response(200, json={"models": []})
+            return httpx.Response(200, content=body())
+
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = backend_pool_factory(handler)
+        with request_context(deadline_seconds=0.2):
+            partial = await agent.generate_response("test prompt")
+
+        agent.pool = ollama_stream_pool('{"a": "hello world"}')
+        with request_context(deadline_seconds=30):
+            squeezed = await agent.generate_response("test prompt")
+        assert response_cache.stats["stores"] == 0
+
+        full = await agent.generate_response("test prompt")
+
+        assert partial["parsing_status"] == "deadline_partial"
+        assert squeezed == full == {"a": "hello world"}
+        assert len(agent.pool.sent) == 2
+        assert response_cache.stats["stores"] == 1
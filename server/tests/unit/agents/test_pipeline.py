@@ -0,0 +1,212 @@
+import asyncio
+
+import pytest
+
+from agrotech_ai.pipeline import STAGE_STATS, Pipeline, PipelineError, Stage
+
+
+def constant(value, delay=0.0, log=None, name=None):
+    """Stage call returning the value after the delay."""
+
+    async def call(values, on_token):
+        if log is not None:
+            log.append(("start", name))
+        await asyncio.sleep(delay)
+        if log is not None:
+            log.append(("end", name))
+        return {"value": value, "inputs": values}
+
+    return call
+
+
+class TestPipelineGraph:
+    """Test cases for validating stage graphs."""
+
+    def test_cycle_is_rejected(self):
+        """Test that stages depending on each other cannot be built."""
+        with pytest.raises(PipelineError):
+            Pipeline(
+                [
+                    Stage("a", constant(1), inputs=("b",)),
+                    Stage("b", constant(2), inputs=("a",)),
+                ]
+            )
+
+    def test_duplicate_stage_is_rejected(self):
+        """Test that stage names are unique."""
+        with pytest.raises(PipelineError):
+            Pipeline([Stage("a", constant(1)), Stage("a", constant(2))])
+
+    def test_inputs_not_produced_by_stages_are_external(self):
+        """Test that the pipeline's own inputs are derived from the graph."""
+        pipeline = Pipeline(
+            [
+                Stage("a", constant(1), inputs=("photo",)),
+                Stage("b", constant(2), inputs=("a", "notes")),
+            ]
+        )
+
+        assert pipeline.external_inputs == {"photo", "notes"}
+
+    @pytest.mark.asyncio
+    async def test_missing_input_is_reported(self):
+        """Test that a run without every external input is refused."""
+        pipeline = Pipeline([Stage("a", constant(1), inputs=("photo",))])
+
+        with pytest.raises(PipelineError):
+            await pipeline.run({})
+
+
+class TestPipelineRun:
+    """Test cases for executing stage graphs."""
+
+    @pytest.mark.asyncio
+    async def test_independent_stages_run_concurrently(self):
+        """Test that stages start as soon as their inputs are ready."""
+        log = []
+        pipeline = Pipeline(
+            [
+                Stage("root", constant("r", log=log, name="root")),
+                Stage("slow", constant("s", 0.02, log, "slow"), inputs=("root",)),
+                Stage("fast", constant("f", 0, log, "fast"), inputs=("root",)),
+                Stage(
+                    "join",
+                    constant("j", log=log, name="join"),
+                    inputs=("slow", "fast"),
+                ),
+            ]
+        )
+        finished = []
+
+        async def on_result(name, result):
+            finished.append(name)
+
+        run = await pipeline.run({}, on_result=on_result)
+
+        assert finished == ["root", "fast", "slow", "join"]
+        assert log.index(("start", "slow")) < log.index(("end", "fast"))
+        assert run.results["join"]["inputs"]["fast"]["value"] == "f"
+        assert run.timings["slow"]["start_ms"] < run.timings["join"]["start_ms"]
+
+    @pytest.mark.asyncio
+    async def test_stage_receives_only_its_inputs(self):
+        """Test that a stage's call gets the values it declared."""
+        pipeline = Pipeline([Stage("a", constant(1), inputs=("photo",))])
+
+        run = await pipeline.run({"photo": "base64", "notes": "dry"})
+
+        assert run.results["a"]["inputs"] == {"photo": "base64"}
+
+    @pytest.mark.asyncio
+    async def test_timed_out_stage_uses_its_fallback(self):
+        """Test that a slow stage is replaced by its fallback result."""
+        STAGE_STATS.clear()
+        pipeline = Pipeline(
+            [
+                Stage(
+                    "slow",
+                    constant(1, delay=10),
+                    timeout=0.01,
+                    fallback=lambda: {"error": "timeout"},
+                ),
+                Stage("next", constant(2), inputs=("slow",)),
+            ]
+        )
+
+        run = await pipeline.run({})
+
+        assert run.results["slow"] == {"error": "timeout"}
+        assert run.results["next"]["inputs"] == {"slow": {"error": "timeout"}}
+        assert run.timings["slow"]["outcome"] == "timeout"
+        assert STAGE_STATS["slow"]["timeouts"] == 1
+
+    @pytest.mark.asyncio
+    async def test_failing_stage_cancels_the_others(self):
+        """Test that an error stops the run and its concurrent stages."""
+        cancelled = []
+
+        async def failing(values, on_token):
+            raise RuntimeError("agent bug")
+
+        async def slow(values, on_token):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        pipeline = Pipeline([Stage("bad", failing), Stage("slow", slow)])
+
+        with pytest.raises(RuntimeError):
+            await pipeline.run({})
+
+        assert cancelled == [True]
+
+    @pytest.mark.asyncio
+    async def test_status_and_token_callbacks_per_stage(self):
+        """Test that each stage announces itself and gets its token callback."""
+        statuses = []
+        received = {}
+
+        async def call(values, on_token):
+            received["on_token"] = on_token
+            return {}
+
+        async def on_status(message):
+            statuses.append(message)
+
+        pipeline = Pipeline([Stage("a", call, status="a starting")])
+
+        await pipeline.run(
+            {}, on_status=on_status, token_callback=lambda name: f"tokens-{name}"
+        )
+
+        assert statuses == ["a starting"]
+        assert received["on_token"] == "tokens-a"
+
+    @pytest.mark.asyncio
+    async def test_skipped_stage_uses_the_check_result(self):
+        """Test that a stage whose skip check answers is never called."""
+        STAGE_STATS.clear()
+        called = []
+
+        async def call(values, on_token):
+            called.append(True)
+            return {}
+
+        pipeline = Pipeline(
+            [
+                Stage("root", constant("junk")),
+                Stage(
+                    "costly",
+                    call,
+                    inputs=("root",),
+                    status="costly starting",
+                    skip_if=lambda values: {"skipped": values["root"]["value"]},
+                ),
+                Stage("next", constant(1), inputs=("costly",)),
+            ]
+        )
+        statuses = []
+
+        async def on_status(message):
+            statuses.append(message)
+
+        run = await pipeline.run({}, on_status=on_status)
+
+        assert called == []
+        assert statuses == []
+        assert run.results["costly"] == {"skipped": "junk"}
+        assert run.results["next"]["inputs"] == {"costly": {"skipped": "junk"}}
+        assert run.timings["costly"]["outcome"] == "skipped"
+        assert STAGE_STATS["costly"]["skipped"] == 1
+
+    @pytest.mark.asyncio
+    async def test_stage_runs_when_the_check_declines(self):
+        """Test that a skip check returning None lets the stage run."""
+        pipeline = Pipeline([Stage("a", constant(1), skip_if=lambda values: None)])
+
+        run = await pipeline.run({})
+
+        assert run.results["a"]["value"] == 1
+        assert run.timings["a"]["outcome"] == "ok"
@@ -0,0 +1,152 @@
+import base64
+from unittest.mock import patch
+
+import pytest
+
+from agrotech_ai.agents import ImageVisionAgent
+from agrotech_ai.ollama_client import OllamaAgent
+from agrotech_ai.response_cache import ResponseCache, cache_key
+from agrotech_ai.scheduling import request_context
+
+
+class TestResponseCache:
+    """Test cases for the memory and SQLite cache tiers."""
+
+    def test_cache_key_normalizes_prompt_whitespace(self):
+        """Test that reflowed prompts share a key but options do not."""
+        payload = {"model": "m", "prompt": "Analiza  esto\n", "options": {}}
+
+        assert cache_key(payload) == cache_key({**payload, "prompt": "Analiza esto"})
+        assert cache_key(payload) != cache_key({**payload, "options": {"seed": 1}})
+
+    @pytest.mark.asyncio
+    async def test_memory_hit_returns_independent_copy(self):
+        """Test that a hit cannot be mutated through a previous result."""
+        cache = ResponseCache(path=None)
+        await cache.set("key", {"alerts": []})
+
+        first = await cache.get("key")
+        first["alerts"].append("changed")
+
+        assert await cache.get("key") == {"alerts": []}
+        assert cache.stats["memory_hits"] == 2
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction_and_ttl_expiry(self):
+        """Test that the oldest entry is evicted and expired entries miss."""
+        cache = ResponseCache(max_entries=2, path=None)
+        for key in ("a", "b", "c"):
+            await cache.set(key, {"key": key})
+
+        assert await cache.get("a") is None
+        assert cache.stats["evictions"] == 1
+
+        expired = ResponseCache(ttl_seconds=0, path=None)
+        await expired.set("key", {})
+        assert await expired.get("key") is None
+        assert expired.stats["expired"] == 1
+
+    @pytest.mark.asyncio
+    async def test_disk_tier_survives_restart(self, tmp_path):
+        """Test that a new cache instance is served from SQLite."""
+        path = str(tmp_path / "cache.sqlite3")
+        first = ResponseCache(path=path)
+        await first.set("key", {"ok": True})
+        first.close()
+
+        second = ResponseCache(path=path)
+
+        assert await second.get("key") == {"ok": True}
+        assert await second.get("key") == {"ok": True}
+        assert second.stats["disk_hits"] == 1
+        assert second.stats["memory_hits"] == 1
+        second.close()
+
+
+class TestAgentCaching:
+    """Test cases for caching around agent calls."""
+
+    @pytest.mark.asyncio
+    async def test_repeated_prompt_is_served_from_cache(
+        self, ollama_stream_pool, response_cache
+    ):
+        """Test that the second identical call does not reach Ollama."""
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = ollama_stream_pool('{"ok": true}')
+
+        first = await agent.generate_response("prompt")
+        second = await agent.generate_response("prompt")
+
+        assert first == second == {"ok": True}
+        assert len(agent.pool.sent) == 1
+        assert response_cache.stats["memory_hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_bypass_flag_skips_cache(self, ollama_stream_pool, response_cache):
+        """Test that use_cache=False always calls the model."""
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = ollama_stream_pool('{"ok": true}')
+
+        await agent.generate_response("prompt", use_cache=False)
+        await agent.generate_response("prompt", use_cache=False)
+
+        assert len(agent.pool.sent) == 2
+        assert response_cache.stats["stores"] == 0
+
+    @pytest.mark.asyncio
+    async def test_partial_recovery_is_not_cached(
+        self, ollama_stream_pool, response_cache
+    ):
+        """Test that responses rebuilt from free text are not stored."""
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = ollama_stream_pool("no json at all")
+
+        await agent.generate_response("prompt")
+
+        assert response_cache.stats["stores"] == 0
+
+    @pytest.mark.asyncio
+    async def test_image_hit_skips_optimization(
+        self, ollama_stream_pool, sample_base64_image
+    ):
+        """Test that a cached image analysis does not re-encode the image."""
+        agent = ImageVisionAgent()
+        agent.pool = ollama_stream_pool('{"is_agricultural_image": true}')
+
+        await agent.analyze_image(sample_base64_image)
+        with patch.object(agent, "_optimize_image") as optimize:
+            result = await agent.analyze_image(sample_base64_image)
+
+        optimize.assert_not_called()
+        assert result["is_agricultural_image"] is True
+        assert "image_analytics" in result
+        assert len(agent.pool.sent) == 1
+
+    @pytest.mark.asyncio
+    async def test_binary_upload_shares_the_base64_entry(
+        self, ollama_stream_pool, sample_base64_image
+    ):
+        """Test that the same photo hits the cache whichever way it came."""
+        agent = ImageVisionAgent()
+        agent.pool = ollama_stream_pool('{"is_agricultural_image": true}')
+
+        await agent.analyze_image(sample_base64_image)
+        result = await agent.analyze_image(
+            bytearray(base64.b64decode(sample_base64_image))
+        )
+
+        assert result["is_agricultural_image"] is True
+        assert len(agent.pool.sent) == 1
+
+    @pytest.mark.asyncio
+    async def test_image_answer_squeezed_by_deadline_is_not_cached(
+        self, ollama_stream_pool, response_cache, sample_base64_image
+    ):
+        """Test that ImageVision does not cache a deadline-shortened answer."""
+        agent = ImageVisionAgent()
+        agent.pool = ollama_stream_pool('{"is_agricultural_image": true}')
+
+        with request_context(deadline_seconds=30):
+            await agent.analyze_image(sample_base64_image)
+
+        assert response_cache.stats["stores"] == 0
@@ -0,0 +1,165 @@
+import asyncio
+import time
+
+import pytest
+
+from agrotech_ai.concurrency_limit import AdaptiveLimiter
+from agrotech_ai.scheduling import (
+    BULK,
+    INTERACTIVE,
+    SCHEDULED,
+    SCHEDULER_STATS,
+    DeadlineExceeded,
+    FairQueue,
+    RequestContext,
+    current_request,
+    request_context,
+)
+
+
+def _future():
+    return asyncio.get_running_loop().create_future()
+
+
+class TestFairQueue:
+    """Test cases for the priority and fairness ordering of waiters."""
+
+    @pytest.mark.asyncio
+    async def test_priority_classes_are_served_strictly_in_order(self):
+        """Test that interactive work never waits behind bulk work."""
+        queue = FairQueue()
+        bulk, scheduled, interactive = _future(), _future(), _future()
+        queue.push(bulk, RequestContext("batch", BULK))
+        queue.push(scheduled, RequestContext("cron", SCHEDULED))
+        queue.push(interactive, RequestContext("farmer", INTERACTIVE))
+
+        assert queue.depth() == {INTERACTIVE: 1, SCHEDULED: 1, BULK: 1}
+        assert [queue.pop(), queue.pop(), queue.pop()] == [
+            interactive,
+            scheduled,
+            bulk,
+        ]
+        assert queue.pop() is None
+
+    @pytest.mark.asyncio
+    async def test_clients_are_interleaved_within_a_class(self):
+        """Test that a client with many queued calls cannot starve another."""
+        queue = FairQueue()
+        batch = [_future() for _ in range(3)]
+        for future in batch:
+            queue.push(future, RequestContext("batch"))
+        farmer = _future()
+        queue.push(farmer, RequestContext("farmer"))
+
+        assert queue.pop() is batch[0]
+        assert queue.pop() is farmer
+        assert queue.pop() is batch[1]
+
+    @pytest.mark.asyncio
+    async def test_weight_gives_a_larger_share(self):
+        """Test that a client with twice the weight is served twice as often."""
+        queue = FairQueue()
+        heavy = [_future() for _ in range(4)]
+        light = [_future() for _ in range(2)]
+        for future in heavy:
+            queue.push(future, RequestContext("heavy", weight=2.0))
+        for future in light:
+            queue.push(future, RequestContext("light"))
+
+        served = [queue.pop() for _ in range(3)]
+
+        assert served.count(light[0]) == 1
+        assert sum(future in heavy for future in served) == 2
+
+    @pytest.mark.asyncio
+    async def test_urgent_deadline_is_served_first(self):
+        """Test that a waiter close to its deadline jumps ahead in its class."""
+        queue = FairQueue()
+        relaxed = _future()
+        urgent = _future()
+        queue.push(relaxed, RequestContext("a"))
+        queue.push(urgent, RequestContext("b", deadline=time.monotonic() + 1))
+
+        assert queue.pop() is urgent
+
+    @pytest.mark.asyncio
+    async def test_expired_waiter_is_failed_and_skipped(self):
+        """Test that a waiter whose deadline passed is dropped unserved."""
+        SCHEDULER_STATS.clear()
+        queue = FairQueue()
+        expired = _future()
+        waiting = _future()
+        queue.push(expired, RequestContext("a", deadline=time.monotonic() - 1))
+        queue.push(waiting, RequestContext("b"))
+
+        assert queue.pop() is waiting
+        with pytest.raises(DeadlineExceeded):
+            expired.result()
+        assert SCHEDULER_STATS["deadline_expired"] == 1
+
+
+class TestRequestContext:
+    """Test cases for propagating the scheduling context."""
+
+    def test_unknown_priority_is_rejected(self):
+        """Test that only the known priority classes are accepted."""
+        with pytest.raises(ValueError):
+            RequestContext(priority="urgent")
+
+    @pytest.mark.asyncio
+    async def test_context_reaches_tasks_started_inside_it(self):
+        """Test that agent tasks see the context of the message they serve."""
+
+        async def read_context():
+            return current_request()
+
+        with request_context("farmer", BULK, deadline_seconds=5):
+            context = await asyncio.create_task(read_context())
+
+        assert context.client_id == "farmer"
+        assert context.priority == BULK
+        assert 0 < context.remaining() <= 5
+        assert current_request().client_id == "default"
+
+
+class TestLimiterScheduling:
+    """Test cases for the limiter's use of the scheduling context."""
+
+    @pytest.mark.asyncio
+    async def test_interactive_waiter_gets_the_next_slot(self):
+        """Test that a freed slot goes to interactive work before bulk."""
+        limiter = AdaptiveLimiter("backend", initial=1)
+        await limiter.acquire()
+        order = []
+
+        async def wait(name, priority):
+            await limiter.acquire(RequestContext(name, priority))
+            order.append(name)
+
+        bulk = asyncio.create_task(wait("batch", BULK))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(wait("farmer", INTERACTIVE))
+        await asyncio.sleep(0)
+        assert limiter.queued_by_priority == {INTERACTIVE: 1, SCHEDULED: 0, BULK: 1}
+
+        limiter.release()
+        await interactive
+        limiter.release()
+        await bulk
+
+        assert order == ["farmer", "batch"]
+
+    @pytest.mark.asyncio
+    async def test_waiter_gives_up_at_its_deadline(self):
+        """Test that a request stops waiting once its deadline passes."""
+        SCHEDULER_STATS.clear()
+        limiter = AdaptiveLimiter("backend", initial=1)
+        await limiter.acquire()
+
+        with request_context("farmer", deadline_seconds=0.01):
+            with pytest.raises(DeadlineExceeded):
+                await limiter.acquire()
+
+        assert limiter.queued == 0
+        assert limiter.in_flight == 1
+        assert SCHEDULER_STATS["deadline_expired"] == 1
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from agrotech_ai.ollama_client import OllamaAgent
+from agrotech_ai.scheduling import request_context
+from agrotech_ai.single_flight import SingleFlight, request_key
+
+
+class TestSingleFlight:
+    """Test cases for coalescing identical in-flight calls."""
+
+    def test_request_key_covers_options_and_images(self):
+        """Test that any output-relevant field changes the key."""
+        base = {"model": "m", "prompt": "p", "options": {"temperature": 0.3}}
+
+        assert request_key(base) == request_key(dict(base))
+        assert request_key(base) != request_key({**base, "options": {}})
+        assert request_key({**base, "images": ["aaa"]}) != request_key(
+            {**base, "images": ["bbb"]}
+        )
+
+    @pytest.mark.asyncio
+    async def test_concurrent_callers_share_one_call(self):
+        """Test that duplicates wait on the leader and get separate copies."""
+        flight = SingleFlight()
+        calls = []
+
+        async def call(_publish):
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"alerts": []}
+
+        first, second = await asyncio.gather(
+            flight.do("key", call), flight.do("key", call)
+        )
+
+        assert len(calls) == 1
+        assert first == second == {"alerts": []}
+        assert first is not second
+        assert flight.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_late_joiner_receives_tokens_so_far(self):
+        """Test that a caller joining mid-stream gets a replay then live tokens."""
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def call(publish):
+            await publish("{")
+            await release.wait()
+            await publish("}")
+            return {}
+
+        early, late = [], []
+
+        async def early_token(token):
+            early.append(token)
+
+        async def late_token(token):
+            late.append(token)
+
+        leader = asyncio.create_task(flight.do("key", call, early_token))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("key", call, late_token))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(leader, follower)
+
+        assert early == ["{", "}"]
+        assert late == ["{", "}"]
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_shared_call(self):
+        """Test that the call survives until its last caller leaves."""
+        flight = SingleFlight()
+
+        async def call(_publish):
+            await asyncio.sleep(0.02)
+            return {"ok": True}
+
+        leader = asyncio.create_task(flight.do("key", call))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("key", call))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        assert await follower == {"ok": True}
+
+    @pytest.mark.asyncio
+    async def test_identical_agent_prompts_share_ollama_call(self, ollama_stream_pool):
+        """Test that duplicate agent prompts reach Ollama once."""
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = ollama_stream_pool('{"ok": true}')
+
+        results = await asyncio.gather(
+            agent.generate_response("same"),
+            agent.generate_response("same"),
+            agent.generate_response("other"),
+        )
+
+        assert results == [{"ok": True}] * 3
+        assert [payload["prompt"] for payload in agent.pool.sent] == ["same", "other"]
+
+    @pytest.mark.asyncio
+    async def test_prompts_under_other_deadlines_are_not_shared(
+        self, ollama_stream_pool
+    ):
+        """Test that a caller never gets a result cut at another's deadline."""
+        agent = OllamaAgent("TestAgent", "testing")
+        agent.pool = ollama_stream_pool('{"ok": true}')
+
+        async def generate(deadline_seconds):
+            with request_context(deadline_seconds=deadline_seconds):
+                return await agent.generate_response("same", use_cache=False)
+
+        await asyncio.gather(generate(None), generate(60), generate(120))
+
+        assert len(agent.pool.sent) == 3
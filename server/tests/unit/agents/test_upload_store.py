@@ -0,0 +1,139 @@
+import hashlib
+import os
+import time
+
+import pytest
+
+from agrotech_ai.upload_store import UPLOAD_STATS, UploadError, UploadStore
+
+IMAGE = bytes(range(256)) * 40
+
+
+def digest(data):
+    """Hex sha256 as sent by the client."""
+    return hashlib.sha256(data).hexdigest()
+
+
+async def send(store, upload_id, offset, chunk):
+    """Write one chunk with its checksum."""
+    return await store.write_chunk(upload_id, offset, chunk, digest(chunk))
+
+
+class TestUploadStore:
+    """Test cases for staging chunked uploads on disk."""
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        """Store in a fresh directory."""
+        UPLOAD_STATS.clear()
+        return UploadStore(directory=str(tmp_path / "staging"), max_chunk_bytes=4096)
+
+    @pytest.mark.asyncio
+    async def test_chunks_are_assembled_in_order(self, store):
+        """Test that acknowledged chunks add up to the image."""
+        ack = await store.start(None, len(IMAGE), digest(IMAGE))
+        upload_id = ack["upload_id"]
+        while ack["offset"] < len(IMAGE):
+            ack = await send(
+                store,
+                upload_id,
+                ack["offset"],
+                IMAGE[ack["offset"] : ack["offset"] + 4096],
+            )
+
+        assert await store.take(upload_id) == IMAGE
+        assert os.listdir(store.directory) == []
+        assert UPLOAD_STATS["completed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_restart_resumes_from_staged_offset(self, store):
+        """Test that a new connection, or a new server, continues the upload."""
+        upload_id = (await store.start(None, len(IMAGE)))["upload_id"]
+        await send(store, upload_id, 0, IMAGE[:4096])
+
+        restarted = UploadStore(directory=store.directory)
+        ack = await restarted.start(upload_id, len(IMAGE))
+
+        assert ack == {"upload_id": upload_id, "offset": 4096, "size": len(IMAGE)}
+        assert UPLOAD_STATS["resumed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_resent_chunk_is_not_written_twice(self, store):
+        """Test that a chunk whose ack was lost only realigns the client."""
+        upload_id = (await store.start(None, len(IMAGE)))["upload_id"]
+        await send(store, upload_id, 0, IMAGE[:4096])
+
+        ack = await send(store, upload_id, 0, IMAGE[:4096])
+
+        assert ack["offset"] == 4096
+        assert UPLOAD_STATS["stale_chunks"] == 1
+
+    @pytest.mark.asyncio
+    async def test_corrupted_chunk_is_refused(self, store):
+        """Test that a chunk not matching its checksum is not staged."""
+        upload_id = (await store.start(None, len(IMAGE)))["upload_id"]
+
+        with pytest.raises(UploadError):
+            await store.write_chunk(upload_id, 0, IMAGE[:4096], digest(b"other"))
+
+        assert (await store.start(upload_id, len(IMAGE)))["offset"] == 0
+
+    @pytest.mark.asyncio
+    async def test_incomplete_upload_cannot_be_taken(self, store):
+        """Test that an analysis waits for the whole image."""
+        upload_id = (await store.start(None, len(IMAGE)))["upload_id"]
+        await send(store, upload_id, 0, IMAGE[:4096])
+
+        with pytest.raises(UploadError, match="no está completa"):
+            await store.take(upload_id)
+
+    @pytest.mark.asyncio
+    async def test_invalid_ids_and_sizes_are_refused(self, store):
+        """Test that ids cannot escape the staging directory."""
+        with pytest.raises(UploadError):
+            await store.start("../etc/passwd", 10)
+        with pytest.raises(UploadError):
+            await store.start(None, store.max_bytes + 1)
+
+    @pytest.mark.asyncio
+    async def test_ids_are_issued_by_the_server(self, store):
+        """Test that a client cannot start an upload under an id it chose,
+        so it cannot write into or take another client's upload."""
+        ack = await store.start(None, len(IMAGE))
+
+        with pytest.raises(UploadError, match="desconocida"):
+            await store.start("photo-1", len(IMAGE))
+        assert ack["upload_id"] != (await store.start(None, len(IMAGE)))["upload_id"]
+
+    @pytest.mark.asyncio
+    async def test_staged_uploads_are_capped(self, store):
+        """Test that uploads over the count or byte limit are refused."""
+        store.max_staged = 2
+        store.max_staged_bytes = 3 * len(IMAGE)
+        await store.start(None, len(IMAGE))
+        await store.start(None, len(IMAGE))
+
+        with pytest.raises(UploadError, match="Demasiadas"):
+            await store.start(None, 1)
+
+        store.max_staged = 10
+        with pytest.raises(UploadError, match="Demasiadas"):
+            await store.start(None, len(IMAGE) + 1)
+        assert UPLOAD_STATS["refused"] == 2
+        assert store.snapshot()["staged"] == 2
+
+    @pytest.mark.asyncio
+    async def test_stale_uploads_expire(self, store):
+        """Test that abandoned uploads are purged after the TTL."""
+        upload_id = (await store.start(None, len(IMAGE)))["upload_id"]
+        await send(store, upload_id, 0, IMAGE[:4096])
+        store.ttl_seconds = 60
+        past = time.time() - 120
+        for name in os.listdir(store.directory):
+            os.utime(os.path.join(store.directory, name), (past, past))
+
+        store.purge_expired()
+
+        assert store.snapshot()["staged"] == 0
+        assert UPLOAD_STATS["expired"] == 1
+        assert upload_id not in store._locks
@@ -1,9 +1,11 @@
+import time
 from unittest.mock import Mock, patch
 
 import pytest
 from fastapi.testclient import TestClient
 
 from agrotech_ai.app import app
+from agrotech_ai.health import HealthMonitor
 
 
 class TestMainAPI:
@@ -27,10 +29,19 @@ class TestMainAPI:
         assert "endpoints" in data
         assert data["version"] == "1.0.0"
 
-    @patch("agrotech_ai.app.check_ollama_connection")
-    def test_health_check_healthy(self, mock_check, client):
+    @pytest.fixture
+    def monitor(self):
+        """Health monitor with a fresh cached status and no probe loop."""
+        monitor = HealthMonitor()
+        monitor.checked_at = time.time()
+        with patch("agrotech_ai.app.get_health_monitor", return_value=monitor):
+            yield monitor
+
+    def test_health_check_healthy(self, monitor, client):
         """Test health check endpoint when Ollama is running."""
-        mock_check.return_value = True
+        monitor._backends = {
+            "http://ollama:11434": {"url": "http://ollama:11434", "healthy": True}
+        }
 
         response = client.get("/health")
 
@@ -40,11 +51,13 @@ class TestMainAPI:
         assert data["status"] == "healthy"
         assert data["ollama"] == "running"
         assert "model" in data
+        assert data["backends"][0]["healthy"] is True
 
-    @patch("agrotech_ai.app.check_ollama_connection")
-    def test_health_check_unhealthy(self, mock_check, client):
+    def test_health_check_unhealthy(self, monitor, client):
         """Test health check endpoint when Ollama is not running."""
-        mock_check.return_value = False
+        monitor._backends = {
+            "http://ollama:11434": {"url": "http://ollama:11434", "healthy": False}
+        }
 
         response = client.get("/health")
 
@@ -54,6 +67,49 @@ class TestMainAPI:
         assert data["status"] == "error"
         assert data["ollama"] == "not_running"
 
+    def test_health_check_does_not_probe_when_cached(self, monitor, client):
+        """Test that a fresh cached status is served without calling Ollama."""
+        with patch.object(monitor, "probe_all") as probe_all:
+            client.get("/health")
+
+        probe_all.assert_not_called()
+
+    def test_liveness_endpoint(self, client):
+        """Test that liveness does not depend on Ollama."""
+        response = client.get("/health/live")
+
+        assert response.status_code == 200
+        assert response.json() == {"status": "alive"}
+
+    def test_readiness_endpoint(self, monitor, client):
+        """Test that readiness follows the cached backend status."""
+        monitor._backends = {"a": {"url": "a", "healthy": True}}
+        assert client.get("/health/ready").status_code == 200
+
+        monitor._backends = {"a": {"url": "a", "healthy": False}}
+        response = client.get("/health/ready")
+        assert response.status_code == 503
+        assert response.json() == {"status": "not_ready"}
+
+    def test_metrics_endpoint(self, client):
+        """Test that JSON parsing outcome counters are exposed."""
+        with patch.dict(
+            "agrotech_ai.app.JSON_PARSE_STATS",
+            {"strict": 3, "repaired": 1},
+            clear=True,
+        ):
+            response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.json()["json_parsing"] == {"strict": 3, "repaired": 1}
+        assert "swaps_avoided" in response.json()["model_affinity"]
+        assert "coalescing" in response.json()
+        assert "scheduler" in response.json()
+        assert "hedging" in response.json()
+        assert "pipeline" in response.json()
+        assert "image_prefilter" in response.json()
+        assert response.json()["image_pool"]["pending"] == 0
+
     def test_nonexistent_endpoint(self, client):
         """Test accessing non-existent endpoint."""
         response = client.get("/nonexistent")
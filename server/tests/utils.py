@@ -5,7 +5,7 @@ Test utilities and helpers for AgroTech AI tests.
 import base64
 import io
 import json
-from typing import Any, Dict
+from typing import Any, Dict, Union
 from unittest.mock import Mock
 
 from PIL import Image
@@ -28,15 +28,18 @@ def create_mock_ollama_response(data: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def mock_requests_session(response_data: Dict[str, Any], status_code: int = 200):
-    """Create a mock requests session with predefined response."""
-    session = Mock()
-    session.post.return_value = Mock()
-    session.post.return_value.status_code = status_code
-    session.post.return_value.json.return_value = create_mock_ollama_response(
-        response_data
-    )
-    return session
+def create_mock_ollama_stream(
+    data: Union[Dict[str, Any], str], chunk_size: int = 8
+) -> str:
+    """Create a mock streamed Ollama API response (NDJSON); a string is
+    streamed as the raw model reply."""
+    text = data if isinstance(data, str) else json.dumps(data)
+    chunks = [
+        {"response": text[i : i + chunk_size], "done": False}
+        for i in range(0, len(text), chunk_size)
+    ]
+    chunks.append({"response": "", "done": True})
+    return "\n".join(json.dumps(chunk) for chunk in chunks)
 
 
 class MockWebSocket:
@@ -56,10 +59,14 @@ class MockWebSocket:
         """Mock send_json method."""
         self.sent_messages.append(data)
 
-    async def receive_json(self):
-        """Mock receive_json method."""
+    async def receive(self):
+        """Mock receive method; dicts arrive as text frames, bytes as
+        binary frames."""
         if self.received_messages:
-            return self.received_messages.pop(0)
+            message = self.received_messages.pop(0)
+            if isinstance(message, bytes):
+                return {"type": "websocket.receive", "bytes": message}
+            return {"type": "websocket.receive", "text": json.dumps(message)}
         raise Exception("No more messages")
 
     def add_message(self, message):